@@ -0,0 +1,295 @@
+"""
+Benchmark offline dos caminhos de processamento do dashboard.
+
+Gera (ou reutiliza) datasets sintéticos em cada escala e mede, sem
+navegador nem Kaggle, o tempo e o pico de memória de cada etapa:
+ingestão, geolocalização, métricas de entrega, construção dos mapas e
+serialização do HTML. O resultado é gravado em JSON para comparação
+entre commits.
+
+Uso:
+    python benchmark.py --escalas 1 10 --saida benchmark.json
+    python benchmark.py --escalas 1 --comparar benchmark_anterior.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import pandas as pd
+
+from olist.amostragem import MODOS_AMOSTRAGEM, ordenar_para_amostragem
+from olist.armazem import carregar_armazem
+from olist.chaves import memoria_dicionarios, memoria_tabela
+from olist.consultas import criar_consultas
+from olist.cubo import construir_cubo, metricas_cubo, receita_cubo
+from olist.fatos import (
+    ARQUIVOS_FATOS, ARQUIVOS_FATOS_OPCIONAIS, avaliacao_por_atraso, construir_fatos,
+    pagamentos_por_tipo, receita_por_categoria,
+)
+from olist.entregas import calcular_metricas_entrega
+from olist.filtros import Filtro, construir_indice_filtros
+from olist.fluxos import agregar_fluxos, calcular_envios, calcular_fluxos, filtrar_envios
+from olist.geo import ARQUIVO_GEO, construir_indice_geo, geocodificar
+from olist.ingestao import carregar_dataset
+from olist.instrumentacao import rss_pico_mb
+from olist.mapas import construir_mapa_comparativo, construir_mapa_comunidade, dados_comunidade
+from olist.paralelo import ler_dataset_paralelo, numero_processos
+from olist.piramide import celulas_visiveis, construir_piramide
+from olist.sintetico import gerar_dataset
+
+
+PASTA_DADOS = os.path.join('.benchmark', 'dados')
+
+
+def medir(funcao, memoria=True):
+    """
+    Executa funcao e mede o tempo (sem rastreamento) e, se pedido,
+    o pico de memória alocada em uma segunda execução com tracemalloc.
+    rss_max_mb é o pico de RSS do processo até o fim da etapa (inclui
+    memória do Arrow, que o tracemalloc não enxerga).
+    Retorna: (resultado, {'segundos', 'cpu_segundos', 'pico_mb', 'rss_max_mb'})
+    """
+    gc.collect()
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    resultado = funcao()
+    medida = {
+        'segundos': round(time.perf_counter() - inicio, 4),
+        'cpu_segundos': round(time.process_time() - inicio_cpu, 4),
+    }
+    if memoria:
+        del resultado
+        gc.collect()
+        tracemalloc.start()
+        resultado = funcao()
+        medida['pico_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    medida['rss_max_mb'] = round(rss_pico_mb(), 1)
+    return resultado, medida
+
+
+def preparar_dados(escala):
+    """Diretório com o dataset sintético da escala (gerado se ainda não existir)"""
+    pasta = os.path.join(PASTA_DADOS, f"escala_{escala:g}")
+    if not os.path.exists(os.path.join(pasta, 'olist_orders_dataset.csv')):
+        print(f"Gerando dataset sintético (escala {escala:g})...")
+        gerar_dataset(pasta, escala)
+    return pasta
+
+
+def executar_etapas(path, memoria=True):
+    """Mede todas as etapas sobre o dataset em path"""
+    etapas = {}
+
+    def etapa(nome, funcao, **extras):
+        resultado, medida = medir(funcao, memoria)
+        medida.update(extras)
+        etapas[nome] = medida
+        print(f"  {nome:<32} {medida['segundos']:>9.3f} s"
+              + (f" {medida['pico_mb']:>10.1f} MB" if 'pico_mb' in medida else ''))
+        return resultado
+
+    # Ingestão: CSV puro, cache Parquet e armazém Arrow mapeado
+    dfs = etapa('ingestao_csv', lambda: carregar_dataset(path, usar_cache=False))
+    etapa(
+        'ingestao_csv_paralela',
+        lambda: ler_dataset_paralelo(path),
+        processos=numero_processos(),
+    )
+    carregar_dataset(path)
+    etapa('ingestao_parquet', lambda: carregar_dataset(path))
+    carregar_armazem(path)
+    texto = etapa('ingestao_arrow_mmap', lambda: carregar_armazem(path, chaves_compactas=False))
+    compactas = etapa('ingestao_arrow_chaves', lambda: carregar_armazem(path, chaves_compactas=True))
+    for nome, tabelas in [('ingestao_arrow_mmap', texto), ('ingestao_arrow_chaves', compactas)]:
+        etapas[nome]['memoria_tabelas_mb'] = round((
+            sum(memoria_tabela(df) for df in tabelas.values()) + memoria_dicionarios(tabelas)
+        ) / 2**20, 1)
+
+    # Junção pedidos x itens com chaves em texto e com chaves compactas
+    for nome, tabelas in [('texto', texto), ('chaves', compactas)]:
+        etapa(
+            f'juncao_pedidos_itens_{nome}',
+            lambda: tabelas['olist_orders_dataset.csv'].merge(
+                tabelas['olist_order_items_dataset.csv'], on='order_id'
+            ),
+        )
+
+    customers_df = dfs['olist_customers_dataset.csv']
+    sellers_df = dfs['olist_sellers_dataset.csv']
+    geolocation_df = dfs[ARQUIVO_GEO]
+    orders_df = dfs['olist_orders_dataset.csv']
+
+    # Geolocalização de clientes e vendedores
+    indice = etapa('indice_geo', lambda: construir_indice_geo(geolocation_df))
+    clientes = etapa(
+        'localizacao_clientes',
+        lambda: geocodificar(customers_df, 'customer_zip_code_prefix', indice)
+        .dropna(subset=['geolocation_lat', 'geolocation_lng']),
+    )
+    vendedores = etapa(
+        'localizacao_vendedores',
+        lambda: geocodificar(sellers_df, 'seller_zip_code_prefix', indice)
+        .dropna(subset=['geolocation_lat', 'geolocation_lng']),
+    )
+
+    # Métricas de entrega
+    etapa('metricas_entrega', lambda: calcular_metricas_entrega(orders_df))
+
+    # Distância e fluxo de todos os envios (itens de pedido)
+    etapa(
+        'fluxos_envios',
+        lambda: calcular_fluxos(
+            dfs['olist_order_items_dataset.csv'], orders_df, customers_df, sellers_df, indice
+        ),
+    )
+
+    # Tabela fato: merges uma vez por versão; as análises leem a tabela pronta
+    fatos = etapa('fatos_construcao', lambda: construir_fatos(
+        *(dfs[f] for f in ARQUIVOS_FATOS), *(dfs.get(f) for f in ARQUIVOS_FATOS_OPCIONAIS)
+    ))
+    etapas['fatos_construcao']['linhas'] = len(fatos)
+    etapa('fatos_receita_categoria', lambda: receita_por_categoria(fatos))
+    etapa('fatos_pagamentos', lambda: pagamentos_por_tipo(fatos))
+    etapa('fatos_avaliacao_atraso', lambda: avaliacao_por_atraso(fatos))
+
+    # Cubo de pedidos: construído uma vez por versão, métricas por rollup
+    cubo = etapa('cubo_construcao', lambda: construir_cubo(fatos))
+    etapas['cubo_construcao']['celulas'] = len(cubo)
+    etapa('cubo_metricas_entrega', lambda: metricas_cubo(cubo))
+    etapa('cubo_receita_categoria', lambda: receita_cubo(cubo))
+
+    # Filtros globais: índices uma vez por versão, depois busca por filtro
+    indice_filtros = etapa('indice_filtros', lambda: construir_indice_filtros(dfs))
+    meio = indice_filtros.data_minima + (indice_filtros.data_maxima - indice_filtros.data_minima) / 2
+    filtro = Filtro(inicio=meio, estados_cliente=('RJ', 'SP'), status=('delivered',))
+    selecao = etapa('filtro_selecao', lambda: indice_filtros.selecionar(filtro))
+    mascara = indice_filtros.mascara_pedidos(selecao)
+    etapa('filtro_metricas_entrega', lambda: calcular_metricas_entrega(orders_df[mascara]))
+    envios = calcular_envios(
+        dfs['olist_order_items_dataset.csv'], orders_df, customers_df, sellers_df, indice
+    )
+    itens = indice_filtros.mascara_itens(selecao)
+    etapa('filtro_fluxos', lambda: agregar_fluxos(filtrar_envios(envios, itens)))
+
+    # Mesmas agregações no backend DuckDB sobre os Parquet do cache
+    consultas = criar_consultas(path, dfs, {}, 'duckdb')
+    if consultas.nome == 'duckdb':
+        etapa('duckdb_status_pedidos', consultas.contagem_status)
+        etapa('duckdb_metricas_entrega', consultas.metricas_entrega)
+        etapa(
+            'duckdb_amostra_clientes',
+            lambda: consultas.amostra_localizados('clientes', 100_000),
+        )
+
+    # Mapa da Comunidade Olist
+    geo = geolocation_df.dropna(subset=['geolocation_lat', 'geolocation_lng'])
+    piramide = etapa(
+        'piramide_geo',
+        lambda: construir_piramide(geo['geolocation_lat'], geo['geolocation_lng']),
+    )
+    nivel, celulas = celulas_visiveis(piramide, 5)
+    mapa = etapa(
+        'mapa_comunidade',
+        lambda: construir_mapa_comunidade(dados_comunidade(celulas, nivel), [-15, -55], 5),
+        celulas=len(celulas),
+    )
+    html = etapa('html_comunidade', lambda: mapa.get_root().render())
+    etapas['html_comunidade']['bytes'] = len(html.encode('utf-8'))
+
+    # Ordem de amostragem (uma vez por versão) e fatia do prefixo
+    for modo in MODOS_AMOSTRAGEM:
+        ordenados = etapa(
+            f'ordem_amostragem_{modo}',
+            lambda: ordenar_para_amostragem(
+                clientes, 'customer_state', 'customer_zip_code_prefix', modo
+            ),
+        )
+        etapa(f'amostra_prefixo_{modo}', lambda: ordenados.head(100_000).copy())
+
+    # Mapa comparativo (padrão de 500/500 e sliders no máximo)
+    amostras = {
+        'padrao': (min(500, len(vendedores)), min(500, len(clientes))),
+        'maximo': (len(vendedores), min(100_000, len(clientes))),
+    }
+    for nome, (n_vendedores, n_clientes) in amostras.items():
+        v = vendedores.sample(n=n_vendedores, random_state=42)
+        c = clientes.sample(n=n_clientes, random_state=42)
+        mapa = etapa(
+            f'mapa_comparativo_{nome}',
+            lambda: construir_mapa_comparativo(v, c),
+            pontos=n_vendedores + n_clientes,
+        )
+        html = etapa(f'html_comparativo_{nome}', lambda: mapa.get_root().render())
+        etapas[f'html_comparativo_{nome}']['bytes'] = len(html.encode('utf-8'))
+
+    linhas = {nome: len(df) for nome, df in dfs.items()}
+    return linhas, etapas
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior):
+    """Imprime a variação de tempo de cada etapa em relação a um relatório anterior"""
+    print(f"\nComparação com {anterior.get('commit') or 'relatório anterior'}:")
+    for escala, resultado in atual['escalas'].items():
+        base = anterior.get('escalas', {}).get(escala)
+        if not base:
+            continue
+        print(f"Escala {escala}:")
+        for nome, medida in resultado['etapas'].items():
+            if nome not in base['etapas']:
+                continue
+            antes = base['etapas'][nome]['segundos']
+            depois = medida['segundos']
+            variacao = (depois - antes) / antes * 100 if antes else 0.0
+            print(f"  {nome:<32} {antes:>9.3f} s -> {depois:>9.3f} s ({variacao:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do dashboard Olist")
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1.0],
+                        help="escalas do dataset sintético (1 = tamanho público)")
+    parser.add_argument('--saida', default='benchmark.json', help="relatório JSON")
+    parser.add_argument('--comparar', help="relatório JSON anterior para comparação")
+    parser.add_argument('--sem-memoria', action='store_true',
+                        help="não mede pico de memória (metade do tempo)")
+    args = parser.parse_args()
+
+    relatorio = {
+        'commit': commit_atual(),
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'escalas': {},
+    }
+    for escala in args.escalas:
+        path = preparar_dados(escala)
+        print(f"Escala {escala:g} ({path}):")
+        linhas, etapas = executar_etapas(path, memoria=not args.sem_memoria)
+        relatorio['escalas'][f"{escala:g}"] = {'linhas': linhas, 'etapas': etapas}
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2)
+    print(f"\nRelatório gravado em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(relatorio, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Camada de dados e processamento do dashboard Olist."""
@@ -0,0 +1,84 @@
+"""
+Motor de amostragem do mapa comparativo.
+
+Em vez de sortear uma amostra nova a cada valor do slider, cada tabela
+recebe, uma vez por versão do dataset, uma ordem de amostragem
+determinística e aninhada: os N primeiros elementos da ordem são a
+amostra de tamanho N. Mudar o slider vira uma fatia do prefixo, O(N),
+sem nova passada pelos dados.
+
+Modos:
+- 'uniforme': permutação aleatória simples (proporcional à população,
+  então SP domina e estados pequenos quase somem);
+- 'estratificada': a cada prefixo, cada estado recebe uma fatia
+  proporcional à raiz quadrada da sua população, e dentro do estado os
+  prefixos de CEP se alternam da mesma forma.
+"""
+import numpy as np
+import pandas as pd
+
+
+MODOS_AMOSTRAGEM = ['estratificada', 'uniforme']
+
+# Alocação por estrato proporcional a tamanho ** EXPOENTE_ALOCACAO
+# (0 = igual para todos, 1 = proporcional à população)
+EXPOENTE_ALOCACAO = 0.5
+
+
+def _postos(grupos, chave):
+    """
+    Posição (0, 1, ...) de cada linha dentro do seu grupo, na ordem de chave
+    Retorna: (postos, tamanho do grupo de cada linha)
+    """
+    ordem = np.lexsort((chave, grupos))
+    ordenados = grupos[ordem]
+    inicios = np.flatnonzero(np.r_[True, ordenados[1:] != ordenados[:-1]])
+    tamanhos = np.diff(np.r_[inicios, len(ordenados)])
+
+    postos = np.empty(len(grupos), dtype='int64')
+    postos[ordem] = np.arange(len(ordenados)) - np.repeat(inicios, tamanhos)
+    tamanho_grupo = np.empty(len(grupos), dtype='int64')
+    tamanho_grupo[ordem] = np.repeat(tamanhos, tamanhos)
+    return postos, tamanho_grupo
+
+
+def _chave_estrato(grupos, chave, sorteio):
+    """
+    Chave de intercalação dos estratos: (posto + sorteio) / peso do estrato.
+    Ordenar por ela dá a cada estrato, em todo prefixo, uma fatia
+    proporcional ao seu peso.
+    """
+    postos, tamanhos = _postos(grupos, chave)
+    return (postos + sorteio) / np.power(tamanhos, EXPOENTE_ALOCACAO)
+
+
+def ordem_amostragem(estados, ceps, modo='estratificada', semente=42):
+    """
+    Ordem de amostragem aninhada das linhas (índices posicionais)
+    estados, ceps: estado e prefixo de CEP de cada linha
+    """
+    rng = np.random.default_rng(semente)
+    n = len(estados)
+    if modo == 'uniforme':
+        return rng.permutation(n)
+    if modo != 'estratificada':
+        raise ValueError(f"Modo de amostragem desconhecido: {modo}")
+
+    codigos_estado = pd.factorize(np.asarray(estados), use_na_sentinel=False)[0]
+    codigos_cep = pd.factorize(
+        pd.MultiIndex.from_arrays([codigos_estado, np.asarray(ceps)])
+    )[0]
+
+    # Dentro do estado: alterna os prefixos de CEP
+    embaralhado = rng.random(n)
+    chave_cep = _chave_estrato(codigos_cep, embaralhado, rng.random(n))
+
+    # Entre estados: alterna os estados
+    chave_estado = _chave_estrato(codigos_estado, chave_cep, rng.random(n))
+    return np.lexsort((embaralhado, chave_estado))
+
+
+def ordenar_para_amostragem(df, coluna_estado, coluna_cep, modo='estratificada', semente=42):
+    """df reordenado pela ordem de amostragem: df.head(n) é a amostra de tamanho n"""
+    ordem = ordem_amostragem(df[coluna_estado], df[coluna_cep], modo, semente)
+    return df.iloc[ordem]
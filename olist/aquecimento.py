@@ -0,0 +1,349 @@
+"""
+Aquecimento do dashboard: carga do dataset e dos caches derivados em
+segundo plano.
+
+Uma réplica nova não precisa esperar todos os CSVs para mostrar algo: as
+etapas (dados, índices de filtro, pirâmide, consultas, status, métricas
+de entrega, ...) rodam em ordem numa thread do processo, e cada seção
+do dashboard só espera a etapa de que depende. O cabeçalho aparece na hora, os KPIs
+assim que as tabelas abrem e o resto vai sendo preenchido.
+
+As etapas gravam os mesmos caches em disco usados pelo dashboard
+(Parquet, Arrow, manifesto, índice geográfico, pirâmides, tabela fato,
+cubo), então rodar o aquecimento antes de a réplica receber tráfego
+deixa a primeira carga quente:
+
+    python -m olist.aquecimento --data-dir /caminho/dos/csvs
+
+OLIST_CARGA_EM_FUNDO=0 faz o dashboard esperar todas as etapas antes de
+renderizar (comportamento anterior).
+
+Com o backend DuckDB (OLIST_BACKEND, padrão) as tabelas não são
+convertidas para pandas: status, entregas e localizações saem em SQL dos
+Parquet, e as etapas montadas em pandas (índices de filtro, tabela fato,
+cubo, envios e fluxos) não rodam; essas seções pedem OLIST_BACKEND=pandas.
+
+Depois de uma atualização do dataset, um Aquecimento novo recebe o
+anterior e reaproveita as etapas cuja chave (as impressões das tabelas
+de origem da etapa) não mudou: o custo da recarga acompanha o tamanho
+da alteração, não o do dataset. A etapa de dados é incremental: as
+tabelas inalteradas vêm da carga anterior, e só as novas ou alteradas
+são convertidas e codificadas.
+"""
+import argparse
+import os
+import threading
+import time
+
+from olist.armazem import TabelasSobDemanda, carregar_armazem
+from olist.atualizacao import atualizar_dataset, impressoes_tabelas
+from olist.consultas import (
+    ARQUIVO_PEDIDOS, TABELAS_LOCALIZACAO, backend_escolhido, criar_consultas,
+)
+from olist.cubo import carregar_cubo
+from olist.fatos import carregar_fatos, impressao_fatos
+from olist.filtros import construir_indice_filtros
+from olist.fluxos import agregar_fluxos, calcular_envios
+from olist.geo import ARQUIVO_GEO, carregar_indice_geo
+from olist.ingestao import resolver_caminho_dataset
+from olist.instrumentacao import medir_secao
+from olist.piramide import carregar_piramide, carregar_piramide_estados
+
+
+ENV_CARGA_EM_FUNDO = 'OLIST_CARGA_EM_FUNDO'
+
+# Tabelas usadas na análise de fluxos (a geolocalização por último)
+ARQUIVOS_FLUXOS = [
+    'olist_order_items_dataset.csv',
+    'olist_orders_dataset.csv',
+    'olist_customers_dataset.csv',
+    'olist_sellers_dataset.csv',
+    ARQUIVO_GEO,
+]
+
+# Tabelas de origem de cada etapa (a chave de reaproveitamento)
+ARQUIVOS_FILTROS = [
+    'olist_orders_dataset.csv',
+    'olist_customers_dataset.csv',
+    'olist_order_items_dataset.csv',
+    'olist_sellers_dataset.csv',
+    'olist_products_dataset.csv',
+]
+ARQUIVOS_CONSULTAS = [ARQUIVO_PEDIDOS, ARQUIVO_GEO] + [
+    arquivo for arquivo, _, _ in TABELAS_LOCALIZACAO.values()
+]
+ARQUIVOS_LOCALIZADOS = [ARQUIVO_GEO] + [
+    arquivo for arquivo, _, _ in TABELAS_LOCALIZACAO.values()
+]
+
+# Colunas da geolocalização usadas pelas pirâmides
+COLUNAS_PIRAMIDE = ['geolocation_lat', 'geolocation_lng', 'geolocation_state']
+
+
+def carga_em_fundo_ativa():
+    """Carga em segundo plano ligada (padrão) ou desligada por OLIST_CARGA_EM_FUNDO=0"""
+    return os.environ.get(ENV_CARGA_EM_FUNDO, '1') != '0'
+
+
+class Aquecimento:
+    """
+    Executa etapas (nome, funcao[, chave[, incremental]]) em ordem numa
+    thread de fundo. Cada funcao recebe o dict de resultados das etapas
+    anteriores; o erro de uma etapa fica em erros[nome] e não interrompe
+    as seguintes.
+    chave(resultados): identifica a versão da entrada da etapa; se for
+    igual à do Aquecimento `anterior` (e lá não houve erro), o resultado
+    anterior é reaproveitado sem executar a funcao. Sem chave, sempre executa.
+    incremental: a funcao recebe também o resultado da etapa no `anterior`
+    (None sem ele), para refazer só a parte que mudou.
+    """
+
+    def __init__(self, etapas, anterior=None):
+        self.etapas = [
+            (etapa[0], etapa[1], etapa[2] if len(etapa) > 2 else None, len(etapa) > 3 and etapa[3])
+            for etapa in etapas
+        ]
+        self.anterior = anterior
+        self.resultados = {}
+        self.erros = {}
+        self.segundos = {}
+        self.chaves = {}
+        self.reaproveitadas = set()
+        self.iniciadas = set()
+        self.etapa_atual = None
+        self._prontas = {nome: threading.Event() for nome, _, _, _ in self.etapas}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        """Dispara a thread de fundo (uma vez só)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.executar, name='olist-aquecimento', daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def renovar(self):
+        """Aquecimento novo com as mesmas etapas, reaproveitando as inalteradas deste"""
+        return Aquecimento(self.etapas, anterior=self).iniciar()
+
+    def _resultado_anterior(self, nome):
+        """Resultado da etapa no Aquecimento anterior (None sem ele ou se lá falhou)"""
+        anterior = self.anterior
+        if anterior is None or nome not in anterior._prontas:
+            return None
+        anterior.aguardar(nome)
+        if nome in anterior.erros:
+            return None
+        return anterior.resultados.get(nome)
+
+    def _reaproveitavel(self, nome, chave):
+        anterior = self.anterior
+        if anterior is None or nome not in anterior._prontas:
+            return False
+        anterior.aguardar(nome)
+        return (
+            anterior.chaves.get(nome) == chave
+            and nome in anterior.resultados
+            and nome not in anterior.erros
+        )
+
+    def executar(self):
+        """Roda todas as etapas na thread atual"""
+        for nome, funcao, chave, incremental in self.etapas:
+            self.etapa_atual = nome
+            self.iniciadas.add(nome)
+            inicio = time.perf_counter()
+            try:
+                with medir_secao(f'aquecimento_{nome}'):
+                    if chave is not None:
+                        self.chaves[nome] = chave(self.resultados)
+                    if chave is not None and self._reaproveitavel(nome, self.chaves[nome]):
+                        self.resultados[nome] = self.anterior.resultados[nome]
+                        self.reaproveitadas.add(nome)
+                    elif incremental:
+                        self.resultados[nome] = funcao(self.resultados, self._resultado_anterior(nome))
+                    else:
+                        self.resultados[nome] = funcao(self.resultados)
+            except Exception as e:
+                self.erros[nome] = e
+            finally:
+                self.segundos[nome] = time.perf_counter() - inicio
+                self._prontas[nome].set()
+        self.etapa_atual = None
+        # Sem referência ao anterior: os resultados não reaproveitados são liberados
+        self.anterior = None
+        return self
+
+    def iniciada(self, nome):
+        """A etapa já começou a rodar (ou terminou)"""
+        return nome in self.iniciadas
+
+    def pronta(self, nome):
+        """A etapa terminou (com ou sem erro)"""
+        return self._prontas[nome].is_set()
+
+    def aguardar(self, nome=None, espera=None):
+        """Espera a etapa (ou todas, sem nome) terminar; retorna se terminou"""
+        nomes = [nome] if nome else list(self._prontas)
+        limite = None if espera is None else time.monotonic() + espera
+        for n in nomes:
+            restante = None if limite is None else max(0.0, limite - time.monotonic())
+            if not self._prontas[n].wait(restante):
+                return False
+        return True
+
+    def resultado(self, nome, espera=None):
+        """
+        Resultado da etapa, esperando até `espera` segundos (None = sem limite).
+        Levanta o erro da etapa, se houve; retorna None se não terminou a tempo.
+        """
+        if not self.aguardar(nome, espera):
+            return None
+        if nome in self.erros:
+            raise self.erros[nome]
+        return self.resultados.get(nome)
+
+    def concluidas(self):
+        """Número de etapas já terminadas"""
+        return sum(evento.is_set() for evento in self._prontas.values())
+
+    def concluida(self):
+        return self.concluidas() == len(self.etapas)
+
+    def progresso(self):
+        """(etapas terminadas, total de etapas, etapa em execução)"""
+        return self.concluidas(), len(self.etapas), self.etapa_atual
+
+
+# ========== ETAPAS DO DASHBOARD ==========
+def _carregar_dados(data_dir, backend, anterior=None):
+    """
+    Resolve o dataset, reingere o que mudou e abre as tabelas do armazém
+    (sob o DuckDB, sem convertê-las para pandas).
+    anterior: resultado desta etapa na carga anterior; as tabelas com a
+    mesma impressão são reaproveitadas e só as novas ou alteradas são
+    convertidas (e codificadas)
+    """
+    path = resolver_caminho_dataset(data_dir)
+    atualizar_dataset(path)
+    impressoes = impressoes_tabelas(path)
+    if backend == 'duckdb':
+        return path, TabelasSobDemanda(path), impressoes
+
+    inalteradas = {}
+    if anterior is not None:
+        path_anterior, dfs_anteriores, impressoes_anteriores = anterior
+        if path_anterior == path and not isinstance(dfs_anteriores, TabelasSobDemanda):
+            inalteradas = {
+                file_name: df for file_name, df in dfs_anteriores.items()
+                if impressoes_anteriores.get(file_name) == impressoes.get(file_name)
+            }
+    return path, carregar_armazem(path, anteriores=inalteradas), impressoes
+
+
+def _geolocalizacao(dfs):
+    """Só as colunas das pirâmides sob o DuckDB; a tabela carregada no pandas"""
+    if isinstance(dfs, TabelasSobDemanda):
+        return dfs.colunas(ARQUIVO_GEO, COLUNAS_PIRAMIDE)
+    return dfs[ARQUIVO_GEO]
+
+
+def _piramide(resultados):
+    path, dfs, impressoes = resultados['dados']
+    return carregar_piramide(path, _geolocalizacao(dfs), impressoes.get(ARQUIVO_GEO))
+
+
+def _piramide_estados(resultados):
+    path, dfs, impressoes = resultados['dados']
+    return carregar_piramide_estados(path, _geolocalizacao(dfs), impressoes.get(ARQUIVO_GEO))
+
+
+def _cubo(resultados):
+    path, _, impressoes = resultados['dados']
+    return carregar_cubo(path, resultados['fatos'], impressoes)
+
+
+def _localizados(resultados):
+    consultas = resultados['consultas']
+    return {
+        'clientes': consultas.contar_localizados('clientes'),
+        'vendedores': consultas.contar_localizados('vendedores'),
+    }
+
+
+def _envios(resultados):
+    path, dfs, impressoes = resultados['dados']
+    indice_geo = carregar_indice_geo(path, dfs[ARQUIVO_GEO], impressoes.get(ARQUIVO_GEO))
+    return calcular_envios(*(dfs[f] for f in ARQUIVOS_FLUXOS[:-1]), indice_geo)
+
+
+def _impressoes(*arquivos):
+    """Chave de etapa: as impressões das tabelas de origem"""
+    def chave(resultados):
+        path, _, impressoes = resultados['dados']
+        return path, tuple(impressoes.get(arquivo) for arquivo in arquivos)
+    return chave
+
+
+def _chave_fatos(resultados):
+    path, _, impressoes = resultados['dados']
+    return path, impressao_fatos(impressoes)
+
+
+def _so_pandas(funcao, backend):
+    """Etapa montada sobre as tabelas em pandas: sob o DuckDB não roda (resultado None)"""
+    if backend == 'pandas':
+        return funcao
+    return lambda resultados: None
+
+
+def etapas_dashboard(data_dir=None, backend=None):
+    """
+    Etapas do dashboard na ordem em que as seções aparecem na página,
+    com a chave de reaproveitamento de cada uma (ver Aquecimento.renovar)
+    backend: 'duckdb' ou 'pandas' (ver backend_escolhido)
+    """
+    backend = backend_escolhido(backend)
+    return [
+        ('dados', lambda r, anterior: _carregar_dados(data_dir, backend, anterior), None, True),
+        ('filtros', _so_pandas(lambda r: construir_indice_filtros(r['dados'][1]), backend),
+         _impressoes(*ARQUIVOS_FILTROS)),
+        ('piramide', _piramide, _impressoes(ARQUIVO_GEO)),
+        ('consultas', lambda r: criar_consultas(*r['dados'], backend), _impressoes(*ARQUIVOS_CONSULTAS)),
+        ('fatos', _so_pandas(lambda r: carregar_fatos(*r['dados']), backend), _chave_fatos),
+        ('cubo', _so_pandas(_cubo, backend), _chave_fatos),
+        ('status_pedidos', lambda r: r['consultas'].contagem_status(), _impressoes(ARQUIVO_PEDIDOS)),
+        ('metricas_entrega', lambda r: r['consultas'].metricas_entrega(), _impressoes(ARQUIVO_PEDIDOS)),
+        ('localizados', _localizados, _impressoes(*ARQUIVOS_LOCALIZADOS)),
+        ('envios', _so_pandas(_envios, backend), _impressoes(*ARQUIVOS_FLUXOS)),
+        ('fluxos', _so_pandas(lambda r: agregar_fluxos(r['envios']), backend),
+         _impressoes(*ARQUIVOS_FLUXOS)),
+        ('piramide_estados', _piramide_estados, _impressoes(ARQUIVO_GEO)),
+    ]
+
+
+def aquecer(data_dir=None, backend=None):
+    """Roda as etapas do dashboard de forma síncrona (pré-gera os caches em disco)"""
+    return Aquecimento(etapas_dashboard(data_dir, backend)).executar()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pré-gera os caches do dashboard Olist antes de a réplica receber tráfego"
+    )
+    parser.add_argument('--data-dir', help="diretório dos CSVs (padrão: OLIST_DATA_DIR ou Kaggle)")
+    args = parser.parse_args()
+
+    aquecimento = aquecer(args.data_dir)
+    for nome, _, _, _ in aquecimento.etapas:
+        situacao = f"erro: {aquecimento.erros[nome]}" if nome in aquecimento.erros else "ok"
+        print(f"  {nome:<20} {aquecimento.segundos[nome]:>8.2f} s  {situacao}")
+    if 'dados' in aquecimento.erros:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
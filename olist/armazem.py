@@ -0,0 +1,176 @@
+"""
+Armazém compartilhado de tabelas em Arrow IPC mapeado em memória.
+
+Cada tabela do dataset é gravada uma vez como arquivo Arrow IPC e aberta
+com memory map. Os DataFrames entregues apontam para as páginas do
+arquivo (sem cópia) e são somente leitura, então todas as sessões, e
+todos os processos do mesmo host, compartilham a mesma memória via
+page cache do sistema operacional.
+
+Com o backend DuckDB as agregações leem os Parquet do cache, e as tabelas
+ficam em TabelasSobDemanda: os arquivos são mapeados, mas o DataFrame de
+uma tabela só é montado se uma seção cair no fallback em pandas.
+"""
+import os
+import threading
+from collections.abc import Mapping
+
+import pyarrow as pa
+
+from olist.chaves import chaves_compactas_ativas, codificar_tabelas
+from olist.ingestao import (
+    PASTA_CACHE,
+    VERSAO_ESQUEMA,
+    caminho_temporario,
+    carregar_arquivo,
+    listar_csvs,
+    trava_dataset,
+)
+from olist.paralelo import ingerir_em_paralelo
+
+
+PASTA_ARROW = 'arrow'
+
+
+def pasta_armazem(path):
+    """Pasta dos arquivos Arrow IPC do dataset"""
+    return os.path.join(path, PASTA_CACHE, VERSAO_ESQUEMA, PASTA_ARROW)
+
+
+def caminho_arrow(path, file_name):
+    """Caminho do arquivo Arrow IPC de um CSV do dataset"""
+    nome = os.path.splitext(file_name)[0] + '.arrow'
+    return os.path.join(pasta_armazem(path), nome)
+
+
+def gravar_arrow(df, arrow_path):
+    """
+    Grava df como Arrow IPC (sem compressão, para permitir memory map).
+    O arquivo é escrito num temporário único e renomeado: quem já mapeou
+    a versão anterior continua lendo o inode antigo, nunca um arquivo truncado.
+    """
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = caminho_temporario(arrow_path)
+    try:
+        with pa.OSFile(tmp_path, 'wb') as f:
+            with pa.ipc.new_file(f, tabela.schema) as writer:
+                writer.write_table(tabela)
+        os.replace(tmp_path, arrow_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def abrir_tabela_arrow(arrow_path):
+    """Abre um arquivo Arrow IPC com memory map (pa.Table sem cópia)"""
+    return pa.ipc.open_file(pa.memory_map(arrow_path, 'r')).read_all()
+
+
+def abrir_arrow(arrow_path):
+    """Abre um arquivo Arrow IPC com memory map e retorna um DataFrame sem cópia"""
+    return abrir_tabela_arrow(arrow_path).to_pandas(split_blocks=True)
+
+
+def _arrow_atualizado(arrow_path, file_path):
+    try:
+        return os.path.getmtime(arrow_path) >= os.path.getmtime(file_path)
+    except OSError:
+        return False
+
+
+def _abrir_tabelas(path):
+    """Regera os arquivos Arrow pendentes e abre todos com memory map"""
+    pendentes = [
+        file_name for file_name in listar_csvs(path)
+        if not _arrow_atualizado(caminho_arrow(path, file_name), os.path.join(path, file_name))
+    ]
+    lidos = ingerir_em_paralelo(path, pendentes) if pendentes else {}
+
+    tabelas = {}
+    for file_name in listar_csvs(path):
+        arrow_path = caminho_arrow(path, file_name)
+        if file_name in pendentes:
+            df = lidos.pop(file_name, None)
+            if df is None:
+                df = carregar_arquivo(path, file_name)
+            try:
+                gravar_arrow(df, arrow_path)
+            except OSError:
+                tabelas[file_name] = pa.Table.from_pandas(df, preserve_index=False)
+                continue
+        tabelas[file_name] = abrir_tabela_arrow(arrow_path)
+
+    return tabelas
+
+
+def carregar_armazem(path, chaves_compactas=None, anteriores=None):
+    """
+    Retorna as tabelas do dataset mapeadas em memória.
+    Arquivos Arrow ausentes ou mais antigos que o CSV são (re)gerados a
+    partir do cache Parquet/CSV antes de serem abertos. Se o diretório
+    não permitir escrita, a tabela é mantida em memória sem mapeamento.
+    Os CSVs pendentes são lidos em paralelo (ver olist.paralelo).
+    chaves_compactas: codifica as chaves com dicionários compartilhados
+    (ver olist.chaves; padrão: OLIST_CHAVES_COMPACTAS)
+    anteriores: {nome_do_arquivo: DataFrame} de uma carga anterior cujas
+    tabelas não mudaram; são devolvidos sem nova conversão (ver codificar_tabelas)
+    Retorna: dict {nome_do_arquivo: DataFrame somente leitura}
+    """
+    # Sob a trava do dataset: outro processo ou thread que esteja
+    # atualizando os caches termina antes de decidirmos o que regerar
+    with trava_dataset(path):
+        tabelas = _abrir_tabelas(path)
+
+    if chaves_compactas is None:
+        chaves_compactas = chaves_compactas_ativas()
+    anteriores = anteriores or {}
+    if chaves_compactas:
+        return codificar_tabelas(tabelas, anteriores)
+    return {
+        file_name: anteriores[file_name] if file_name in anteriores
+        else tabela.to_pandas(split_blocks=True)
+        for file_name, tabela in tabelas.items()
+    }
+
+
+class TabelasSobDemanda(Mapping):
+    """
+    Tabelas do armazém mapeadas em memória sem conversão para pandas
+    (backend DuckDB). Linhas, colunas e bytes vêm do pa.Table mapeado;
+    o DataFrame de uma tabela só é montado (e guardado) quando pedido.
+    Chaves em texto: os dicionários compartilhados exigem todas as tabelas.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with trava_dataset(path):
+            self.tabelas = _abrir_tabelas(path)
+        self._dfs = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, file_name):
+        with self._lock:
+            if file_name not in self._dfs:
+                self._dfs[file_name] = self.tabelas[file_name].to_pandas(split_blocks=True)
+            return self._dfs[file_name]
+
+    def __contains__(self, file_name):
+        # Sem montar o DataFrame (o padrão de Mapping chamaria __getitem__)
+        return file_name in self.tabelas
+
+    def __iter__(self):
+        return iter(self.tabelas)
+
+    def __len__(self):
+        return len(self.tabelas)
+
+    def colunas(self, file_name, colunas):
+        """DataFrame só com algumas colunas da tabela (sem montar as demais)"""
+        return self.tabelas[file_name].select(colunas).to_pandas(split_blocks=True)
+
+    def forma(self, file_name):
+        """(linhas, colunas, bytes mapeados) da tabela, sem montar o DataFrame"""
+        tabela = self.tabelas[file_name]
+        return tabela.num_rows, tabela.num_columns, tabela.nbytes
@@ -0,0 +1,194 @@
+"""
+Atualização incremental do dataset.
+
+Um manifesto guarda tamanho, mtime e hash do conteúdo de cada CSV já
+ingerido. A cada atualização só os arquivos que mudaram são
+reprocessados; quando o conteúdo anterior é prefixo do novo (linhas
+apenas anexadas, como em orders e order_items) só as linhas novas são
+lidas e anexadas às tabelas em cache.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from olist.armazem import abrir_arrow, caminho_arrow, gravar_arrow
+from olist.ingestao import (
+    PASTA_CACHE,
+    VERSAO_ESQUEMA,
+    caminho_cache,
+    caminho_temporario,
+    concatenar_tabelas,
+    gravar_cache,
+    ler_csv,
+    listar_csvs,
+    trava_dataset,
+)
+
+
+MANIFESTO = 'manifesto.json'
+
+TAMANHO_BLOCO = 1 << 20
+
+
+def _caminho_manifesto(path):
+    return os.path.join(path, PASTA_CACHE, VERSAO_ESQUEMA, MANIFESTO)
+
+
+def ler_manifesto(path):
+    """Manifesto dos arquivos ingeridos: {nome: {tamanho, mtime_ns, hash}}"""
+    try:
+        with open(_caminho_manifesto(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def gravar_manifesto(path, manifesto):
+    """Grava o manifesto de forma atômica; falhas de escrita são ignoradas"""
+    manifesto_path = _caminho_manifesto(path)
+    tmp_path = caminho_temporario(manifesto_path)
+    try:
+        os.makedirs(os.path.dirname(manifesto_path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifesto_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def hash_arquivo(file_path, limite=None):
+    """
+    Hash do conteúdo do arquivo em uma única leitura.
+    Retorna: (hash dos primeiros `limite` bytes ou None, hash total,
+              True se o byte limite-1 é uma quebra de linha)
+    """
+    h = hashlib.blake2b(digest_size=20)
+    hash_prefixo = None
+    quebra_linha = False
+    lidos = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            tamanho = TAMANHO_BLOCO
+            if limite is not None and lidos < limite:
+                tamanho = min(tamanho, limite - lidos)
+            bloco = f.read(tamanho)
+            if not bloco:
+                break
+            h.update(bloco)
+            lidos += len(bloco)
+            if limite is not None and lidos == limite:
+                hash_prefixo = h.hexdigest()
+                quebra_linha = bloco.endswith(b'\n')
+    return hash_prefixo, h.hexdigest(), quebra_linha
+
+
+def impressoes_tabelas(path):
+    """
+    Impressão de cada CSV: hash do conteúdo registrado no manifesto ou,
+    se o arquivo não estiver no manifesto, tamanho e mtime
+    Retorna: dict {nome_do_arquivo: impressao}
+    """
+    manifesto = ler_manifesto(path)
+    impressoes = {}
+    for file_name in listar_csvs(path):
+        if file_name in manifesto:
+            impressoes[file_name] = manifesto[file_name]['hash']
+        else:
+            stat = os.stat(os.path.join(path, file_name))
+            impressoes[file_name] = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return impressoes
+
+
+def _ler_tabela_em_cache(path, file_name):
+    """Tabela já ingerida (Arrow ou Parquet), sem revalidar contra o CSV"""
+    arrow_path = caminho_arrow(path, file_name)
+    if os.path.exists(arrow_path):
+        return abrir_arrow(arrow_path)
+    parquet_path = caminho_cache(path, file_name)
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return None
+
+
+def _gravar_tabela(path, file_name, df):
+    """Regrava o cache Parquet e o arquivo Arrow da tabela"""
+    gravar_cache(df, caminho_cache(path, file_name))
+    try:
+        gravar_arrow(df, caminho_arrow(path, file_name))
+    except OSError:
+        pass
+
+
+def _renovar_caches(path, file_name):
+    """Marca os caches como atuais quando só o mtime do CSV mudou"""
+    for cache_path in [caminho_cache(path, file_name), caminho_arrow(path, file_name)]:
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+
+
+def atualizar_dataset(path):
+    """
+    Compara cada CSV com o manifesto e reingere apenas o que mudou.
+    Retorna: dict {nome_do_arquivo: 'novo' | 'anexado' | 'alterado'}
+             com os arquivos cujo conteúdo mudou
+    A atualização roda sob trava_dataset: duas sessões (ou processos)
+    clicando em recarregar não regravam os mesmos caches ao mesmo tempo.
+    """
+    with trava_dataset(path):
+        return _atualizar_dataset(path)
+
+
+def _atualizar_dataset(path):
+    manifesto = ler_manifesto(path)
+    alteracoes = {}
+
+    for file_name in listar_csvs(path):
+        file_path = os.path.join(path, file_name)
+        stat = os.stat(file_path)
+        anterior = manifesto.get(file_name)
+
+        # Tamanho e mtime iguais: nada a fazer (sem ler o arquivo)
+        if (anterior and anterior['tamanho'] == stat.st_size
+                and anterior['mtime_ns'] == stat.st_mtime_ns):
+            continue
+
+        cresceu = anterior is not None and stat.st_size > anterior['tamanho']
+        hash_prefixo, hash_total, quebra_linha = hash_arquivo(
+            file_path, anterior['tamanho'] if cresceu else None
+        )
+        manifesto[file_name] = {
+            'tamanho': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': hash_total,
+        }
+
+        if anterior is None:
+            # Primeira vez: os caches são (re)gerados pela carga normal
+            alteracoes[file_name] = 'novo'
+        elif hash_total == anterior['hash']:
+            _renovar_caches(path, file_name)
+        elif cresceu and quebra_linha and hash_prefixo == anterior['hash']:
+            antigo = _ler_tabela_em_cache(path, file_name)
+            if antigo is None:
+                df = ler_csv(file_path)
+            else:
+                try:
+                    novo = ler_csv(file_path, inicio=anterior['tamanho'], colunas=list(antigo.columns))
+                except pd.errors.EmptyDataError:
+                    novo = antigo.iloc[:0]
+                df = concatenar_tabelas([antigo, novo])
+            _gravar_tabela(path, file_name, df)
+            alteracoes[file_name] = 'anexado'
+        else:
+            _gravar_tabela(path, file_name, ler_csv(file_path))
+            alteracoes[file_name] = 'alterado'
+
+    gravar_manifesto(path, manifesto)
+    return alteracoes
@@ -0,0 +1,167 @@
+"""
+Cache do HTML renderizado dos mapas.
+
+O HTML de cada configuração de mapa (versão do dataset, tipo de mapa,
+amostras, estilo dos tiles...) é renderizado uma vez e guardado em um
+LRU limitado por bytes, compartilhado por todas as sessões do processo.
+Uma camada opcional em disco preserva o HTML entre reinícios e entre
+réplicas no mesmo host.
+"""
+import collections
+import hashlib
+import os
+import threading
+
+from olist.ingestao import PASTA_CACHE, VERSAO_ESQUEMA, caminho_temporario
+from olist.instrumentacao import registrar_cache
+
+
+# Limite do cache em memória (MB) e pasta da camada em disco
+# (OLIST_CACHE_MAPAS_DISCO vazio desliga a camada em disco)
+ENV_CACHE_MAPAS_MB = 'OLIST_CACHE_MAPAS_MB'
+ENV_CACHE_MAPAS_DISCO = 'OLIST_CACHE_MAPAS_DISCO'
+
+
+class CacheMapas:
+    """LRU de HTML de mapas limitado por bytes, com camada opcional em disco"""
+
+    def __init__(self, max_bytes=256 * 2**20, pasta_disco=None, max_bytes_disco=1024 * 2**20):
+        self.max_bytes = max_bytes
+        self.pasta_disco = pasta_disco
+        self.max_bytes_disco = max_bytes_disco
+        self._itens = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._em_construcao = {}
+        self.estatisticas = collections.Counter(
+            acertos_memoria=0, acertos_disco=0, falhas=0, descartes=0
+        )
+
+    @staticmethod
+    def _hash(chave):
+        return hashlib.blake2b(repr(chave).encode('utf-8'), digest_size=16).hexdigest()
+
+    def _caminho_disco(self, chave):
+        return os.path.join(self.pasta_disco, self._hash(chave) + '.html')
+
+    def _guardar_memoria(self, chave, html):
+        """Insere no LRU e descarta os itens menos usados além do limite (com _lock)"""
+        if chave in self._itens:
+            self._bytes -= len(self._itens.pop(chave))
+        if len(html) > self.max_bytes:
+            return
+        self._itens[chave] = html
+        self._bytes += len(html)
+        while self._bytes > self.max_bytes:
+            _, antigo = self._itens.popitem(last=False)
+            self._bytes -= len(antigo)
+            self.estatisticas['descartes'] += 1
+
+    def _ler_disco(self, chave):
+        if not self.pasta_disco:
+            return None
+        try:
+            with open(self._caminho_disco(chave), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _gravar_disco(self, chave, html):
+        if not self.pasta_disco:
+            return
+        try:
+            os.makedirs(self.pasta_disco, exist_ok=True)
+            caminho = self._caminho_disco(chave)
+            tmp_path = caminho_temporario(caminho)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, caminho)
+            self._podar_disco()
+        except OSError:
+            pass
+
+    def _podar_disco(self):
+        """Remove os arquivos mais antigos quando a pasta passa do limite"""
+        arquivos = []
+        for nome in os.listdir(self.pasta_disco):
+            if nome.endswith('.html'):
+                caminho = os.path.join(self.pasta_disco, nome)
+                stat = os.stat(caminho)
+                arquivos.append((stat.st_mtime, stat.st_size, caminho))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.max_bytes_disco:
+                break
+            os.remove(caminho)
+            total -= tamanho
+
+    def obter(self, chave):
+        """HTML em cache para a chave (memória, depois disco) ou None"""
+        with self._lock:
+            html = self._itens.get(chave)
+            if html is not None:
+                self._itens.move_to_end(chave)
+                self.estatisticas['acertos_memoria'] += 1
+                registrar_cache('mapas_html', acerto=True)
+                return html
+
+        html = self._ler_disco(chave)
+        with self._lock:
+            if html is not None:
+                self._guardar_memoria(chave, html)
+                self.estatisticas['acertos_disco'] += 1
+            else:
+                self.estatisticas['falhas'] += 1
+        registrar_cache('mapas_html', acerto=html is not None)
+        return html
+
+    def guardar(self, chave, html):
+        with self._lock:
+            self._guardar_memoria(chave, html)
+        self._gravar_disco(chave, html)
+
+    def obter_ou_renderizar(self, chave, renderizar):
+        """
+        Retorna o HTML da chave, chamando renderizar() só se não houver cache.
+        Sessões que pedem a mesma chave ao mesmo tempo esperam uma única renderização.
+        """
+        html = self.obter(chave)
+        if html is not None:
+            return html
+
+        with self._lock:
+            evento = self._em_construcao.get(chave)
+            dono = evento is None
+            if dono:
+                evento = self._em_construcao[chave] = threading.Event()
+
+        if not dono:
+            evento.wait()
+            html = self.obter(chave)
+            if html is not None:
+                return html
+            return renderizar()
+
+        try:
+            html = renderizar()
+            self.guardar(chave, html)
+            return html
+        finally:
+            with self._lock:
+                self._em_construcao.pop(chave, None)
+            evento.set()
+
+    def uso(self):
+        """Itens e bytes em memória, além dos contadores de acerto/falha"""
+        with self._lock:
+            return {'itens': len(self._itens), 'bytes': self._bytes, **self.estatisticas}
+
+
+def criar_cache_mapas(path):
+    """Cache de mapas configurado pelas variáveis de ambiente, com disco ao lado do dataset"""
+    max_mb = float(os.environ.get(ENV_CACHE_MAPAS_MB, 256))
+    pasta_disco = os.environ.get(
+        ENV_CACHE_MAPAS_DISCO,
+        os.path.join(path, PASTA_CACHE, VERSAO_ESQUEMA, 'mapas')
+    )
+    return CacheMapas(max_bytes=int(max_mb * 2**20), pasta_disco=pasta_disco or None)
@@ -0,0 +1,163 @@
+"""
+Chaves compactas: dicionário compartilhado por domínio de chave.
+
+As chaves do Olist (order_id, customer_id, ...) são hashes de 32
+caracteres que, como objetos Python, dominam a memória das tabelas e se
+repetem em várias delas. No modo compacto cada domínio é codificado uma
+única vez num dicionário compartilhado e as colunas de chave de todas
+as tabelas passam a ser categóricas com esse mesmo dicionário: só os
+códigos inteiros (int32 nos domínios grandes) ficam em cada tabela.
+
+A codificação roda em Arrow, sobre as tabelas mapeadas em memória, sem
+materializar as strings de cada tabela. Junções entre tabelas com o
+mesmo dicionário comparam códigos, e as strings originais só aparecem
+quando a coluna é exibida.
+
+OLIST_CHAVES_COMPACTAS=0 desliga o modo compacto.
+"""
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+ENV_CHAVES_COMPACTAS = 'OLIST_CHAVES_COMPACTAS'
+
+# Domínios de chave (a coluna tem o mesmo nome em todas as tabelas)
+CHAVES = [
+    'order_id',
+    'customer_id',
+    'customer_unique_id',
+    'seller_id',
+    'product_id',
+    'review_id',
+]
+
+
+def chaves_compactas_ativas():
+    """Modo compacto ligado (padrão) ou desligado por OLIST_CHAVES_COMPACTAS=0"""
+    return os.environ.get(ENV_CHAVES_COMPACTAS, '1') != '0'
+
+
+def construir_dicionarios(tabelas):
+    """
+    Valores distintos de cada domínio de chave em todas as tabelas Arrow
+    Retorna: dict {chave: pa.Array de strings}
+    """
+    dicionarios = {}
+    for chave in CHAVES:
+        pedacos = [
+            pedaco
+            for tabela in tabelas.values() if chave in tabela.column_names
+            for pedaco in tabela.column(chave).cast(pa.large_string()).chunks
+        ]
+        if pedacos:
+            valores = pa.chunked_array(pedacos, type=pa.large_string())
+            dicionarios[chave] = pc.drop_null(pc.unique(valores))
+    return dicionarios
+
+
+def _estender_dicionarios(anteriores, novas):
+    """
+    Dicionário de cada domínio: o da carga anterior (tabelas reaproveitadas)
+    com as chaves novas das tabelas a codificar acrescentadas ao final,
+    então os códigos já atribuídos não mudam.
+    Retorna: (dict {chave: CategoricalDtype}, dict {chave: pa.Array de strings})
+    """
+    tipos = {}
+    for df in anteriores.values():
+        for col in df.columns:
+            if _e_chave_compacta(df[col]):
+                tipos[col] = df[col].dtype
+
+    dicionarios = {}
+    for chave, valores in construir_dicionarios(novas).items():
+        if chave not in tipos:
+            tipos[chave] = pd.CategoricalDtype(pd.Index(valores.to_pandas()))
+            dicionarios[chave] = valores
+            continue
+        categorias = tipos[chave].categories
+        existentes = pa.array(categorias.to_numpy(dtype=object), type=pa.large_string())
+        faltando = pc.filter(valores, pc.invert(pc.is_in(valores, value_set=existentes)))
+        if len(faltando):
+            tipos[chave] = pd.CategoricalDtype(categorias.append(pd.Index(faltando.to_pandas())))
+            existentes = pa.concat_arrays([existentes, faltando])
+        dicionarios[chave] = existentes
+    return tipos, dicionarios
+
+
+def codificar_tabelas(tabelas, anteriores=None):
+    """
+    Converte as tabelas Arrow em DataFrames com as colunas de chave
+    categóricas sobre um dicionário compartilhado por domínio.
+    anteriores: {nome_do_arquivo: DataFrame já codificado} de uma carga
+    anterior, para tabelas que não mudaram. Só as demais são codificadas;
+    os dicionários anteriores só ganham as chaves novas (as que saíram do
+    dataset ficam até a próxima carga completa).
+    Retorna: dict {nome_do_arquivo: DataFrame}
+    """
+    anteriores = {
+        file_name: df for file_name, df in (anteriores or {}).items() if file_name in tabelas
+    }
+    novas = {
+        file_name: tabela for file_name, tabela in tabelas.items() if file_name not in anteriores
+    }
+    tipos, dicionarios = _estender_dicionarios(anteriores, novas)
+
+    dataframes = {}
+    for file_name, df in anteriores.items():
+        # Dicionário estendido: os mesmos códigos, com o dtype novo
+        estendidas = {
+            col: pd.Categorical.from_codes(df[col].array.codes, dtype=tipos[col])
+            for col in df.columns
+            if _e_chave_compacta(df[col]) and df[col].dtype is not tipos[col]
+        }
+        dataframes[file_name] = df.assign(**estendidas) if estendidas else df
+
+    for file_name, tabela in novas.items():
+        chaves = [col for col in tabela.column_names if col in tipos]
+        df = tabela.drop(chaves).to_pandas(split_blocks=True)
+        for chave in chaves:
+            codigos = pc.index_in(
+                tabela.column(chave).cast(pa.large_string()), value_set=dicionarios[chave]
+            )
+            df[chave] = pd.Categorical.from_codes(
+                codigos.fill_null(-1).to_numpy(), dtype=tipos[chave]
+            )
+        dataframes[file_name] = df[tabela.column_names]
+    return {file_name: dataframes[file_name] for file_name in tabelas}
+
+
+def _e_chave_compacta(serie):
+    return serie.name in CHAVES and isinstance(serie.dtype, pd.CategoricalDtype)
+
+
+def memoria_tabela(df):
+    """
+    Bytes de df (deep), contando só os códigos das chaves compactas:
+    os dicionários são compartilhados e contados em memoria_dicionarios
+    """
+    return int(sum(
+        df[col].array.codes.nbytes if _e_chave_compacta(df[col])
+        else df[col].memory_usage(index=False, deep=True)
+        for col in df.columns
+    ))
+
+
+def dicionarios_compartilhados(dfs):
+    """Dicionário (categorias) de cada domínio de chave compacta presente em dfs"""
+    dicionarios = {}
+    for df in dfs.values():
+        for col in df.columns:
+            if _e_chave_compacta(df[col]):
+                dicionarios[col] = df[col].cat.categories
+    return dicionarios
+
+
+def memoria_dicionarios(dfs):
+    """Bytes dos dicionários compartilhados das chaves compactas (cada um uma vez)"""
+    return int(sum(
+        categorias.memory_usage(deep=True)
+        for categorias in dicionarios_compartilhados(dfs).values()
+    ))
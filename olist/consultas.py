@@ -0,0 +1,399 @@
+"""
+Backend de consultas das agregações do dashboard.
+
+As agregações (status dos pedidos, métricas de entrega e a junção de
+clientes/vendedores com o índice de geolocalização) passam por um
+backend plugável que devolve apenas quadros pequenos para a interface:
+
+- ConsultasDuckDB: DuckDB embarcado sobre os Parquet do cache, com
+  leitura só das colunas usadas, filtros empurrados para o scan e
+  execução fora da memória (spill em disco ao lado do dataset);
+- ConsultasPandas: o caminho original em pandas sobre as tabelas já
+  carregadas, usado como fallback.
+
+OLIST_BACKEND escolhe o backend ('duckdb' ou 'pandas'). Sem o pacote
+duckdb, sem os Parquet do cache ou se uma consulta falhar, o pandas
+assume. Sob o DuckDB as tabelas não são carregadas no pandas de antemão
+(ver olist.armazem.TabelasSobDemanda): o fallback monta só as que usa.
+"""
+import importlib.util
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from olist.amostragem import EXPOENTE_ALOCACAO, ordenar_para_amostragem
+
+from olist.entregas import (
+    COLUNAS_DATA, ROTULOS_CATEGORIA, SEGUNDOS_DIA,
+    calcular_metricas_entrega, tabela_categorias, tabela_estatisticas,
+)
+from olist.geo import (
+    ARQUIVO_GEO, COLUNA_CEP, carregar_indice_geo, construir_indice_geo, geocodificar,
+)
+from olist.ingestao import PASTA_CACHE, VERSAO_ESQUEMA, caminho_cache
+
+
+ENV_BACKEND = 'OLIST_BACKEND'
+ENV_MEMORIA_DUCKDB = 'OLIST_DUCKDB_MEMORIA'
+
+ARQUIVO_PEDIDOS = 'olist_orders_dataset.csv'
+
+# Tabelas com coordenadas: (arquivo, coluna do prefixo de CEP, coluna do estado)
+TABELAS_LOCALIZACAO = {
+    'clientes': ('olist_customers_dataset.csv', 'customer_zip_code_prefix', 'customer_state'),
+    'vendedores': ('olist_sellers_dataset.csv', 'seller_zip_code_prefix', 'seller_state'),
+}
+
+# Pedidos entregues devolvidos para boxplots e amostra da tabela
+LIMITE_PEDIDOS = 100_000
+
+
+class ConsultasPandas:
+    """Agregações em pandas sobre as tabelas carregadas em memória"""
+
+    nome = 'pandas'
+
+    def __init__(self, path, dfs, impressoes):
+        self.path = path
+        self.dfs = dfs
+        self.impressoes = impressoes
+        self._localizados = {}
+        self._ordenados = {}
+
+    def contagem_status(self):
+        """Pedidos por status: DataFrame(Status, Quantidade), do maior para o menor"""
+        orders_df = self.dfs.get(ARQUIVO_PEDIDOS)
+        if orders_df is None or 'order_status' not in orders_df.columns:
+            return None
+        status_counts = orders_df['order_status'].value_counts().reset_index()
+        status_counts.columns = ['Status', 'Quantidade']
+        return status_counts
+
+    def metricas_entrega(self):
+        """Métricas da seção de entregas (ver calcular_metricas_entrega)"""
+        orders_df = self.dfs.get(ARQUIVO_PEDIDOS)
+        if orders_df is None:
+            return None
+        return calcular_metricas_entrega(orders_df)
+
+    def _localizacoes(self, tabela):
+        if tabela not in self._localizados:
+            file_name, coluna_cep, _ = TABELAS_LOCALIZACAO[tabela]
+            impressao = self.impressoes.get(ARQUIVO_GEO)
+            if impressao:
+                indice = carregar_indice_geo(self.path, self.dfs[ARQUIVO_GEO], impressao)
+            else:
+                indice = construir_indice_geo(self.dfs[ARQUIVO_GEO])
+            localizados = geocodificar(self.dfs[file_name], coluna_cep, indice)
+            self._localizados[tabela] = localizados.dropna(
+                subset=['geolocation_lat', 'geolocation_lng']
+            )
+        return self._localizados[tabela]
+
+    def contar_localizados(self, tabela, mascara=None):
+        """
+        Linhas de tabela ('clientes' ou 'vendedores') com coordenadas válidas
+        mascara: máscara booleana das linhas da tabela (filtros globais)
+        """
+        localizados = self._localizacoes(tabela)
+        if mascara is None:
+            return len(localizados)
+        return int(np.count_nonzero(mascara[localizados.index.to_numpy()]))
+
+    def amostra_localizados(self, tabela, n, modo='estratificada', semente=42, mascara=None):
+        """
+        Amostra de n linhas de tabela com coordenadas válidas (ver olist.amostragem).
+        A ordem de amostragem é calculada uma vez; cada n é uma fatia do prefixo
+        (com mascara, do prefixo das linhas da máscara).
+        """
+        chave = (tabela, modo, semente)
+        if chave not in self._ordenados:
+            _, coluna_cep, coluna_estado = TABELAS_LOCALIZACAO[tabela]
+            self._ordenados[chave] = ordenar_para_amostragem(
+                self._localizacoes(tabela), coluna_estado, coluna_cep, modo, semente
+            )
+        ordenados = self._ordenados[chave]
+        if mascara is None:
+            return ordenados.head(n)
+        selecionados = np.flatnonzero(mascara[ordenados.index.to_numpy()])
+        return ordenados.iloc[selecionados[:n]]
+
+
+class ConsultasDuckDB(ConsultasPandas):
+    """Agregações em DuckDB sobre os Parquet do cache (pandas se a consulta falhar)"""
+
+    nome = 'duckdb'
+
+    def __init__(self, path, dfs, impressoes):
+        super().__init__(path, dfs, impressoes)
+        import duckdb
+
+        self.con = duckdb.connect()
+        self._lock = threading.Lock()
+        self._ordenadas = set()
+        pasta_temp = os.path.join(path, PASTA_CACHE, VERSAO_ESQUEMA, 'duckdb')
+        os.makedirs(pasta_temp, exist_ok=True)
+        # Caminhos e valores vindos de fora como parâmetros, nunca no texto do SQL
+        self.con.execute("SET temp_directory = ?", [pasta_temp])
+        if os.environ.get(ENV_MEMORIA_DUCKDB):
+            self.con.execute("SET memory_limit = ?", [os.environ[ENV_MEMORIA_DUCKDB]])
+
+        # Uma view por Parquet do cache; as consultas leem só o que usam
+        self.views = {}
+        for file_name in [ARQUIVO_PEDIDOS, ARQUIVO_GEO] + [
+            arquivo for arquivo, _, _ in TABELAS_LOCALIZACAO.values()
+        ]:
+            parquet_path = caminho_cache(path, file_name)
+            if not os.path.exists(parquet_path):
+                continue
+            view = os.path.splitext(file_name)[0]
+            # CREATE VIEW não aceita parâmetros: a view vem da relação do Parquet
+            self.con.read_parquet(parquet_path).create_view(view)
+            self.views[file_name] = view
+
+        if ARQUIVO_PEDIDOS not in self.views:
+            raise FileNotFoundError(caminho_cache(path, ARQUIVO_PEDIDOS))
+
+        if ARQUIVO_GEO in self.views:
+            # Centroide por prefixo de CEP, materializado uma vez
+            self.con.execute(f"""
+                CREATE TABLE indice_geo AS
+                SELECT {COLUNA_CEP} AS cep,
+                       avg(geolocation_lat)::FLOAT AS geolocation_lat,
+                       avg(geolocation_lng)::FLOAT AS geolocation_lng
+                FROM {self.views[ARQUIVO_GEO]}
+                WHERE geolocation_lat IS NOT NULL AND geolocation_lng IS NOT NULL
+                GROUP BY 1
+            """)
+
+    def _consultar(self, sql, *parametros):
+        # Um cursor por consulta: o backend é compartilhado entre sessões
+        return self.con.cursor().execute(sql, list(parametros)).df()
+
+    def contagem_status(self):
+        try:
+            return self._consultar(f"""
+                SELECT order_status AS Status, count(*) AS Quantidade
+                FROM {self.views[ARQUIVO_PEDIDOS]}
+                GROUP BY 1
+                ORDER BY 2 DESC
+            """)
+        except Exception:
+            return super().contagem_status()
+
+    def metricas_entrega(self):
+        try:
+            return self._metricas_entrega()
+        except Exception:
+            return super().metricas_entrega()
+
+    def _metricas_entrega(self):
+        colunas = self._consultar(f"DESCRIBE {self.views[ARQUIVO_PEDIDOS]}")['column_name']
+        faltando = [col for col in COLUNAS_DATA if col not in set(colunas)]
+        if faltando:
+            return {'faltando': faltando}
+
+        entregues = f"""
+            SELECT *, tempo_real_dias - tempo_estimado_dias AS diferenca_dias
+            FROM (
+                SELECT order_id, {', '.join(COLUNAS_DATA)},
+                       epoch(order_delivered_customer_date - order_purchase_timestamp)
+                           / {SEGUNDOS_DIA} AS tempo_real_dias,
+                       epoch(order_estimated_delivery_date - order_purchase_timestamp)
+                           / {SEGUNDOS_DIA} AS tempo_estimado_dias
+                FROM {self.views[ARQUIVO_PEDIDOS]}
+                WHERE order_status = 'delivered'
+                  AND order_delivered_customer_date IS NOT NULL
+            )
+        """
+
+        resumo = self._consultar(f"""
+            SELECT count(*) AS total,
+                   avg(tempo_real_dias) AS tempo_medio_real,
+                   avg(tempo_estimado_dias) AS tempo_medio_estimado,
+                   avg(diferenca_dias) AS diferenca_media,
+                   count(*) FILTER (WHERE diferenca_dias <= 0) AS no_prazo,
+                   min(tempo_real_dias) AS minimo,
+                   max(tempo_real_dias) AS maximo,
+                   median(tempo_real_dias) AS mediana,
+                   stddev_samp(tempo_real_dias) AS desvio,
+                   count(*) FILTER (WHERE diferenca_dias < -1) AS antecipadas,
+                   count(*) FILTER (WHERE diferenca_dias > 1) AS atrasadas,
+                   count(*) FILTER (WHERE abs(diferenca_dias) <= 1) AS pontuais
+            FROM ({entregues})
+        """).iloc[0]
+
+        # Só uma amostra dos pedidos sobe para a interface
+        pedidos = self._consultar(f"""
+            SELECT * FROM ({entregues})
+            ORDER BY hash(order_id)
+            LIMIT {LIMITE_PEDIDOS}
+        """)
+
+        total = int(resumo['total'])
+        if total == 0:
+            return {'pedidos': pedidos, 'total': 0}
+
+        kpis = {
+            'tempo_medio_real': float(resumo['tempo_medio_real']),
+            'tempo_medio_estimado': float(resumo['tempo_medio_estimado']),
+            'diferenca_media': float(resumo['diferenca_media']),
+            'percentual_no_prazo': float(resumo['no_prazo'] / total * 100),
+        }
+
+        estatisticas = tabela_estatisticas(
+            resumo['minimo'], resumo['maximo'], resumo['mediana'], resumo['desvio'],
+            int(resumo['antecipadas']), int(resumo['atrasadas']), int(resumo['pontuais']), total
+        )
+
+        # Mesmas faixas de BINS_CATEGORIA (intervalos fechados à direita)
+        contagens = self._consultar(f"""
+            SELECT CASE
+                       WHEN diferenca_dias <= -3 THEN 0
+                       WHEN diferenca_dias <= -1 THEN 1
+                       WHEN diferenca_dias <= 1 THEN 2
+                       WHEN diferenca_dias <= 3 THEN 3
+                       ELSE 4
+                   END AS faixa,
+                   count(*) AS n
+            FROM ({entregues})
+            WHERE diferenca_dias IS NOT NULL
+            GROUP BY 1
+        """)
+        categorias = tabela_categorias(
+            pd.Series(
+                contagens['n'].to_numpy(),
+                index=[ROTULOS_CATEGORIA[faixa] for faixa in contagens['faixa']]
+            ),
+            total
+        )
+
+        tendencia_mensal = self._consultar(f"""
+            SELECT strftime(date_trunc('month', order_purchase_timestamp), '%Y-%m') AS mes_ano,
+                   avg(tempo_real_dias) AS tempo_real_dias,
+                   avg(tempo_estimado_dias) AS tempo_estimado_dias,
+                   avg(diferenca_dias) AS diferenca_dias
+            FROM ({entregues})
+            WHERE order_purchase_timestamp IS NOT NULL
+            GROUP BY 1
+            ORDER BY 1
+        """)
+
+        return {
+            'pedidos': pedidos,
+            'total': total,
+            'kpis': kpis,
+            'estatisticas': estatisticas,
+            'categorias': categorias,
+            'tendencia_mensal': tendencia_mensal,
+        }
+
+    def _juncao_localizados(self, tabela):
+        file_name, coluna_cep, _ = TABELAS_LOCALIZACAO[tabela]
+        return f"""
+            SELECT t.*, g.geolocation_lat, g.geolocation_lng
+            FROM {self.views[file_name]} t
+            JOIN indice_geo g ON t.{coluna_cep} = g.cep
+        """
+
+    def contar_localizados(self, tabela, mascara=None):
+        # A máscara vem das tabelas em memória: o filtro roda em pandas
+        if mascara is not None:
+            return super().contar_localizados(tabela, mascara)
+        try:
+            return int(self._consultar(
+                f"SELECT count(*) AS n FROM ({self._juncao_localizados(tabela)})"
+            )['n'].iloc[0])
+        except Exception:
+            return super().contar_localizados(tabela)
+
+    def _tabela_ordenada(self, tabela, modo, semente):
+        """
+        Materializa (uma vez) a junção de tabela com a coluna _posicao da
+        ordem de amostragem, calculada em SQL com o mesmo esquema de
+        olist.amostragem (sorteios vindos de hash da linha)
+        """
+        if modo not in ('estratificada', 'uniforme'):
+            raise ValueError(f"Modo de amostragem desconhecido: {modo}")
+        nome = f"amostra_{tabela}_{modo}_{int(semente)}"
+        with self._lock:
+            if nome in self._ordenadas:
+                return nome
+
+            _, coluna_cep, coluna_estado = TABELAS_LOCALIZACAO[tabela]
+            sorteio = "hash(j0, {}) / 18446744073709551616.0"
+            if modo == 'uniforme':
+                chave = "_u1"
+            else:
+                chave = "_k_estado, _u1"
+            self.con.execute(f"""
+                CREATE TABLE {nome} AS
+                WITH j AS (
+                    SELECT *,
+                           {sorteio.format(int(semente))} AS _u1,
+                           {sorteio.format(int(semente) + 1)} AS _u2,
+                           {sorteio.format(int(semente) + 2)} AS _u3
+                    FROM ({self._juncao_localizados(tabela)}) j0
+                ), c AS (
+                    SELECT *,
+                           (row_number() OVER (PARTITION BY {coluna_estado}, {coluna_cep} ORDER BY _u1)
+                               - 1 + _u2)
+                           / pow(count(*) OVER (PARTITION BY {coluna_estado}, {coluna_cep}),
+                                 {EXPOENTE_ALOCACAO}) AS _k_cep
+                    FROM j
+                ), e AS (
+                    SELECT *,
+                           (row_number() OVER (PARTITION BY {coluna_estado} ORDER BY _k_cep)
+                               - 1 + _u3)
+                           / pow(count(*) OVER (PARTITION BY {coluna_estado}),
+                                 {EXPOENTE_ALOCACAO}) AS _k_estado
+                    FROM c
+                )
+                SELECT * EXCLUDE (_u1, _u2, _u3, _k_cep, _k_estado),
+                       row_number() OVER (ORDER BY {chave}) - 1 AS _posicao
+                FROM e
+                ORDER BY _posicao
+            """)
+            self._ordenadas.add(nome)
+        return nome
+
+    def amostra_localizados(self, tabela, n, modo='estratificada', semente=42, mascara=None):
+        if mascara is not None:
+            return super().amostra_localizados(tabela, n, modo, semente, mascara)
+        try:
+            nome = self._tabela_ordenada(tabela, modo, semente)
+            # Tabela gravada em ordem: o filtro por _posicao só lê o prefixo
+            return self._consultar(f"""
+                SELECT * EXCLUDE (_posicao) FROM {nome}
+                WHERE _posicao < ?
+                ORDER BY _posicao
+            """, int(n))
+        except Exception:
+            return super().amostra_localizados(tabela, n, modo, semente)
+
+
+def backend_escolhido(backend=None):
+    """
+    'duckdb' ou 'pandas' (padrão: OLIST_BACKEND, ou 'duckdb');
+    'pandas' se o pacote duckdb não estiver instalado
+    """
+    backend = backend or os.environ.get(ENV_BACKEND, 'duckdb')
+    if backend == 'duckdb' and importlib.util.find_spec('duckdb') is None:
+        return 'pandas'
+    return backend
+
+
+def criar_consultas(path, dfs, impressoes, backend=None):
+    """
+    Backend de consultas do dataset em path.
+    backend: 'duckdb' ou 'pandas' (ver backend_escolhido)
+    """
+    backend = backend_escolhido(backend)
+    if backend == 'duckdb':
+        try:
+            return ConsultasDuckDB(path, dfs, impressoes)
+        except Exception:
+            pass
+    return ConsultasPandas(path, dfs, impressoes)
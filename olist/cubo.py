@@ -0,0 +1,258 @@
+"""
+Cubo OLAP materializado dos pedidos.
+
+Uma vez por versão do dataset a tabela fato (olist.fatos) é agregada em um
+cubo com as dimensões mês da compra × estado do cliente × estado do
+vendedor × status do pedido × categoria do produto e apenas medidas
+aditivas (somas), mais mínimo e máximo do tempo de entrega, que também
+se combinam entre células. Gráficos e KPIs são respostas de um rollup
+do cubo, cujo número de células para de crescer com o volume de linhas,
+em vez de uma passada pelas linhas.
+
+As medidas de pedido (contagem, tempos de entrega, atrasos) entram em
+cada item com o peso da tabela fato (1 / itens do pedido), de modo que
+somadas sobre vendedor e categoria dão exatamente os valores do pedido.
+As medidas de item (receita, frete, itens) não têm peso e atendem também
+a filtros de vendedor e categoria (ver cubo_atende).
+
+Medianas não são aditivas e continuam vindo das linhas dos pedidos
+entregues (ver metricas_cubo).
+"""
+import numpy as np
+import pandas as pd
+
+from olist.entregas import ROTULOS_CATEGORIA, tabela_categorias, tabela_estatisticas
+from olist.fatos import DIMENSOES, SEM_ITENS, SEM_VALOR, impressao_fatos
+from olist.filtros import filtro_de_itens
+from olist.ingestao import caminho_cache_derivado, gravar_cache_derivado, ler_cache
+
+
+TABELA_CUBO = 'cubo_pedidos'
+
+# Limites (fechados à direita) das faixas de BINS_CATEGORIA
+LIMITES_FAIXAS = [-3, -1, 1, 3]
+FAIXAS = [f'faixa_{k}' for k in range(len(ROTULOS_CATEGORIA))]
+
+MEDIDAS = [
+    'pedidos', 'itens', 'receita', 'frete',
+    'entregues', 'soma_real', 'soma_real2',
+    'estimados', 'soma_estimado', 'soma_diferenca',
+    'no_prazo', 'antecipadas', 'atrasadas', 'pontuais',
+] + FAIXAS
+
+AGREGACOES = {**{medida: 'sum' for medida in MEDIDAS}, 'min_real': 'min', 'max_real': 'max'}
+
+
+def construir_cubo(fatos):
+    """
+    Agrega a tabela fato no cubo
+    Retorna: DataFrame(DIMENSOES..., MEDIDAS..., min_real, max_real), uma linha por célula
+    """
+    peso = fatos['peso'].to_numpy()
+    entregue = fatos['entregue'].to_numpy()
+    real = fatos['tempo_real_dias'].to_numpy()
+    estimado = fatos['tempo_estimado_dias'].to_numpy()
+    diferenca = fatos['diferenca_dias'].to_numpy()
+    com_estimativa = entregue & ~np.isnan(estimado)
+    faixa = np.searchsorted(LIMITES_FAIXAS, diferenca, side='left')
+
+    def ponderada(condicao, valores=1.0):
+        return np.where(condicao, peso * valores, 0.0)
+
+    medidas = pd.DataFrame({
+        **{dimensao: fatos[dimensao] for dimensao in DIMENSOES},
+        'pedidos': peso,
+        'itens': fatos['eh_item'].to_numpy(dtype='float64'),
+        'receita': np.nan_to_num(fatos['preco'].to_numpy()),
+        'frete': np.nan_to_num(fatos['frete'].to_numpy()),
+        'entregues': ponderada(entregue),
+        'soma_real': ponderada(entregue, real),
+        'soma_real2': ponderada(entregue, real ** 2),
+        'estimados': ponderada(com_estimativa),
+        'soma_estimado': ponderada(com_estimativa, estimado),
+        'soma_diferenca': ponderada(com_estimativa, diferenca),
+        'no_prazo': ponderada(com_estimativa & (diferenca <= 0)),
+        'antecipadas': ponderada(com_estimativa & (diferenca < -1)),
+        'atrasadas': ponderada(com_estimativa & (diferenca > 1)),
+        'pontuais': ponderada(com_estimativa & (np.abs(diferenca) <= 1)),
+        **{
+            coluna: ponderada(com_estimativa & (faixa == k))
+            for k, coluna in enumerate(FAIXAS)
+        },
+        'min_real': real,
+        'max_real': real,
+    })
+
+    cubo = medidas.groupby(DIMENSOES, sort=True, observed=True).agg(AGREGACOES).reset_index()
+    for medida in MEDIDAS:
+        cubo[medida] = cubo[medida].astype('float64')
+    return cubo
+
+
+def carregar_cubo(path, fatos, impressoes):
+    """
+    Retorna o cubo, lendo/gravando o cache ao lado do dataset
+    (None sem a tabela fato)
+    """
+    if fatos is None:
+        return None
+    impressao = impressao_fatos(impressoes)
+    cubo = ler_cache(caminho_cache_derivado(path, TABELA_CUBO, impressao))
+    if cubo is not None:
+        return cubo
+
+    cubo = construir_cubo(fatos)
+    gravar_cache_derivado(cubo, path, TABELA_CUBO, impressao)
+    return cubo
+
+
+# ========== CONSULTAS AO CUBO ==========
+def cubo_atende(filtro, por_item=False):
+    """
+    O filtro cabe nas dimensões do cubo: período em meses inteiros e, nas
+    consultas de medidas de pedido, sem estado do vendedor nem categoria.
+    Esses filtros selecionam o pedido inteiro se algum item atende, e o
+    cubo reparte o pedido entre os itens. por_item: a consulta só lê
+    medidas de item (receita, frete, itens), que eles recortam sem
+    repartir nada.
+    """
+    if filtro is None:
+        return True
+    if not por_item and filtro_de_itens(filtro):
+        return False
+    if filtro.inicio is not None and filtro.inicio.day != 1:
+        return False
+    if filtro.fim is not None and (pd.Timestamp(filtro.fim) + pd.Timedelta(days=1)).day != 1:
+        return False
+    return True
+
+
+def filtrar_cubo(cubo, filtro=None):
+    """Células do cubo dentro do filtro (ver cubo_atende)"""
+    if filtro is None:
+        return cubo
+    mascara = np.ones(len(cubo), dtype=bool)
+    mes = cubo['mes'].astype(str)
+    if filtro.inicio is not None or filtro.fim is not None:
+        mascara &= (mes != SEM_VALOR).to_numpy()
+    if filtro.inicio is not None:
+        mascara &= (mes >= f"{filtro.inicio:%Y-%m}").to_numpy()
+    if filtro.fim is not None:
+        mascara &= (mes <= f"{filtro.fim:%Y-%m}").to_numpy()
+    if filtro.estados_cliente:
+        mascara &= cubo['estado_cliente'].isin(list(filtro.estados_cliente)).to_numpy()
+    if filtro.status:
+        mascara &= cubo['status'].isin(list(filtro.status)).to_numpy()
+    if filtro.estados_vendedor:
+        mascara &= cubo['estado_vendedor'].isin(list(filtro.estados_vendedor)).to_numpy()
+    if filtro.categorias:
+        mascara &= cubo['categoria'].isin(list(filtro.categorias)).to_numpy()
+    return cubo[mascara]
+
+
+def rollup(cubo, por=(), filtro=None):
+    """
+    Agrega o cubo (filtrado) pelas dimensões de por
+    Retorna: DataFrame indexado por por (ou Series com o total, sem por)
+    """
+    cubo = filtrar_cubo(cubo, filtro)
+    if not por:
+        return cubo[list(AGREGACOES)].agg(AGREGACOES)
+    return cubo.groupby(list(por), observed=True).agg(AGREGACOES)
+
+
+def contagem_status_cubo(cubo, filtro=None):
+    """Pedidos por status: DataFrame(Status, Quantidade), do maior para o menor"""
+    por_status = rollup(cubo, ['status'], filtro)['pedidos'].round().astype('int64')
+    por_status = por_status[por_status > 0].sort_values(ascending=False, kind='stable')
+    return pd.DataFrame({
+        'Status': por_status.index.astype(str),
+        'Quantidade': por_status.to_numpy(),
+    })
+
+
+def metricas_cubo(cubo, filtro=None, pedidos=None):
+    """
+    Métricas da seção de entregas (mesmo formato de calcular_metricas_entrega)
+    a partir do cubo. pedidos: linhas dos pedidos entregues do filtro, usadas
+    para a mediana, os boxplots e a amostra da tabela.
+    """
+    if pedidos is None:
+        pedidos = pd.DataFrame(columns=['tempo_real_dias', 'tempo_estimado_dias', 'diferenca_dias'])
+    total_celulas = rollup(cubo, filtro=filtro)
+    total = int(round(total_celulas['entregues']))
+    if total == 0:
+        return {'pedidos': pedidos, 'total': 0}
+
+    estimados = total_celulas['estimados']
+    soma, soma2 = total_celulas['soma_real'], total_celulas['soma_real2']
+    desvio = np.sqrt(max(soma2 - soma ** 2 / total, 0.0) / (total - 1)) if total > 1 else np.nan
+
+    kpis = {
+        'tempo_medio_real': float(soma / total),
+        'tempo_medio_estimado': float(total_celulas['soma_estimado'] / estimados),
+        'diferenca_media': float(total_celulas['soma_diferenca'] / estimados),
+        'percentual_no_prazo': float(total_celulas['no_prazo'] / total * 100),
+    }
+
+    mediana = float(np.nanmedian(pedidos['tempo_real_dias'])) if len(pedidos) else np.nan
+    estatisticas = tabela_estatisticas(
+        total_celulas['min_real'], total_celulas['max_real'], mediana, desvio,
+        int(round(total_celulas['antecipadas'])), int(round(total_celulas['atrasadas'])),
+        int(round(total_celulas['pontuais'])), total
+    )
+
+    categorias = tabela_categorias(
+        pd.Series(
+            [round(total_celulas[faixa]) for faixa in FAIXAS], index=ROTULOS_CATEGORIA
+        ),
+        total
+    )
+
+    por_mes = rollup(cubo, ['mes'], filtro)
+    por_mes = por_mes[(por_mes['entregues'] > 0.5) & (por_mes.index.astype(str) != SEM_VALOR)]
+    tendencia_mensal = pd.DataFrame({
+        'mes_ano': por_mes.index.astype(str),
+        'tempo_real_dias': (por_mes['soma_real'] / por_mes['entregues']).to_numpy(),
+        'tempo_estimado_dias': (por_mes['soma_estimado'] / por_mes['estimados']).to_numpy(),
+        'diferenca_dias': (por_mes['soma_diferenca'] / por_mes['estimados']).to_numpy(),
+    })
+
+    return {
+        'pedidos': pedidos,
+        'total': total,
+        'kpis': kpis,
+        'estatisticas': estatisticas,
+        'categorias': categorias,
+        'tendencia_mensal': tendencia_mensal,
+    }
+
+
+def receita_cubo(cubo, filtro=None, pedidos=None):
+    """
+    Receita dos itens por categoria (mesmo formato de receita_por_categoria)
+    a partir do cubo. pedidos: número de pedidos do filtro; com filtro de
+    vendedor ou categoria ele vem da seleção (IndiceFiltros.resumo), pois
+    pedidos distintos não se somam entre células. Sem ele a contagem sai
+    dos pesos, exata quando nenhum filtro recorta os itens.
+    """
+    por_categoria = rollup(cubo, ['categoria'], filtro)
+    por_categoria = por_categoria[por_categoria.index.astype(str) != SEM_ITENS]
+    categorias = pd.DataFrame({
+        'categoria': por_categoria.index.astype(str),
+        'itens': por_categoria['itens'].round().astype('int64').to_numpy(),
+        'receita': por_categoria['receita'].to_numpy(),
+        'frete': por_categoria['frete'].to_numpy(),
+    })
+    categorias = categorias[categorias['itens'] > 0]
+    categorias = categorias.sort_values('receita', ascending=False, kind='stable', ignore_index=True)
+    categorias['preco_medio'] = categorias['receita'] / categorias['itens']
+    if pedidos is None:
+        pedidos = int(round(por_categoria['pedidos'].sum()))
+    return {
+        'categorias': categorias,
+        'receita': float(categorias['receita'].sum()),
+        'frete': float(categorias['frete'].sum()),
+        'itens': int(categorias['itens'].sum()),
+        'pedidos': pedidos,
+    }
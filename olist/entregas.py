@@ -0,0 +1,169 @@
+"""
+Motor de métricas de tempo de entrega.
+
+Deriva as colunas de tempo dos pedidos entregues e calcula KPIs,
+estatísticas, categorias e tendência mensal em uma única passada
+vetorizada. O resultado é cacheado por versão do dataset, então um
+rerun da página só executa o código de renderização.
+"""
+import numpy as np
+import pandas as pd
+
+
+COLUNAS_DATA = [
+    'order_purchase_timestamp',
+    'order_delivered_customer_date',
+    'order_estimated_delivery_date',
+]
+
+SEGUNDOS_DIA = 24 * 3600
+
+# Faixas da diferença real - estimado (dias)
+BINS_CATEGORIA = [-float('inf'), -3, -1, 1, 3, float('inf')]
+ROTULOS_CATEGORIA = [
+    'Muito Adiantada (-3+ dias)', 'Adiantada (1-3 dias)',
+    'Pontual (±1 dia)', 'Atrasada (1-3 dias)',
+    'Muito Atrasada (3+ dias)'
+]
+
+
+def _dias(fim, inicio):
+    """Diferença entre duas colunas datetime em dias (float)"""
+    return (fim - inicio).dt.total_seconds().to_numpy(dtype='float64') / SEGUNDOS_DIA
+
+
+def pedidos_entregues(orders_df):
+    """
+    Pedidos entregues com as colunas tempo_real_dias, tempo_estimado_dias
+    e diferenca_dias (positiva = atraso, negativa = adiantado)
+    """
+    datas = {
+        col: pd.to_datetime(orders_df[col], errors='coerce')
+        for col in COLUNAS_DATA
+    }
+    mascara = (
+        (orders_df['order_status'] == 'delivered').to_numpy()
+        & datas['order_delivered_customer_date'].notna().to_numpy()
+    )
+
+    entregues = pd.DataFrame({'order_id': orders_df['order_id'].array[mascara]})
+    for col, serie in datas.items():
+        entregues[col] = serie.to_numpy()[mascara]
+
+    compra = entregues['order_purchase_timestamp']
+    entregues['tempo_real_dias'] = _dias(entregues['order_delivered_customer_date'], compra)
+    entregues['tempo_estimado_dias'] = _dias(entregues['order_estimated_delivery_date'], compra)
+    entregues['diferenca_dias'] = entregues['tempo_real_dias'] - entregues['tempo_estimado_dias']
+    return entregues
+
+
+def tabela_estatisticas(minimo, maximo, mediana, desvio,
+                        antecipadas, atrasadas, pontuais, total):
+    """Tabela de estatísticas detalhadas exibida na seção de entregas"""
+    return pd.DataFrame({
+        'Métrica': [
+            'Tempo Mínimo de Entrega (dias)',
+            'Tempo Máximo de Entrega (dias)',
+            'Mediana de Entrega (dias)',
+            'Desvio Padrão (dias)',
+            'Entregas Antecipadas (< -1 dia)',
+            'Entregas Atrasadas (> +1 dia)',
+            'Entregas Pontuais (± 1 dia)'
+        ],
+        'Valor': [
+            f"{minimo:.1f}",
+            f"{maximo:.1f}",
+            f"{mediana:.1f}",
+            f"{desvio:.1f}",
+            f"{antecipadas:,}",
+            f"{atrasadas:,}",
+            f"{pontuais:,}"
+        ],
+        'Porcentagem': [
+            "-",
+            "-",
+            "-",
+            "-",
+            f"{antecipadas / total * 100:.1f}%",
+            f"{atrasadas / total * 100:.1f}%",
+            f"{pontuais / total * 100:.1f}%"
+        ]
+    })
+
+
+def tabela_categorias(contagens, total):
+    """
+    Quantidade e porcentagem por categoria de entrega
+    contagens: Series indexada pelo rótulo da categoria (rótulos ausentes = 0)
+    """
+    contagens = (
+        pd.Series(contagens, dtype='float64')
+        .reindex(ROTULOS_CATEGORIA, fill_value=0)
+        .astype('int64')
+        .sort_values(ascending=False, kind='stable')
+    )
+    categoria_counts = contagens.rename_axis('Categoria').reset_index(name='Quantidade')
+    categoria_counts['Porcentagem'] = (categoria_counts['Quantidade'] / total * 100).round(1)
+    return categoria_counts
+
+
+def calcular_metricas_entrega(orders_df):
+    """
+    Calcula todas as métricas da seção de tempo de entrega
+    Retorna: dict com pedidos, total, kpis, estatisticas, categorias e tendencia_mensal
+             (ou {'faltando': [...]} se faltarem colunas de data)
+    """
+    faltando = [col for col in COLUNAS_DATA if col not in orders_df.columns]
+    if faltando:
+        return {'faltando': faltando}
+
+    entregues = pedidos_entregues(orders_df)
+    total = len(entregues)
+    if total == 0:
+        return {'pedidos': entregues, 'total': 0}
+
+    real = entregues['tempo_real_dias'].to_numpy()
+    estimado = entregues['tempo_estimado_dias'].to_numpy()
+    diferenca = entregues['diferenca_dias'].to_numpy()
+
+    antecipadas = int(np.count_nonzero(diferenca < -1))
+    atrasadas = int(np.count_nonzero(diferenca > 1))
+    pontuais = int(np.count_nonzero(np.abs(diferenca) <= 1))
+
+    kpis = {
+        'tempo_medio_real': float(np.nanmean(real)),
+        'tempo_medio_estimado': float(np.nanmean(estimado)),
+        'diferenca_media': float(np.nanmean(diferenca)),
+        'percentual_no_prazo': float(np.count_nonzero(diferenca <= 0) / total * 100),
+    }
+
+    estatisticas = tabela_estatisticas(
+        np.nanmin(real), np.nanmax(real), np.nanmedian(real), np.nanstd(real, ddof=1),
+        antecipadas, atrasadas, pontuais, total
+    )
+
+    # Categorização das entregas
+    categorias = pd.cut(
+        entregues['diferenca_dias'], bins=BINS_CATEGORIA, labels=ROTULOS_CATEGORIA
+    )
+    categoria_counts = tabela_categorias(categorias.value_counts(), total)
+
+    # Tendência mensal (médias por mês da compra)
+    mes = entregues['order_purchase_timestamp'].to_numpy().astype('datetime64[M]')
+    tendencia_mensal = (
+        entregues[['tempo_real_dias', 'tempo_estimado_dias', 'diferenca_dias']]
+        .groupby(mes)
+        .mean()
+        .rename_axis('mes_ano')
+        .reset_index()
+    )
+    tendencia_mensal['mes_ano'] = tendencia_mensal['mes_ano'].dt.strftime('%Y-%m')
+
+    return {
+        'pedidos': entregues,
+        'total': total,
+        'kpis': kpis,
+        'estatisticas': estatisticas,
+        'categorias': categoria_counts,
+        'tendencia_mensal': tendencia_mensal,
+    }
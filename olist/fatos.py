@@ -0,0 +1,360 @@
+"""
+Tabela fato dos pedidos.
+
+Pedidos, itens, pagamentos, avaliações, produtos, clientes e vendedores
+são unidos uma vez por versão do dataset em uma única tabela colunar, no
+grão do item de pedido. As medidas de pedido (valor pago, forma de
+pagamento, parcelas, nota da avaliação, tempos de entrega) vêm
+pré-agregadas e se repetem nos itens do pedido:
+
+- primeiro_item marca uma linha por pedido (análises por pedido);
+- peso = 1 / itens do pedido reparte o pedido entre os itens (somas por
+  vendedor ou categoria que fecham no total do pedido).
+
+Pedidos sem itens entram com uma linha própria (SEM_ITENS). O cubo e as
+seções de receita, pagamentos e avaliações leem a tabela pronta em vez
+de refazer os merges a cada rerun.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from olist.entregas import BINS_CATEGORIA, COLUNAS_DATA, ROTULOS_CATEGORIA, SEGUNDOS_DIA
+from olist.filtros import localizar_chaves
+from olist.ingestao import caminho_cache_derivado, gravar_cache_derivado, ler_cache
+
+
+TABELA_FATOS = 'fatos_pedidos'
+
+# Tabelas obrigatórias, na ordem dos parâmetros de construir_fatos
+ARQUIVOS_FATOS = [
+    'olist_orders_dataset.csv',
+    'olist_order_items_dataset.csv',
+    'olist_customers_dataset.csv',
+    'olist_sellers_dataset.csv',
+    'olist_products_dataset.csv',
+]
+
+# Sem elas as colunas de pagamento e avaliação ficam vazias
+ARQUIVOS_FATOS_OPCIONAIS = [
+    'olist_order_payments_dataset.csv',
+    'olist_order_reviews_dataset.csv',
+]
+
+DIMENSOES = ['mes', 'estado_cliente', 'estado_vendedor', 'status', 'categoria']
+
+# Rótulo de vendedor/categoria dos pedidos sem itens e de valores ausentes
+SEM_ITENS = '(sem itens)'
+SEM_VALOR = '(sem valor)'
+
+# Colunas com o valor pago por forma de pagamento (pago_credit_card, ...)
+PREFIXO_PAGO = 'pago_'
+
+# Atrasos (dias) da curva de nota média por dia de atraso
+LIMITE_DIAS_ATRASO = 20
+
+
+def impressao_fatos(impressoes):
+    """Versão da tabela fato: combinação das impressões das tabelas de origem"""
+    h = hashlib.blake2b(digest_size=16)
+    for file_name in ARQUIVOS_FATOS + ARQUIVOS_FATOS_OPCIONAIS:
+        h.update(f"{file_name}={impressoes.get(file_name)};".encode())
+    return h.hexdigest()
+
+
+def _rotulos(valores, vazio=SEM_VALOR):
+    return pd.Series(valores, dtype=object).fillna(vazio).astype(str).to_numpy()
+
+
+def _pagamentos(orders_df, payments_df):
+    """
+    Medidas de pagamento por pedido: valor pago (total e por forma),
+    forma principal (a de maior valor) e número máximo de parcelas
+    """
+    n = len(orders_df)
+    pedido = localizar_chaves(orders_df['order_id'], payments_df['order_id'])
+    validos = pedido >= 0
+    pedido = pedido[validos]
+    pagamentos = payments_df[validos]
+
+    valor = np.nan_to_num(pagamentos['payment_value'].to_numpy(dtype='float64'))
+    tipos, tipo = np.unique(_rotulos(pagamentos['payment_type'].to_numpy()), return_inverse=True)
+    por_tipo = np.bincount(
+        pedido * len(tipos) + tipo, weights=valor, minlength=n * len(tipos)
+    ).reshape(n, len(tipos))
+    com_pagamento = np.bincount(pedido, minlength=n) > 0
+
+    parcelas = np.full(n, -np.inf)
+    np.maximum.at(
+        parcelas, pedido,
+        np.nan_to_num(pagamentos['payment_installments'].to_numpy(dtype='float64'), nan=-np.inf)
+    )
+
+    medidas = {
+        'valor_pago': np.where(com_pagamento, por_tipo.sum(axis=1), np.nan),
+        'tipo_pagamento': np.where(
+            com_pagamento, tipos[por_tipo.argmax(axis=1)] if len(tipos) else SEM_VALOR, SEM_VALOR
+        ),
+        'parcelas': np.where(np.isfinite(parcelas), parcelas, np.nan),
+    }
+    for k, nome in enumerate(tipos):
+        medidas[f'{PREFIXO_PAGO}{nome}'] = por_tipo[:, k]
+    return medidas
+
+
+def _avaliacoes(orders_df, reviews_df):
+    """Nota média das avaliações de cada pedido (NaN sem avaliação)"""
+    n = len(orders_df)
+    pedido = localizar_chaves(orders_df['order_id'], reviews_df['order_id'])
+    nota = pd.to_numeric(reviews_df['review_score'], errors='coerce').to_numpy(dtype='float64')
+    validas = (pedido >= 0) & ~np.isnan(nota)
+    soma = np.bincount(pedido[validas], weights=nota[validas], minlength=n)
+    contagem = np.bincount(pedido[validas], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(contagem > 0, soma / contagem, np.nan)
+
+
+def construir_fatos(orders_df, order_items_df, customers_df, sellers_df, products_df,
+                    payments_df=None, reviews_df=None):
+    """
+    Une as tabelas do dataset na tabela fato (uma linha por item de pedido)
+    Retorna: DataFrame com posicao_pedido (linha em orders_df), DIMENSOES,
+             valores do item e medidas do pedido
+    """
+    n = len(orders_df)
+
+    # ---- Grão de pedido: dimensões e medidas ----
+    datas = {
+        col: pd.to_datetime(orders_df[col], errors='coerce').to_numpy(dtype='datetime64[ns]')
+        for col in COLUNAS_DATA
+    }
+    compra = datas['order_purchase_timestamp']
+    # Rótulo 'AAAA-MM' formatado só uma vez por mês distinto
+    meses, mes_pedido = np.unique(compra.astype('datetime64[M]'), return_inverse=True)
+    mes = _rotulos(pd.DatetimeIndex(meses).strftime('%Y-%m'))[mes_pedido]
+
+    status = _rotulos(orders_df['order_status'].to_numpy())
+    entregue = (status == 'delivered') & ~np.isnat(datas['order_delivered_customer_date'])
+
+    um_dia = np.timedelta64(1, 's') * SEGUNDOS_DIA
+    real = np.where(entregue, (datas['order_delivered_customer_date'] - compra) / um_dia, np.nan)
+    estimado = np.where(entregue, (datas['order_estimated_delivery_date'] - compra) / um_dia, np.nan)
+
+    cliente = localizar_chaves(customers_df['customer_id'], orders_df['customer_id'])
+    estado_cliente = np.where(
+        cliente >= 0, _rotulos(customers_df['customer_state'].to_numpy())[cliente], SEM_VALOR
+    )
+
+    if payments_df is not None:
+        pagamentos = _pagamentos(orders_df, payments_df)
+    else:
+        pagamentos = {
+            'valor_pago': np.full(n, np.nan),
+            'tipo_pagamento': np.full(n, SEM_VALOR),
+            'parcelas': np.full(n, np.nan),
+        }
+    nota = _avaliacoes(orders_df, reviews_df) if reviews_df is not None else np.full(n, np.nan)
+
+    # ---- Grão de item: pedido, vendedor, categoria, valores ----
+    pedido_item = localizar_chaves(orders_df['order_id'], order_items_df['order_id'])
+    validos = pedido_item >= 0
+    pedido_item = pedido_item[validos]
+    itens = order_items_df[validos]
+
+    vendedor = localizar_chaves(sellers_df['seller_id'], itens['seller_id'])
+    estado_vendedor = np.where(
+        vendedor >= 0, _rotulos(sellers_df['seller_state'].to_numpy())[vendedor], SEM_VALOR
+    )
+    produto = localizar_chaves(products_df['product_id'], itens['product_id'])
+    categoria = np.where(
+        produto >= 0, _rotulos(products_df['product_category_name'].to_numpy())[produto], SEM_VALOR
+    )
+    preco = itens['price'].to_numpy(dtype='float64')
+    frete = itens['freight_value'].to_numpy(dtype='float64')
+
+    # Pedidos sem itens: uma linha de peso 1
+    n_itens = np.bincount(pedido_item, minlength=n)
+    sem_itens = np.flatnonzero(n_itens == 0)
+    linha_pedido = np.concatenate([pedido_item, sem_itens])
+    vazio = np.full(len(sem_itens), np.nan)
+
+    primeiro_item = np.zeros(len(linha_pedido), dtype=bool)
+    primeiro_item[np.unique(pedido_item, return_index=True)[1]] = True
+    primeiro_item[len(pedido_item):] = True
+
+    valor_itens = np.bincount(
+        pedido_item, weights=np.nan_to_num(preco) + np.nan_to_num(frete), minlength=n
+    )
+
+    def do_pedido(valores):
+        return valores[linha_pedido]
+
+    fatos = pd.DataFrame({
+        'posicao_pedido': linha_pedido.astype('int32'),
+        'data_compra': do_pedido(compra),
+        'mes': do_pedido(mes),
+        'estado_cliente': do_pedido(estado_cliente),
+        'estado_vendedor': np.r_[estado_vendedor, np.full(len(sem_itens), SEM_ITENS)],
+        'status': do_pedido(status),
+        'categoria': np.r_[categoria, np.full(len(sem_itens), SEM_ITENS)],
+        'eh_item': np.r_[np.ones(len(pedido_item), dtype=bool), np.zeros(len(sem_itens), dtype=bool)],
+        'primeiro_item': primeiro_item,
+        'peso': 1.0 / np.maximum(n_itens, 1)[linha_pedido],
+        'preco': np.r_[preco, vazio],
+        'frete': np.r_[frete, vazio],
+        'n_itens': do_pedido(n_itens).astype('int32'),
+        'valor_itens': do_pedido(valor_itens),
+        **{coluna: do_pedido(valores) for coluna, valores in pagamentos.items()},
+        'nota_avaliacao': do_pedido(nota),
+        'entregue': do_pedido(entregue),
+        'tempo_real_dias': do_pedido(real),
+        'tempo_estimado_dias': do_pedido(estimado),
+        'diferenca_dias': do_pedido(real - estimado),
+    })
+    # Dimensões categóricas: memória menor e groupby por códigos inteiros
+    for coluna in DIMENSOES + ['tipo_pagamento']:
+        fatos[coluna] = fatos[coluna].astype('category')
+    return fatos
+
+
+def carregar_fatos(path, dfs, impressoes):
+    """
+    Retorna a tabela fato, lendo/gravando o cache ao lado do dataset
+    (None se faltar alguma tabela obrigatória)
+    """
+    if any(dfs.get(f) is None for f in ARQUIVOS_FATOS):
+        return None
+    impressao = impressao_fatos(impressoes)
+    fatos = ler_cache(caminho_cache_derivado(path, TABELA_FATOS, impressao))
+    if fatos is not None:
+        return fatos
+
+    fatos = construir_fatos(
+        *(dfs[f] for f in ARQUIVOS_FATOS), *(dfs.get(f) for f in ARQUIVOS_FATOS_OPCIONAIS)
+    )
+    gravar_cache_derivado(fatos, path, TABELA_FATOS, impressao)
+    return fatos
+
+
+# ========== SELEÇÃO ==========
+def linhas_pedidos(fatos, mascara_pedidos=None):
+    """Uma linha por pedido (o primeiro item) dos pedidos selecionados"""
+    manter = fatos['primeiro_item'].to_numpy()
+    if mascara_pedidos is not None:
+        manter = manter & mascara_pedidos[fatos['posicao_pedido'].to_numpy()]
+    return fatos[manter]
+
+
+def linhas_itens(fatos, mascara_pedidos=None, estados_vendedor=(), categorias=()):
+    """
+    Itens dos pedidos selecionados (e de vendedores de estados_vendedor e
+    produtos de categorias, se houver)
+    """
+    manter = fatos['eh_item'].to_numpy()
+    if mascara_pedidos is not None:
+        manter = manter & mascara_pedidos[fatos['posicao_pedido'].to_numpy()]
+    if estados_vendedor:
+        manter = manter & fatos['estado_vendedor'].isin(list(estados_vendedor)).to_numpy()
+    if categorias:
+        manter = manter & fatos['categoria'].isin(list(categorias)).to_numpy()
+    return fatos[manter]
+
+
+# ========== ANÁLISES ==========
+def receita_por_categoria(fatos, mascara_pedidos=None, estados_vendedor=(), categorias=()):
+    """
+    Receita dos itens por categoria de produto
+    Retorna: dict com categorias (DataFrame do maior para o menor), receita,
+             frete, itens e pedidos
+    """
+    itens = linhas_itens(fatos, mascara_pedidos, estados_vendedor, categorias)
+    categorias = (
+        itens.groupby('categoria', observed=True)
+        .agg(itens=('preco', 'size'), receita=('preco', 'sum'), frete=('frete', 'sum'))
+        .sort_values('receita', ascending=False, kind='stable')
+        .reset_index()
+    )
+    categorias['categoria'] = categorias['categoria'].astype(str)
+    categorias['preco_medio'] = categorias['receita'] / categorias['itens']
+    return {
+        'categorias': categorias,
+        'receita': float(categorias['receita'].sum()),
+        'frete': float(categorias['frete'].sum()),
+        'itens': len(itens),
+        'pedidos': len(np.unique(itens['posicao_pedido'].to_numpy())),
+    }
+
+
+def pagamentos_por_tipo(fatos, mascara_pedidos=None):
+    """
+    Valor pago e pedidos por forma de pagamento
+    Retorna: dict com tipos (DataFrame), pedidos, valor_total e ticket_medio
+    """
+    pedidos = linhas_pedidos(fatos, mascara_pedidos)
+    pedidos = pedidos[pedidos['valor_pago'].notna().to_numpy()]
+    colunas = [c for c in fatos.columns if c.startswith(PREFIXO_PAGO)]
+
+    valor = pedidos[colunas].sum()
+    valor.index = [c[len(PREFIXO_PAGO):] for c in colunas]
+    principal = pedidos.groupby('tipo_pagamento', observed=True).agg(
+        pedidos=('parcelas', 'size'), parcelas_medias=('parcelas', 'mean')
+    )
+    tipos = pd.DataFrame({'valor': valor}).join(principal, how='outer')
+    tipos = tipos.fillna({'valor': 0.0, 'pedidos': 0}).astype({'pedidos': 'int64'})
+    tipos = tipos[(tipos['valor'] > 0) | (tipos['pedidos'] > 0)]
+    valor_total = float(tipos['valor'].sum())
+    tipos['participacao'] = tipos['valor'] / valor_total * 100 if valor_total else 0.0
+    tipos = (
+        tipos.sort_values('valor', ascending=False, kind='stable')
+        .rename_axis('tipo').reset_index()
+    )
+    return {
+        'tipos': tipos,
+        'pedidos': len(pedidos),
+        'valor_total': valor_total,
+        'ticket_medio': float(pedidos['valor_pago'].mean()) if len(pedidos) else np.nan,
+    }
+
+
+def avaliacao_por_atraso(fatos, mascara_pedidos=None):
+    """
+    Nota das avaliações dos pedidos entregues pela diferença real - estimado
+    Retorna: dict com faixas (DataFrame nas faixas da seção de entregas),
+             por_dia (nota média por dia de atraso), avaliados, nota_media
+             e correlacao
+    """
+    pedidos = linhas_pedidos(fatos, mascara_pedidos)
+    avaliados = pedidos[(
+        pedidos['entregue'].to_numpy()
+        & pedidos['nota_avaliacao'].notna().to_numpy()
+        & pedidos['diferenca_dias'].notna().to_numpy()
+    )]
+    nota = avaliados['nota_avaliacao']
+    diferenca = avaliados['diferenca_dias']
+
+    faixa = pd.cut(diferenca, bins=BINS_CATEGORIA, labels=ROTULOS_CATEGORIA)
+    faixas = (
+        pd.DataFrame({'faixa': faixa, 'nota': nota, 'nota_baixa': nota <= 2})
+        .groupby('faixa', observed=False)
+        .agg(pedidos=('nota', 'size'), nota_media=('nota', 'mean'), nota_baixa=('nota_baixa', 'mean'))
+        .reset_index()
+    )
+    faixas['faixa'] = faixas['faixa'].astype(str)
+    faixas['nota_baixa'] = faixas['nota_baixa'] * 100
+
+    dia = np.clip(np.round(diferenca.to_numpy()), -LIMITE_DIAS_ATRASO, LIMITE_DIAS_ATRASO)
+    por_dia = (
+        pd.DataFrame({'dias': dia.astype('int64'), 'nota': nota.to_numpy()})
+        .groupby('dias')
+        .agg(pedidos=('nota', 'size'), nota_media=('nota', 'mean'))
+        .reset_index()
+    )
+
+    return {
+        'faixas': faixas,
+        'por_dia': por_dia,
+        'avaliados': len(avaliados),
+        'nota_media': float(nota.mean()) if len(avaliados) else np.nan,
+        'correlacao': float(np.corrcoef(diferenca, nota)[0, 1]) if len(avaliados) > 2 else np.nan,
+    }
@@ -0,0 +1,288 @@
+"""
+Filtros globais do dashboard (período da compra, estados, status e
+categoria do produto).
+
+Os filtros são respondidos por índices montados uma vez por versão do
+dataset, sem varrer as tabelas a cada seção:
+
+- índice ordenado das datas de compra: um período vira duas buscas
+  binárias e uma fatia das posições dos pedidos;
+- bitmaps compactados (np.packbits, 1 bit por pedido) por status, por
+  estado do cliente, por estado dos vendedores e por categoria dos
+  produtos do pedido: combinar filtros é um OR dentro de cada dimensão
+  e um AND entre dimensões;
+- posições pré-resolvidas de cliente, vendedor e produto de cada pedido
+  e item, que levam a seleção de pedidos às outras tabelas.
+
+Estado do vendedor e categoria são atributos do item: o filtro seleciona
+os pedidos com ao menos um item que atenda a ambos, e as seções no grão
+do item (receita, vendedores, fluxos) ficam só com esses itens.
+
+A seleção resultante é um bitmap de pedidos. As seções a convertem em
+máscaras (de pedidos, clientes, vendedores ou itens) com uma indexação
+vetorizada.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+
+
+# Filtro hashable (serve de chave de cache); campos vazios não filtram
+Filtro = collections.namedtuple(
+    'Filtro',
+    ['inicio', 'fim', 'estados_cliente', 'estados_vendedor', 'status', 'categorias'],
+    defaults=[None, None, (), (), (), ()],
+)
+
+SEM_FILTRO = Filtro()
+
+
+def filtro_ativo(filtro):
+    """O filtro restringe alguma dimensão"""
+    return filtro is not None and filtro != SEM_FILTRO
+
+
+def filtro_de_itens(filtro):
+    """O filtro restringe atributos do item (estado do vendedor ou categoria)"""
+    return filtro is not None and bool(filtro.estados_vendedor or filtro.categorias)
+
+
+def localizar_chaves(alvo, busca):
+    """
+    Posição em alvo de cada valor de busca (-1 se ausente).
+    Com chaves compactas do mesmo dicionário a busca é pelos códigos.
+    """
+    if (
+        isinstance(alvo.dtype, pd.CategoricalDtype)
+        and isinstance(busca.dtype, pd.CategoricalDtype)
+        and alvo.dtype == busca.dtype
+    ):
+        linha_por_codigo = np.full(len(alvo.cat.categories) + 1, -1, dtype='int64')
+        linha_por_codigo[alvo.cat.codes.to_numpy()] = np.arange(len(alvo))
+        # Código -1 (nulo) cai na última posição, que fica -1
+        linha_por_codigo[-1] = -1
+        return linha_por_codigo[busca.cat.codes.to_numpy()]
+    return pd.Index(alvo.to_numpy()).get_indexer(busca.to_numpy())
+
+
+def _bitmaps(rotulos, n, posicoes=None):
+    """
+    Bitmap compactado por valor distinto de rotulos.
+    posicoes: linha (de 0 a n-1) de cada rótulo (padrão: a própria ordem)
+    Retorna: dict {valor: np.ndarray uint8}
+    """
+    codigos, valores = pd.factorize(pd.Series(rotulos), sort=True)
+    if posicoes is None:
+        posicoes = np.arange(len(codigos))
+    validos = (codigos >= 0) & (posicoes >= 0)
+    codigos, posicoes = codigos[validos], posicoes[validos]
+
+    bitmaps = {}
+    for k, valor in enumerate(valores):
+        mascara = np.zeros(n, dtype=bool)
+        mascara[posicoes[codigos == k]] = True
+        bitmaps[str(valor)] = np.packbits(mascara)
+    return bitmaps
+
+
+def _contar_bits(bitmap):
+    return int(np.count_nonzero(np.unpackbits(bitmap)))
+
+
+class IndiceFiltros:
+    """Índices de filtragem dos pedidos (montados uma vez por versão do dataset)"""
+
+    def __init__(self, orders_df, customers_df=None, order_items_df=None, sellers_df=None,
+                 products_df=None):
+        self.n_pedidos = n = len(orders_df)
+        self.n_clientes = len(customers_df) if customers_df is not None else 0
+        self.n_vendedores = len(sellers_df) if sellers_df is not None else 0
+
+        # Datas de compra ordenadas (NaT no fim) e a posição de cada uma
+        compra = pd.to_datetime(
+            orders_df['order_purchase_timestamp'], errors='coerce'
+        ).to_numpy(dtype='datetime64[ns]')
+        self.ordem_datas = np.argsort(compra, kind='stable')
+        self.datas = compra[self.ordem_datas]
+        validas = self.datas[~np.isnat(self.datas)]
+        self.data_minima = pd.Timestamp(validas[0]).date() if len(validas) else None
+        self.data_maxima = pd.Timestamp(validas[-1]).date() if len(validas) else None
+
+        self.status = _bitmaps(orders_df['order_status'].to_numpy(), n)
+
+        # Cliente de cada pedido
+        self.cliente_pedido = np.full(n, -1, dtype='int64')
+        self.estados_cliente = {}
+        if customers_df is not None:
+            self.cliente_pedido = localizar_chaves(
+                customers_df['customer_id'], orders_df['customer_id']
+            )
+            estado = customers_df['customer_state'].to_numpy()[self.cliente_pedido]
+            self.estados_cliente = _bitmaps(
+                np.where(self.cliente_pedido >= 0, estado, None), n
+            )
+
+        # Pedido, vendedor e produto de cada item
+        self.pedido_item = np.empty(0, dtype='int64')
+        self.vendedor_item = np.empty(0, dtype='int64')
+        self.produto_item = np.empty(0, dtype='int64')
+        self.estado_vendedor_item = np.empty(0, dtype=object)
+        self.categoria_item = np.empty(0, dtype=object)
+        self.estados_vendedor = {}
+        self.categorias = {}
+        if order_items_df is not None:
+            self.pedido_item = localizar_chaves(
+                orders_df['order_id'], order_items_df['order_id']
+            )
+            self.produto_item = pd.factorize(order_items_df['product_id'])[0]
+            if sellers_df is not None:
+                self.vendedor_item = localizar_chaves(
+                    sellers_df['seller_id'], order_items_df['seller_id']
+                )
+                estado = sellers_df['seller_state'].to_numpy()[self.vendedor_item]
+                self.estado_vendedor_item = np.where(self.vendedor_item >= 0, estado, None)
+                # Pedido entra no estado de qualquer um dos seus vendedores
+                self.estados_vendedor = _bitmaps(
+                    self.estado_vendedor_item, n, posicoes=self.pedido_item
+                )
+            if products_df is not None:
+                produto = localizar_chaves(products_df['product_id'], order_items_df['product_id'])
+                categoria = products_df['product_category_name'].to_numpy()[produto]
+                self.categoria_item = np.where(produto >= 0, categoria, None)
+                # ... e na categoria de qualquer um dos seus produtos
+                self.categorias = _bitmaps(self.categoria_item, n, posicoes=self.pedido_item)
+
+    # ========== SELEÇÃO ==========
+    def _periodo(self, inicio, fim):
+        """Bitmap dos pedidos com compra em [inicio, fim] (datas, fim inclusivo)"""
+        lo = 0 if inicio is None else np.searchsorted(
+            self.datas, np.datetime64(pd.Timestamp(inicio), 'ns'), side='left'
+        )
+        if fim is None:
+            hi = len(self.datas) - int(np.count_nonzero(np.isnat(self.datas)))
+        else:
+            hi = np.searchsorted(
+                self.datas, np.datetime64(pd.Timestamp(fim) + pd.Timedelta(days=1), 'ns'),
+                side='left'
+            )
+        mascara = np.zeros(self.n_pedidos, dtype=bool)
+        mascara[self.ordem_datas[lo:hi]] = True
+        return np.packbits(mascara)
+
+    def _uniao(self, bitmaps, valores):
+        """OR dos bitmaps dos valores selecionados (valores ausentes: nenhum pedido)"""
+        resultado = np.zeros((self.n_pedidos + 7) // 8, dtype='uint8')
+        for valor in valores:
+            if valor in bitmaps:
+                resultado |= bitmaps[valor]
+        return resultado
+
+    def selecionar(self, filtro):
+        """
+        Bitmap dos pedidos que passam no filtro (None = todos os pedidos)
+        """
+        if not filtro_ativo(filtro):
+            return None
+        partes = []
+        if filtro.inicio is not None or filtro.fim is not None:
+            partes.append(self._periodo(filtro.inicio, filtro.fim))
+        if filtro.status:
+            partes.append(self._uniao(self.status, filtro.status))
+        if filtro.estados_cliente:
+            partes.append(self._uniao(self.estados_cliente, filtro.estados_cliente))
+        if filtro.estados_vendedor and filtro.categorias:
+            # Um mesmo item precisa atender às duas dimensões
+            itens = self._itens_do_filtro(filtro.estados_vendedor, filtro.categorias)
+            mascara = np.zeros(self.n_pedidos, dtype=bool)
+            mascara[self.pedido_item[itens & (self.pedido_item >= 0)]] = True
+            partes.append(np.packbits(mascara))
+        elif filtro.estados_vendedor:
+            partes.append(self._uniao(self.estados_vendedor, filtro.estados_vendedor))
+        elif filtro.categorias:
+            partes.append(self._uniao(self.categorias, filtro.categorias))
+        selecao = partes[0].copy()
+        for parte in partes[1:]:
+            selecao &= parte
+        return selecao
+
+    def _itens_do_filtro(self, estados_vendedor=(), categorias=()):
+        """Itens de vendedores de estados_vendedor e de produtos de categorias (vazios: todos)"""
+        itens = np.ones(len(self.pedido_item), dtype=bool)
+        if estados_vendedor:
+            itens &= np.isin(self.estado_vendedor_item, list(estados_vendedor))
+        if categorias:
+            itens &= np.isin(self.categoria_item, list(categorias))
+        return itens
+
+    # ========== MÁSCARAS E CONTAGENS ==========
+    def mascara_pedidos(self, selecao):
+        """Máscara booleana das linhas de orders_df"""
+        if selecao is None:
+            return np.ones(self.n_pedidos, dtype=bool)
+        return np.unpackbits(selecao, count=self.n_pedidos).astype(bool)
+
+    def mascara_itens(self, selecao, estados_vendedor=(), categorias=()):
+        """
+        Itens dos pedidos selecionados (e de vendedores de estados_vendedor
+        e produtos de categorias, se houver)
+        """
+        mascara = self.mascara_pedidos(selecao)
+        pedido = self.pedido_item
+        itens = (pedido >= 0) & mascara[np.where(pedido >= 0, pedido, 0)]
+        if estados_vendedor or categorias:
+            itens &= self._itens_do_filtro(estados_vendedor, categorias)
+        return itens
+
+    def mascara_clientes(self, selecao):
+        """Clientes com ao menos um pedido selecionado"""
+        clientes = self.cliente_pedido[self.mascara_pedidos(selecao)]
+        mascara = np.zeros(self.n_clientes, dtype=bool)
+        mascara[clientes[clientes >= 0]] = True
+        return mascara
+
+    def mascara_vendedores(self, selecao, estados_vendedor=(), categorias=()):
+        """Vendedores com itens nos pedidos selecionados"""
+        vendedores = self.vendedor_item[self.mascara_itens(selecao, estados_vendedor, categorias)]
+        mascara = np.zeros(self.n_vendedores, dtype=bool)
+        mascara[vendedores[vendedores >= 0]] = True
+        return mascara
+
+    def contagem_status(self, selecao):
+        """Pedidos selecionados por status: DataFrame(Status, Quantidade)"""
+        contagens = pd.DataFrame({
+            'Status': list(self.status),
+            'Quantidade': [
+                _contar_bits(bitmap if selecao is None else bitmap & selecao)
+                for bitmap in self.status.values()
+            ],
+        })
+        contagens = contagens[contagens['Quantidade'] > 0]
+        return contagens.sort_values('Quantidade', ascending=False, ignore_index=True)
+
+    def resumo(self, selecao, estados_vendedor=(), categorias=()):
+        """Clientes, pedidos, produtos e vendedores envolvidos nos pedidos selecionados"""
+        itens = self.mascara_itens(selecao, estados_vendedor, categorias)
+        produtos = self.produto_item[itens]
+        return {
+            'clientes': int(np.count_nonzero(self.mascara_clientes(selecao))),
+            'pedidos': self.n_pedidos if selecao is None else _contar_bits(selecao),
+            'produtos': len(np.unique(produtos[produtos >= 0])),
+            'vendedores': int(np.count_nonzero(
+                self.mascara_vendedores(selecao, estados_vendedor, categorias)
+            )),
+        }
+
+
+def construir_indice_filtros(dfs):
+    """IndiceFiltros das tabelas do dataset (None sem a tabela de pedidos)"""
+    orders_df = dfs.get('olist_orders_dataset.csv')
+    if orders_df is None:
+        return None
+    return IndiceFiltros(
+        orders_df,
+        dfs.get('olist_customers_dataset.csv'),
+        dfs.get('olist_order_items_dataset.csv'),
+        dfs.get('olist_sellers_dataset.csv'),
+        dfs.get('olist_products_dataset.csv'),
+    )
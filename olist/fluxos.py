@@ -0,0 +1,191 @@
+"""
+Distâncias e fluxos vendedor → cliente.
+
+Cada item de pedido é um envio de um vendedor para um cliente. A junção
+order_items → orders → customers/sellers pelos centroides de prefixo de
+CEP dá origem e destino de cada envio; a distância de círculo máximo é
+calculada de uma vez para todos os envios (haversine vetorizado).
+
+O resultado guarda só agregados pequenos (matriz estado × estado, pares
+de fluxo, histograma de distâncias e tempo de entrega por faixa), então
+os gráficos não dependem do número de envios. Os envios guardam a
+posição do pedido em orders_df, então os filtros globais agregam só os
+envios selecionados, sem refazer as junções.
+"""
+import numpy as np
+import pandas as pd
+
+from olist.entregas import pedidos_entregues
+from olist.geo import geocodificar
+
+
+RAIO_TERRA_KM = 6371.0088
+
+# Faixas de distância (km) do histograma e da relação com o tempo de entrega
+PASSO_HISTOGRAMA_KM = 100
+LIMITE_HISTOGRAMA_KM = 4000
+FAIXAS_TEMPO_KM = [0, 50, 200, 500, 1000, 2000, float('inf')]
+ROTULOS_TEMPO = ['até 50 km', '50-200 km', '200-500 km', '500-1000 km', '1000-2000 km', '2000+ km']
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distância de círculo máximo (km) entre arrays de coordenadas em graus"""
+    lat1, lng1, lat2, lng2 = (
+        np.radians(np.asarray(a, dtype='float64')) for a in (lat1, lng1, lat2, lng2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def calcular_envios(order_items_df, orders_df, customers_df, sellers_df, indice_geo):
+    """
+    Um envio por item de pedido com origem (vendedor) e destino (cliente)
+    geocodificados, distância e tempo real de entrega (NaN se não entregue)
+    Retorna: DataFrame(posicao_pedido, posicao_item, estado_origem,
+             estado_destino, lat/lng de origem e destino, distancia_km,
+             tempo_real_dias)
+    """
+    vendedores = geocodificar(
+        sellers_df[['seller_id', 'seller_zip_code_prefix', 'seller_state']],
+        'seller_zip_code_prefix', indice_geo[['geolocation_lat', 'geolocation_lng']]
+    ).drop(columns='seller_zip_code_prefix')
+    clientes = geocodificar(
+        customers_df[['customer_id', 'customer_zip_code_prefix', 'customer_state']],
+        'customer_zip_code_prefix', indice_geo[['geolocation_lat', 'geolocation_lng']]
+    ).drop(columns='customer_zip_code_prefix')
+    tempos = pedidos_entregues(orders_df)[['order_id', 'tempo_real_dias']]
+
+    envios = (
+        order_items_df[['order_id', 'seller_id']]
+        .assign(posicao_item=np.arange(len(order_items_df), dtype='int32'))
+        .merge(
+            orders_df[['order_id', 'customer_id']].assign(
+                posicao_pedido=np.arange(len(orders_df), dtype='int32')
+            ),
+            on='order_id'
+        )
+        .merge(vendedores, on='seller_id')
+        .merge(clientes, on='customer_id', suffixes=('_origem', '_destino'))
+        .merge(tempos, on='order_id', how='left')
+    )
+    envios = envios.dropna(subset=[
+        'geolocation_lat_origem', 'geolocation_lng_origem',
+        'geolocation_lat_destino', 'geolocation_lng_destino',
+    ])
+
+    resultado = pd.DataFrame({
+        'posicao_pedido': envios['posicao_pedido'].to_numpy(),
+        'posicao_item': envios['posicao_item'].to_numpy(),
+        'estado_origem': envios['seller_state'].astype(str).astype('category').to_numpy(),
+        'estado_destino': envios['customer_state'].astype(str).astype('category').to_numpy(),
+        'lat_origem': envios['geolocation_lat_origem'].to_numpy(),
+        'lng_origem': envios['geolocation_lng_origem'].to_numpy(),
+        'lat_destino': envios['geolocation_lat_destino'].to_numpy(),
+        'lng_destino': envios['geolocation_lng_destino'].to_numpy(),
+        'tempo_real_dias': envios['tempo_real_dias'].to_numpy(dtype='float64'),
+    })
+    resultado['distancia_km'] = haversine_km(
+        resultado['lat_origem'], resultado['lng_origem'],
+        resultado['lat_destino'], resultado['lng_destino'],
+    ).astype('float32')
+    return resultado
+
+
+def calcular_fluxos(order_items_df, orders_df, customers_df, sellers_df, indice_geo):
+    """Agregados de distância e fluxo entre estados de todos os envios (ver agregar_fluxos)"""
+    return agregar_fluxos(
+        calcular_envios(order_items_df, orders_df, customers_df, sellers_df, indice_geo)
+    )
+
+
+def filtrar_envios(envios, mascara_itens):
+    """Envios dos itens da máscara (linhas de order_items_df; ver IndiceFiltros.mascara_itens)"""
+    return envios[mascara_itens[envios['posicao_item'].to_numpy()]]
+
+
+def agregar_fluxos(envios):
+    """
+    Agregados de distância e fluxo entre estados
+    Retorna: dict com resumo, matriz, pares, histograma, tempo_por_faixa
+             e correlacao (ou {'resumo': {'envios': 0}} sem envios)
+    """
+    envios = envios.assign(
+        estado_origem=envios['estado_origem'].astype(str),
+        estado_destino=envios['estado_destino'].astype(str),
+    )
+    total = len(envios)
+    if total == 0:
+        return {'resumo': {'envios': 0}}
+
+    distancia = envios['distancia_km'].to_numpy(dtype='float64')
+    resumo = {
+        'envios': total,
+        'distancia_media_km': float(distancia.mean()),
+        'distancia_mediana_km': float(np.median(distancia)),
+        'percentual_mesmo_estado': float(
+            (envios['estado_origem'] == envios['estado_destino']).mean() * 100
+        ),
+    }
+
+    # Matriz origem × destino (linhas: estado do vendedor)
+    matriz = pd.crosstab(envios['estado_origem'], envios['estado_destino'])
+    matriz.index.name = 'Origem'
+    matriz.columns.name = 'Destino'
+
+    # Pares origem → destino com o centroide dos envios de cada estado
+    centroides = pd.concat([
+        envios[['estado_origem', 'lat_origem', 'lng_origem']].set_axis(['estado', 'lat', 'lng'], axis=1),
+        envios[['estado_destino', 'lat_destino', 'lng_destino']].set_axis(['estado', 'lat', 'lng'], axis=1),
+    ]).groupby('estado').mean()
+    pares = (
+        envios.groupby(['estado_origem', 'estado_destino'])
+        .agg(
+            envios=('distancia_km', 'size'),
+            distancia_media_km=('distancia_km', 'mean'),
+            tempo_medio_dias=('tempo_real_dias', 'mean'),
+        )
+        .reset_index()
+        .sort_values('envios', ascending=False, ignore_index=True)
+    )
+    for lado in ['origem', 'destino']:
+        coords = centroides.reindex(pares[f'estado_{lado}'])
+        pares[f'lat_{lado}'] = coords['lat'].to_numpy()
+        pares[f'lng_{lado}'] = coords['lng'].to_numpy()
+
+    # Histograma de distâncias (a última faixa acumula o que passa do limite)
+    bordas = np.arange(0, LIMITE_HISTOGRAMA_KM + PASSO_HISTOGRAMA_KM, PASSO_HISTOGRAMA_KM)
+    contagens, _ = np.histogram(np.minimum(distancia, LIMITE_HISTOGRAMA_KM - 1e-6), bins=bordas)
+    histograma = pd.DataFrame({
+        'distancia_km': bordas[:-1] + PASSO_HISTOGRAMA_KM / 2,
+        'envios': contagens,
+    })
+
+    # Distância × tempo real de entrega (só envios entregues)
+    entregues = envios.dropna(subset=['tempo_real_dias'])
+    faixas = pd.cut(entregues['distancia_km'], bins=FAIXAS_TEMPO_KM, labels=ROTULOS_TEMPO, right=False)
+    tempo_por_faixa = (
+        entregues.groupby(faixas, observed=False)['tempo_real_dias']
+        .agg(envios='size', tempo_medio_dias='mean', tempo_mediano_dias='median')
+        .rename_axis('faixa')
+        .reset_index()
+    )
+    correlacao = {
+        'pearson': float(entregues['distancia_km'].corr(entregues['tempo_real_dias'])),
+        # Spearman = Pearson dos postos (sem depender do scipy)
+        'spearman': float(
+            entregues['distancia_km'].rank().corr(entregues['tempo_real_dias'].rank())
+        ),
+        'envios_entregues': len(entregues),
+    }
+
+    return {
+        'resumo': resumo,
+        'matriz': matriz,
+        'pares': pares,
+        'histograma': histograma,
+        'tempo_por_faixa': tempo_por_faixa,
+        'correlacao': correlacao,
+    }
@@ -0,0 +1,84 @@
+"""
+Índice de geolocalização por prefixo de CEP.
+
+A tabela de geolocalização tem dezenas a centenas de linhas por prefixo.
+O índice resume cada prefixo em uma única linha (centroide, número de
+pontos e cidade/estado predominantes) e é usado para geocodificar
+clientes e vendedores com uma busca vetorizada, sem merge.
+"""
+import pandas as pd
+
+from olist.ingestao import caminho_cache_derivado, gravar_cache_derivado, ler_cache
+
+
+ARQUIVO_GEO = 'olist_geolocation_dataset.csv'
+TABELA_INDICE = 'indice_geo'
+
+COLUNA_CEP = 'geolocation_zip_code_prefix'
+COLUNAS_INDICE = [
+    'geolocation_lat',
+    'geolocation_lng',
+    'geolocation_pontos',
+    'geolocation_city',
+    'geolocation_state',
+]
+
+
+def _predominante(geo, coluna):
+    """Valor mais frequente de coluna em cada prefixo de CEP (empate: menor valor)"""
+    contagem = (
+        geo.groupby([COLUNA_CEP, coluna], observed=True)
+        .size()
+        .reset_index(name='n')
+        .sort_values([COLUNA_CEP, 'n', coluna], ascending=[True, False, True])
+    )
+    return contagem.drop_duplicates(subset=[COLUNA_CEP]).set_index(COLUNA_CEP)[coluna]
+
+
+def construir_indice_geo(geolocation_df):
+    """
+    Resume a geolocalização em uma linha por prefixo de CEP
+    Retorna: DataFrame indexado por geolocation_zip_code_prefix
+    """
+    geo = geolocation_df.dropna(subset=['geolocation_lat', 'geolocation_lng'])
+
+    indice = geo.groupby(COLUNA_CEP).agg(
+        geolocation_lat=('geolocation_lat', 'mean'),
+        geolocation_lng=('geolocation_lng', 'mean'),
+        geolocation_pontos=('geolocation_lat', 'size'),
+    )
+    indice['geolocation_lat'] = indice['geolocation_lat'].astype('float32')
+    indice['geolocation_lng'] = indice['geolocation_lng'].astype('float32')
+    indice['geolocation_pontos'] = indice['geolocation_pontos'].astype('int32')
+
+    for coluna in ['geolocation_city', 'geolocation_state']:
+        if coluna in geo.columns:
+            indice[coluna] = _predominante(geo, coluna)
+
+    return indice.sort_index()
+
+
+def carregar_indice_geo(path, geolocation_df, impressao):
+    """
+    Retorna o índice de geolocalização, lendo/gravando o cache ao lado do dataset.
+    impressao identifica a versão do arquivo de geolocalização.
+    """
+    cache_path = caminho_cache_derivado(path, TABELA_INDICE, impressao)
+    indice = ler_cache(cache_path)
+    if indice is not None:
+        return indice.set_index(COLUNA_CEP)
+
+    indice = construir_indice_geo(geolocation_df)
+    gravar_cache_derivado(indice.reset_index(), path, TABELA_INDICE, impressao)
+    return indice
+
+
+def geocodificar(df, coluna_cep, indice):
+    """
+    Anexa as colunas do índice (lat/lng do centroide, pontos, cidade e estado)
+    a df, buscando cada linha pelo prefixo de CEP em coluna_cep.
+    Prefixos ausentes do índice ficam com coordenadas NaN.
+    """
+    coords = indice.reindex(df[coluna_cep].to_numpy())
+    coords.index = df.index
+    return pd.concat([df, coords], axis=1)
@@ -0,0 +1,304 @@
+"""
+Ingestão tipada dos CSVs do Olist com cache colunar em disco.
+
+Na primeira carga cada CSV é lido com um esquema explícito (categorias,
+datas e coordenadas em float32) e gravado em Parquet numa pasta de cache
+ao lado do dataset. As cargas seguintes leem o Parquet diretamente.
+"""
+import contextlib
+import glob
+import io
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: só a trava dentro do processo
+    fcntl = None
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+KAGGLE_DATASET = "olistbr/brazilian-ecommerce"
+
+# Diretório local com os CSVs (ignora o download do Kaggle se definido)
+ENV_DATA_DIR = "OLIST_DATA_DIR"
+
+# Pasta do cache colunar, criada dentro do diretório do dataset.
+# Mude VERSAO_ESQUEMA sempre que ESQUEMAS mudar para invalidar o cache.
+PASTA_CACHE = ".olist_cache"
+VERSAO_ESQUEMA = "v2"
+
+# ========== ESQUEMAS POR ARQUIVO ==========
+# dtype: tipos aplicados na leitura do CSV (inteiros anuláveis: um valor
+#        ausente não derruba a carga da tabela)
+# datas: colunas convertidas para datetime64 uma única vez
+# divisivel: sem quebras de linha dentro de campos, então o arquivo pode
+#            ser lido em faixas de bytes paralelas
+ESQUEMAS = {
+    'olist_customers_dataset.csv': {
+        'dtype': {
+            'customer_zip_code_prefix': 'Int32',
+            'customer_city': 'category',
+            'customer_state': 'category',
+        },
+        'datas': [],
+        'divisivel': True,
+    },
+    'olist_geolocation_dataset.csv': {
+        'dtype': {
+            'geolocation_zip_code_prefix': 'Int32',
+            'geolocation_lat': 'float32',
+            'geolocation_lng': 'float32',
+            'geolocation_city': 'category',
+            'geolocation_state': 'category',
+        },
+        'datas': [],
+        'divisivel': True,
+    },
+    'olist_orders_dataset.csv': {
+        'dtype': {
+            'order_status': 'category',
+        },
+        'datas': [
+            'order_purchase_timestamp',
+            'order_approved_at',
+            'order_delivered_carrier_date',
+            'order_delivered_customer_date',
+            'order_estimated_delivery_date',
+        ],
+        'divisivel': True,
+    },
+    'olist_order_items_dataset.csv': {
+        'dtype': {
+            'order_item_id': 'Int16',
+        },
+        'datas': ['shipping_limit_date'],
+        'divisivel': True,
+    },
+    'olist_order_payments_dataset.csv': {
+        'dtype': {
+            'payment_sequential': 'Int16',
+            'payment_type': 'category',
+            'payment_installments': 'Int16',
+        },
+        'datas': [],
+        'divisivel': True,
+    },
+    'olist_order_reviews_dataset.csv': {
+        'dtype': {
+            'review_score': 'Int8',
+        },
+        'datas': ['review_creation_date', 'review_answer_timestamp'],
+    },
+    'olist_products_dataset.csv': {
+        'dtype': {
+            'product_category_name': 'category',
+        },
+        'datas': [],
+    },
+    'olist_sellers_dataset.csv': {
+        'dtype': {
+            'seller_zip_code_prefix': 'Int32',
+            'seller_city': 'category',
+            'seller_state': 'category',
+        },
+        'datas': [],
+        'divisivel': True,
+    },
+    'product_category_name_translation.csv': {
+        'dtype': {
+            'product_category_name': 'category',
+            'product_category_name_english': 'category',
+        },
+        'datas': [],
+    },
+}
+
+
+def resolver_caminho_dataset(data_dir=None):
+    """
+    Retorna o diretório com os CSVs do Olist.
+    Usa data_dir (ou a variável OLIST_DATA_DIR) quando informado;
+    caso contrário baixa o dataset via kagglehub.
+    """
+    data_dir = data_dir or os.environ.get(ENV_DATA_DIR)
+    if data_dir:
+        if not os.path.isdir(data_dir):
+            raise FileNotFoundError(f"Diretório de dados não encontrado: {data_dir}")
+        return data_dir
+
+    import kagglehub
+    return kagglehub.dataset_download(KAGGLE_DATASET)
+
+
+def ler_csv(file_path, inicio=0, colunas=None, fim=None):
+    """
+    Lê um CSV do Olist aplicando o esquema do arquivo, se conhecido.
+    Com inicio > 0 lê apenas as linhas a partir desse byte (sem cabeçalho),
+    usando os nomes de colunas informados; com fim, só até esse byte.
+    """
+    esquema = ESQUEMAS.get(os.path.basename(file_path), {})
+    with open(file_path, 'rb') as f:
+        f.seek(inicio)
+        fonte = io.BytesIO(f.read(fim - inicio)) if fim is not None else f
+        df = pd.read_csv(
+            fonte,
+            encoding='utf-8',
+            dtype=esquema.get('dtype'),
+            header=None if inicio else 'infer',
+            names=colunas if inicio else None,
+        )
+    for col in esquema.get('datas', []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+    return df
+
+
+def concatenar_tabelas(partes):
+    """Concatena tabelas com as mesmas colunas, unindo as categorias das colunas categóricas"""
+    resultado = pd.concat(partes, ignore_index=True)
+    for col in partes[0].columns:
+        if isinstance(partes[0][col].dtype, pd.CategoricalDtype):
+            resultado[col] = union_categoricals(
+                [parte[col].astype('category') for parte in partes], ignore_order=True
+            )
+    return resultado
+
+
+def caminho_cache(path, file_name):
+    """Caminho do Parquet em cache para um arquivo (ou tabela derivada) do dataset"""
+    nome = os.path.splitext(file_name)[0] + '.parquet'
+    return os.path.join(path, PASTA_CACHE, VERSAO_ESQUEMA, nome)
+
+
+def ler_cache(cache_path, *fontes):
+    """Lê o Parquet em cache se ele for mais novo que todos os arquivos de origem"""
+    try:
+        mtime_cache = os.path.getmtime(cache_path)
+        if any(mtime_cache < os.path.getmtime(f) for f in fontes):
+            return None
+        return pd.read_parquet(cache_path)
+    except Exception:
+        return None
+
+
+def caminho_temporario(caminho):
+    """Nome temporário único por processo e thread para gravar e depois renomear"""
+    return f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def gravar_cache(df, cache_path):
+    """Grava o Parquet em cache; falhas (sem pyarrow, sem permissão) são ignoradas"""
+    tmp_path = caminho_temporario(cache_path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+
+
+# ========== TRAVA DE ATUALIZAÇÃO ==========
+# Uma trava por dataset: RLock dentro do processo (reentrante, para que
+# atualizar_dataset possa rodar dentro de carregar_armazem) mais flock num
+# arquivo da pasta de cache, que serializa processos diferentes.
+_travas = {}
+_travas_lock = threading.Lock()
+
+
+class _TravaDataset:
+    def __init__(self, arquivo_trava):
+        self.arquivo_trava = arquivo_trava
+        self.lock = threading.RLock()
+        self.nivel = 0
+        self.handle = None
+
+    def adquirir(self):
+        self.lock.acquire()
+        if self.nivel == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.arquivo_trava), exist_ok=True)
+                self.handle = open(self.arquivo_trava, 'a')
+                fcntl.flock(self.handle, fcntl.LOCK_EX)
+            except OSError:
+                # Pasta somente leitura: segue só com a trava do processo
+                if self.handle is not None:
+                    self.handle.close()
+                self.handle = None
+        self.nivel += 1
+
+    def liberar(self):
+        self.nivel -= 1
+        if self.nivel == 0 and self.handle is not None:
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_UN)
+            finally:
+                self.handle.close()
+                self.handle = None
+        self.lock.release()
+
+
+@contextlib.contextmanager
+def trava_dataset(path):
+    """Serializa a atualização dos caches de um dataset entre threads e processos"""
+    arquivo_trava = os.path.join(path, PASTA_CACHE, VERSAO_ESQUEMA, 'atualizacao.lock')
+    with _travas_lock:
+        trava = _travas.setdefault(os.path.abspath(arquivo_trava), _TravaDataset(arquivo_trava))
+    trava.adquirir()
+    try:
+        yield
+    finally:
+        trava.liberar()
+
+
+def caminho_cache_derivado(path, nome, impressao):
+    """Caminho do Parquet de uma tabela derivada para uma versão (impressão) da origem"""
+    return caminho_cache(path, f"{nome}-{impressao[:16]}")
+
+
+def gravar_cache_derivado(df, path, nome, impressao):
+    """Grava uma tabela derivada e remove as versões anteriores dela"""
+    cache_path = caminho_cache_derivado(path, nome, impressao)
+    gravar_cache(df, cache_path)
+    padrao = os.path.join(os.path.dirname(cache_path), f"{nome}-*.parquet")
+    for antigo in glob.glob(padrao):
+        if antigo != cache_path:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+
+def carregar_arquivo(path, file_name, usar_cache=True):
+    """Carrega um CSV do dataset, passando pelo cache colunar"""
+    file_path = os.path.join(path, file_name)
+    cache_path = caminho_cache(path, file_name)
+
+    if usar_cache:
+        df = ler_cache(cache_path, file_path)
+        if df is not None:
+            return df
+
+    df = ler_csv(file_path)
+    if usar_cache:
+        gravar_cache(df, cache_path)
+    return df
+
+
+def listar_csvs(path):
+    """Lista os CSVs do diretório do dataset em ordem alfabética"""
+    return sorted(f for f in os.listdir(path) if f.endswith('.csv'))
+
+
+def carregar_dataset(path, usar_cache=True):
+    """
+    Carrega todos os CSVs de path
+    Retorna: dict {nome_do_arquivo: DataFrame}
+    """
+    return {
+        file_name: carregar_arquivo(path, file_name, usar_cache=usar_cache)
+        for file_name in listar_csvs(path)
+    }
@@ -0,0 +1,317 @@
+"""
+Instrumentação de desempenho por seção do dashboard.
+
+Cada seção é medida com um context manager (ou decorator) que registra
+tempo de parede, tempo de CPU da thread, variação do RSS atual do
+processo, linhas processadas e bytes do payload renderizado. O custo é
+de poucos microssegundos por seção, então pode ficar ligado em produção.
+A variação de RSS é do processo inteiro: com seções simultâneas ela
+inclui o que as outras threads alocaram no mesmo intervalo.
+
+Os caches do Streamlit não expõem acertos; contar_cache os conta por
+função cacheada (ver estatisticas_caches).
+
+Os registros ficam em memória (histórico do processo) e, se as variáveis
+de ambiente estiverem definidas, são gravados como JSON lines
+(OLIST_METRICAS_JSONL) e como textfile do Prometheus (OLIST_METRICAS_PROM)
+por uma thread de escrita, fora da trava das seções.
+"""
+import atexit
+import collections
+import functools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+ENV_METRICAS_JSONL = 'OLIST_METRICAS_JSONL'
+ENV_METRICAS_PROM = 'OLIST_METRICAS_PROM'
+
+# Registros mais recentes mantidos em memória
+TAMANHO_HISTORICO = 5_000
+
+_lock = threading.Lock()
+_local = threading.local()
+_historico = collections.deque(maxlen=TAMANHO_HISTORICO)
+_totais = collections.defaultdict(lambda: collections.Counter())
+_ultimos = {}
+_caches = collections.defaultdict(lambda: collections.Counter(acertos=0, falhas=0))
+
+# Fila da thread que grava JSONL/Prometheus (criada no primeiro registro)
+_fila_escrita = queue.Queue()
+_escritor = None
+
+
+def rss_mb():
+    """RSS atual do processo em MB (None se o sistema não informar)"""
+    try:
+        with open('/proc/self/statm', encoding='ascii') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def rss_pico_mb():
+    """Pico de RSS do processo em MB (ru_maxrss: bytes no macOS, KiB no Linux)"""
+    if resource is None:
+        return 0.0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 1024
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+
+def anotar(**valores):
+    """Anexa valores (ex.: linhas=..., bytes=...) ao registro da seção em execução"""
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].update(valores)
+
+
+@contextmanager
+def medir_secao(nome, **extras):
+    """
+    Mede o bloco como a seção `nome`.
+    Retorna (via as): o dict do registro, que pode receber linhas/bytes
+    """
+    registro = {'secao': nome, **extras}
+    pilha = _pilha()
+    pilha.append(registro)
+    inicio = time.perf_counter()
+    inicio_cpu = time.thread_time()
+    rss_inicio = rss_mb()
+    try:
+        yield registro
+    finally:
+        registro['segundos'] = round(time.perf_counter() - inicio, 6)
+        registro['cpu_segundos'] = round(time.thread_time() - inicio_cpu, 6)
+        rss_fim = rss_mb()
+        registro['rss_delta_mb'] = (
+            round(rss_fim - rss_inicio, 2) if rss_inicio is not None and rss_fim is not None else None
+        )
+        registro['timestamp'] = round(time.time(), 3)
+        pilha.pop()
+        registrar(registro)
+
+
+def instrumentar(nome):
+    """Decorator: mede cada chamada da função como a seção `nome`"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with medir_secao(nome):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+def registrar_cache(nome, acerto):
+    """Conta um acesso (acerto ou falha) ao cache `nome`"""
+    with _lock:
+        _caches[nome]['acertos' if acerto else 'falhas'] += 1
+
+
+def contar_cache(cache, nome=None):
+    """
+    Decorator: aplica cache (ex.: st.cache_resource(max_entries=16)) e
+    conta acertos e falhas da função; falha = o corpo da função executou
+    """
+    def decorador(funcao):
+        nome_cache = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def corpo(*args, **kwargs):
+            _local.executou_cache = True
+            return funcao(*args, **kwargs)
+
+        cacheada = cache(corpo)
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            # Salva o estado de uma chamada cacheada externa (chamadas aninhadas)
+            externo = getattr(_local, 'executou_cache', False)
+            _local.executou_cache = False
+            try:
+                resultado = cacheada(*args, **kwargs)
+                registrar_cache(nome_cache, acerto=not _local.executou_cache)
+                return resultado
+            finally:
+                _local.executou_cache = externo
+
+        envoltorio.clear = cacheada.clear
+        return envoltorio
+    return decorador
+
+
+def estatisticas_caches():
+    """
+    Acessos por cache no processo
+    Retorna: lista de dicts com cache, acertos, falhas e taxa_acerto (%)
+    """
+    with _lock:
+        contagens = {nome: dict(c) for nome, c in _caches.items()}
+    estatisticas = []
+    for nome, c in sorted(contagens.items()):
+        acessos = c['acertos'] + c['falhas']
+        estatisticas.append({
+            'cache': nome,
+            'acertos': c['acertos'],
+            'falhas': c['falhas'],
+            'taxa_acerto': round(c['acertos'] / acessos * 100, 1) if acessos else None,
+        })
+    return estatisticas
+
+
+def registrar(registro):
+    """Guarda o registro no histórico e enfileira a gravação nos destinos configurados"""
+    caminho_jsonl = os.environ.get(ENV_METRICAS_JSONL)
+    caminho_prom = os.environ.get(ENV_METRICAS_PROM)
+    with _lock:
+        _historico.append(registro)
+        _ultimos[registro['secao']] = registro
+        totais = _totais[registro['secao']]
+        totais['execucoes'] += 1
+        totais['segundos'] += registro['segundos']
+        totais['cpu_segundos'] += registro['cpu_segundos']
+        totais['bytes'] += registro.get('bytes', 0)
+        instantaneo = _instantaneo_prometheus() if caminho_prom else None
+
+    if caminho_jsonl or caminho_prom:
+        _iniciar_escritor()
+        _fila_escrita.put((caminho_jsonl, registro, caminho_prom, instantaneo))
+
+
+def _instantaneo_prometheus():
+    """Cópia dos valores do textfile (chamado com _lock; a formatação fica no escritor)"""
+    return {
+        secao: {
+            'execucoes': _totais[secao]['execucoes'],
+            'segundos': _totais[secao]['segundos'],
+            'cpu_segundos': _totais[secao]['cpu_segundos'],
+            'bytes': _totais[secao]['bytes'],
+            'ultima_duracao': _ultimos[secao]['segundos'],
+            'ultimas_linhas': _ultimos[secao].get('linhas', 0),
+        }
+        for secao in _ultimos
+    }
+
+
+def _iniciar_escritor():
+    global _escritor
+    if _escritor is not None:
+        return
+    with _lock:
+        if _escritor is None:
+            _escritor = threading.Thread(target=_escrever, name='olist-metricas', daemon=True)
+            _escritor.start()
+            atexit.register(descarregar)
+
+
+def _escrever():
+    """Thread de escrita: agrupa as linhas JSONL e grava só o último textfile"""
+    while True:
+        pendentes = [_fila_escrita.get()]
+        while True:
+            try:
+                pendentes.append(_fila_escrita.get_nowait())
+            except queue.Empty:
+                break
+
+        linhas_jsonl = collections.defaultdict(list)
+        ultimo_prom = {}
+        for caminho_jsonl, registro, caminho_prom, instantaneo in pendentes:
+            if caminho_jsonl:
+                linhas_jsonl[caminho_jsonl].append(json.dumps(registro, default=str) + '\n')
+            if caminho_prom:
+                ultimo_prom[caminho_prom] = instantaneo
+
+        for caminho, linhas in linhas_jsonl.items():
+            try:
+                with open(caminho, 'a', encoding='utf-8') as f:
+                    f.writelines(linhas)
+            except OSError:
+                pass
+        for caminho, instantaneo in ultimo_prom.items():
+            _gravar_prometheus(caminho, instantaneo)
+
+        for _ in pendentes:
+            _fila_escrita.task_done()
+
+
+def descarregar():
+    """Espera a thread de escrita gravar os registros já enfileirados"""
+    if _escritor is not None:
+        _fila_escrita.join()
+
+
+def _gravar_prometheus(caminho, instantaneo):
+    """Grava o textfile do Prometheus de forma atômica"""
+    linhas = []
+    metricas = [
+        ('olist_secao_execucoes_total', 'counter', 'Execuções da seção', 'execucoes'),
+        ('olist_secao_segundos_total', 'counter', 'Tempo de parede acumulado (s)', 'segundos'),
+        ('olist_secao_cpu_segundos_total', 'counter', 'Tempo de CPU acumulado (s)', 'cpu_segundos'),
+        ('olist_secao_bytes_total', 'counter', 'Bytes de payload renderizados', 'bytes'),
+        ('olist_secao_ultima_duracao_segundos', 'gauge', 'Duração da última execução (s)',
+         'ultima_duracao'),
+        ('olist_secao_ultimas_linhas', 'gauge', 'Linhas processadas na última execução',
+         'ultimas_linhas'),
+    ]
+    for nome, tipo, ajuda, campo in metricas:
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for secao in sorted(instantaneo):
+            linhas.append(f'{nome}{{secao="{secao}"}} {instantaneo[secao][campo]}')
+    tmp_path = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(linhas) + '\n')
+        os.replace(tmp_path, caminho)
+    except OSError:
+        pass
+
+
+def historico(secao=None):
+    """Registros recentes do processo (opcionalmente de uma seção)"""
+    with _lock:
+        registros = list(_historico)
+    if secao is not None:
+        registros = [r for r in registros if r['secao'] == secao]
+    return registros
+
+
+def resumo_latencias():
+    """
+    Latência por seção no histórico do processo
+    Retorna: lista de dicts com execuções, p50, p95 e máximo (s)
+    """
+    por_secao = collections.defaultdict(list)
+    for registro in historico():
+        por_secao[registro['secao']].append(registro['segundos'])
+
+    resumo = []
+    for secao, tempos in sorted(por_secao.items()):
+        tempos.sort()
+        n = len(tempos)
+        resumo.append({
+            'secao': secao,
+            'execucoes': n,
+            'p50_s': tempos[int(0.50 * (n - 1))],
+            'p95_s': tempos[int(0.95 * (n - 1))],
+            'max_s': tempos[-1],
+        })
+    return resumo
@@ -0,0 +1,259 @@
+"""
+Construção dos mapas folium do dashboard.
+"""
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import HeatMap
+
+from olist.piramide import tile_limites
+
+
+# Paleta da grade de contagens (poucos pontos -> muitos pontos)
+PALETA_GRADE = ['#2c7bb6', '#00a6ca', '#00ccbc', '#90eb9d', '#f9d057', '#f29e2e', '#d7191c']
+
+
+def _intensidade(pontos):
+    """Escala logarítmica de 0 a 1 para as contagens das células"""
+    log = np.log1p(np.asarray(pontos, dtype='float64'))
+    maximo = log.max() if len(log) else 0.0
+    return log / maximo if maximo > 0 else log
+
+
+def dados_calor(celulas):
+    """Pontos [lat, lng, intensidade] do mapa de calor"""
+    return np.column_stack([
+        celulas['lat'].to_numpy(dtype='float64'),
+        celulas['lng'].to_numpy(dtype='float64'),
+        _intensidade(celulas['pontos']),
+    ]).round(5).tolist()
+
+
+def dados_grade(celulas, nivel):
+    """
+    Células da grade como FeatureCollection, com cor e id por célula
+    (com o id o folium não precisa alterar o dict, que pode ser reutilizado)
+    """
+    sul, oeste, norte, leste = (
+        np.round(v, 5) for v in tile_limites(celulas['x'], celulas['y'], nivel)
+    )
+    indices_cor = np.minimum(
+        (_intensidade(celulas['pontos']) * len(PALETA_GRADE)).astype(int),
+        len(PALETA_GRADE) - 1,
+    )
+    features = [
+        {
+            'type': 'Feature',
+            'id': str(i),
+            'geometry': {
+                'type': 'Polygon',
+                'coordinates': [[[w, s], [e, s], [e, n], [w, n], [w, s]]],
+            },
+            'properties': {'pontos': int(p), 'cor': PALETA_GRADE[c]},
+        }
+        for i, (s, w, n, e, p, c) in enumerate(zip(
+            sul.tolist(), oeste.tolist(), norte.tolist(), leste.tolist(),
+            celulas['pontos'].tolist(), indices_cor.tolist(),
+        ))
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def dados_comunidade(celulas, nivel, modo='calor'):
+    """
+    Dados da camada da Comunidade (pontos do calor ou GeoJSON da grade).
+    Não são alterados ao montar o mapa, então podem ficar em cache e ser
+    compartilhados; o Map do folium não pode, pois st_folium o modifica.
+    """
+    if modo == 'calor':
+        return dados_calor(celulas)
+    return dados_grade(celulas, nivel)
+
+
+def camada_calor(dados, nome='Densidade'):
+    """Mapa de calor ponderado pelas contagens das células (ver dados_calor)"""
+    return HeatMap(dados, name=nome, radius=12, blur=15, min_opacity=0.3)
+
+
+def camada_grade(dados, nome='Contagens'):
+    """Células da grade como um único GeoJSON, coloridas pela contagem (ver dados_grade)"""
+    return folium.GeoJson(
+        dados,
+        name=nome,
+        style_function=lambda f: {
+            'fillColor': f['properties']['cor'],
+            'color': f['properties']['cor'],
+            'weight': 0,
+            'fillOpacity': 0.6,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=['pontos'], aliases=['Localizações:']),
+    )
+
+
+def construir_mapa_comunidade(dados, centro, zoom=5, modo='calor',
+                              tiles='CartoDB dark_matter'):
+    """Mapa da Comunidade Olist a partir dos dados da camada (ver dados_comunidade)"""
+    mapa = folium.Map(
+        location=centro,
+        zoom_start=zoom,
+        tiles=tiles,
+        width='100%'
+    )
+    if modo == 'calor':
+        if dados:
+            camada_calor(dados).add_to(mapa)
+    elif dados['features']:
+        camada_grade(dados).add_to(mapa)
+    return mapa
+
+
+def camada_pontos(df, nome, rotulo, col_cidade, col_estado, cor, raio=5, opacidade=0.7):
+    """
+    Todos os pontos de df em uma única camada GeoJSON.
+    Estilo e popup são definidos uma vez para a camada inteira, em vez de
+    um CircleMarker (e um bloco JS) por linha.
+    """
+    lat = df['geolocation_lat'].to_numpy(dtype='float64').round(4)
+    lng = df['geolocation_lng'].to_numpy(dtype='float64').round(4)
+    local = (
+        # fillna antes do astype(str): ausentes viram '' e não 'nan'
+        # (via object, pois categóricas não aceitam '' como valor)
+        df[col_cidade].astype(object).fillna('').astype(str)
+        + ', ' + df[col_estado].astype(object).fillna('').astype(str)
+        if col_cidade in df.columns and col_estado in df.columns
+        else pd.Series('', index=df.index)
+    )
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [x, y]},
+            'properties': {'local': l},
+        }
+        for y, x, l in zip(lat.tolist(), lng.tolist(), local.tolist())
+    ]
+    return folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name=nome,
+        marker=folium.CircleMarker(
+            radius=raio,
+            color=cor,
+            fill=True,
+            fill_color=cor,
+            fill_opacity=opacidade
+        ),
+        popup=folium.GeoJsonPopup(fields=['local'], aliases=[f'<b>{rotulo}</b>']),
+    )
+
+
+def construir_mapa_comparativo(vendedores, clientes, tiles='CartoDB positron'):
+    """Mapa com vendedores (vermelho) e clientes (azul) em camadas separadas"""
+    mapa = folium.Map(
+        location=[-15, -55],
+        zoom_start=4,
+        tiles=tiles,
+        width='100%',
+        prefer_canvas=True
+    )
+    # Amostras vazias (ex.: filtros sem pedidos) não viram camada
+    if len(vendedores) > 0:
+        camada_pontos(
+            vendedores, '🏪 Vendedores', 'Vendedor',
+            'seller_city', 'seller_state', '#FF0000', raio=5, opacidade=0.7
+        ).add_to(mapa)
+    if len(clientes) > 0:
+        camada_pontos(
+            clientes, '👥 Clientes', 'Cliente',
+            'customer_city', 'customer_state', '#1E90FF', raio=4, opacidade=0.6
+        ).add_to(mapa)
+    folium.LayerControl().add_to(mapa)
+    return mapa
+
+
+def construir_mapa_fluxos(pares, max_pares=60, tiles='CartoDB positron'):
+    """
+    Fluxos vendedor → cliente entre estados: uma linha por par origem →
+    destino (espessura pelo volume) e um círculo por estado para os envios
+    dentro do próprio estado. Só os max_pares maiores pares entre estados
+    são desenhados.
+    """
+    mapa = folium.Map(
+        location=[-15, -55],
+        zoom_start=4,
+        tiles=tiles,
+        width='100%',
+        prefer_canvas=True
+    )
+
+    pares = pares.assign(intensidade=_intensidade(pares['envios']))
+    internos = pares[pares['estado_origem'] == pares['estado_destino']]
+    externos = pares[pares['estado_origem'] != pares['estado_destino']].head(max_pares)
+
+    def rotulo(par):
+        return (
+            f"{par.estado_origem} → {par.estado_destino}: {par.envios:,} envios, "
+            f"{par.distancia_media_km:,.0f} km, {par.tempo_medio_dias:.1f} dias"
+        )
+
+    linhas = [
+        {
+            'type': 'Feature',
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [
+                    [round(par.lng_origem, 4), round(par.lat_origem, 4)],
+                    [round(par.lng_destino, 4), round(par.lat_destino, 4)],
+                ],
+            },
+            'properties': {'rotulo': rotulo(par), 'peso': 1 + 9 * par.intensidade},
+        }
+        for par in externos.itertuples()
+    ]
+    # Camadas vazias (ex.: filtros sem envios entre estados) não são criadas
+    if linhas:
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': linhas},
+            name='Entre estados',
+            style_function=lambda f: {
+                'color': '#d7191c', 'weight': f['properties']['peso'], 'opacity': 0.5
+            },
+            tooltip=folium.GeoJsonTooltip(fields=['rotulo'], labels=False),
+        ).add_to(mapa)
+
+    circulos = [
+        {
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [round(par.lng_origem, 4), round(par.lat_origem, 4)],
+            },
+            'properties': {'rotulo': rotulo(par), 'raio': 3 + 17 * par.intensidade},
+        }
+        for par in internos.itertuples()
+    ]
+    if circulos:
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': circulos},
+            name='Dentro do estado',
+            marker=folium.CircleMarker(fill=True),
+            style_function=lambda f: {
+                'radius': f['properties']['raio'], 'color': '#2c7bb6',
+                'fillColor': '#2c7bb6', 'fillOpacity': 0.4, 'weight': 1
+            },
+            tooltip=folium.GeoJsonTooltip(fields=['rotulo'], labels=False),
+        ).add_to(mapa)
+
+    folium.LayerControl().add_to(mapa)
+    return mapa
+
+
+def bytes_renderizados(mapa):
+    """
+    Tamanho do HTML/JS do mapa depois de renderizado (por st_folium ou
+    save), lido dos elementos já gerados pelo branca, sem renderizar de novo
+    """
+    raiz = mapa.get_root()
+    total = 0
+    for parte in (raiz.header, raiz.html, raiz.script):
+        for elemento in parte._children.values():
+            total += len(getattr(elemento, '_template_str', None) or '')
+    return total
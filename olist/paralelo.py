@@ -0,0 +1,154 @@
+"""
+Ingestão paralela dos CSVs do Olist em um pool de processos.
+
+Cada CSV pendente é lido em um processo separado. Arquivos grandes sem
+quebras de linha dentro de campos (ESQUEMAS[...]['divisivel']), como a
+geolocalização, são divididos em faixas de bytes alinhadas ao início de
+linha, lidas em paralelo e concatenadas no processo principal. Assim a
+carga a frio cai com o número de núcleos em vez de ser a soma de todos
+os arquivos.
+
+OLIST_PROCESSOS define o número de processos (padrão: núcleos da
+máquina; 1 desliga o pool).
+"""
+import concurrent.futures
+import io
+import multiprocessing
+import os
+
+import pandas as pd
+
+from olist.ingestao import (
+    ESQUEMAS,
+    caminho_cache,
+    concatenar_tabelas,
+    gravar_cache,
+    ler_csv,
+    listar_csvs,
+)
+
+
+ENV_PROCESSOS = 'OLIST_PROCESSOS'
+
+# Tamanho alvo de cada faixa de bytes de um arquivo divisível
+TAMANHO_FAIXA = 16 << 20
+
+# Abaixo deste volume pendente o custo de subir o pool não compensa
+LIMITE_PARALELO = 32 << 20
+
+
+def numero_processos(processos=None):
+    """Processos do pool: argumento, OLIST_PROCESSOS ou número de núcleos"""
+    return max(1, int(processos or os.environ.get(ENV_PROCESSOS) or os.cpu_count() or 1))
+
+
+def faixas_csv(file_path, partes):
+    """
+    Divide o corpo do CSV (sem o cabeçalho) em até partes faixas de bytes,
+    cada uma começando no início de uma linha.
+    Retorna: (colunas, [(inicio, fim), ...])
+    """
+    tamanho = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        cabecalho = f.readline()
+        inicio = f.tell()
+        passo = max(1, (tamanho - inicio) // max(1, partes))
+        limites = [inicio]
+        for i in range(1, partes):
+            f.seek(max(limites[-1], inicio + i * passo))
+            f.readline()
+            posicao = f.tell()
+            if posicao >= tamanho:
+                break
+            if posicao > limites[-1]:
+                limites.append(posicao)
+        limites.append(tamanho)
+
+    colunas = list(pd.read_csv(io.BytesIO(cabecalho), nrows=0).columns)
+    return colunas, list(zip(limites[:-1], limites[1:]))
+
+
+def _ler_arquivo(path, file_name, gravar):
+    """Tarefa do pool: lê um CSV inteiro (e grava o Parquet se gravar=True)"""
+    df = ler_csv(os.path.join(path, file_name))
+    if gravar:
+        gravar_cache(df, caminho_cache(path, file_name))
+        return None
+    return df
+
+
+def _ler_faixa(file_path, inicio, fim, colunas):
+    """Tarefa do pool: lê uma faixa de bytes de um CSV"""
+    return ler_csv(file_path, inicio=inicio, colunas=colunas, fim=fim)
+
+
+def _executar(path, file_names, processos, gravar):
+    """
+    Lê file_names em um pool de processos.
+    Retorna: dict {nome_do_arquivo: DataFrame} com as tabelas que ficaram
+             no processo principal (todas, se gravar=False)
+    """
+    # Maiores primeiro, para equilibrar a carga entre os processos
+    tamanhos = {f: os.path.getsize(os.path.join(path, f)) for f in file_names}
+    ordem = sorted(file_names, key=tamanhos.get, reverse=True)
+
+    contexto = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(processos, mp_context=contexto) as pool:
+        tarefas = {}
+        for file_name in ordem:
+            file_path = os.path.join(path, file_name)
+            partes = min(processos, -(-tamanhos[file_name] // TAMANHO_FAIXA))
+            if ESQUEMAS.get(file_name, {}).get('divisivel') and partes > 1:
+                colunas, faixas = faixas_csv(file_path, partes)
+                tarefas[file_name] = [
+                    pool.submit(_ler_faixa, file_path, inicio, fim, colunas)
+                    for inicio, fim in faixas
+                ]
+            else:
+                tarefas[file_name] = [pool.submit(_ler_arquivo, path, file_name, gravar)]
+
+        tabelas = {}
+        for file_name, futuros in tarefas.items():
+            resultados = [futuro.result() for futuro in futuros]
+            if len(resultados) > 1:
+                df = concatenar_tabelas(resultados)
+                if gravar:
+                    gravar_cache(df, caminho_cache(path, file_name))
+                tabelas[file_name] = df
+            elif resultados[0] is not None:
+                tabelas[file_name] = resultados[0]
+    return tabelas
+
+
+def ingerir_em_paralelo(path, file_names, processos=None):
+    """
+    Gera em paralelo o cache Parquet dos arquivos de file_names que ainda
+    não têm cache atualizado. Com um processo só, pouco volume pendente ou
+    falha do pool não faz nada (a carga sequencial segue normalmente).
+    Retorna: dict {nome_do_arquivo: DataFrame} com as tabelas já lidas
+             que ficaram em memória no processo principal
+    """
+    processos = numero_processos(processos)
+    pendentes = [
+        file_name for file_name in file_names
+        if not os.path.exists(caminho_cache(path, file_name))
+        or os.path.getmtime(caminho_cache(path, file_name))
+        < os.path.getmtime(os.path.join(path, file_name))
+    ]
+    volume = sum(os.path.getsize(os.path.join(path, f)) for f in pendentes)
+    if processos <= 1 or volume < LIMITE_PARALELO:
+        return {}
+
+    try:
+        return _executar(path, pendentes, processos, gravar=True)
+    except Exception:
+        return {}
+
+
+def ler_dataset_paralelo(path, processos=None):
+    """
+    Lê todos os CSVs de path em paralelo, sem passar pelo cache
+    Retorna: dict {nome_do_arquivo: DataFrame}
+    """
+    tabelas = _executar(path, listar_csvs(path), numero_processos(processos), gravar=False)
+    return {file_name: tabelas[file_name] for file_name in listar_csvs(path)}
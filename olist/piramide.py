@@ -0,0 +1,230 @@
+"""
+Pirâmide de agregação espacial dos pontos de geolocalização.
+
+Os pontos são agrupados em células da grade de tiles Web Mercator
+(quadkey) para cada nível de zoom de 0 a NIVEL_MAX. Cada célula guarda
+o número de pontos e o centroide. O mapa envia ao navegador apenas as
+células do nível adequado ao zoom e dentro da área visível, então o
+tamanho da página não depende do número de linhas do dataset.
+
+Para o filtro de estados há uma segunda pirâmide com as células
+separadas por estado; a pirâmide de um conjunto de estados junta, só no
+nível pedido pelo mapa, as células desses estados.
+"""
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from olist.ingestao import caminho_cache_derivado, gravar_cache_derivado, ler_cache
+
+
+TABELA_PIRAMIDE = 'piramide_geo'
+TABELA_PIRAMIDE_ESTADOS = 'piramide_geo_estados'
+
+# Nível mais fino da grade (z16 ≈ 600 m por célula)
+NIVEL_MAX = 16
+
+# Cada tile de 256 px do mapa é dividido em 2**REFINAMENTO células por lado
+REFINAMENTO = 3
+
+# Limite de células enviadas ao navegador por renderização
+MAX_CELULAS = 20_000
+
+# Limite de latitude da projeção Web Mercator
+LAT_MAX = 85.05112878
+
+
+def tile_xy(lat, lng, nivel):
+    """Converte arrays de lat/lng nas coordenadas inteiras (x, y) do tile no nível"""
+    n = 2 ** nivel
+    lat_rad = np.radians(np.clip(np.asarray(lat, dtype='float64'), -LAT_MAX, LAT_MAX))
+    lng = np.asarray(lng, dtype='float64')
+    x = ((lng + 180.0) / 360.0 * n).astype('int64')
+    y = ((1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0 * n).astype('int64')
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def tile_limites(x, y, nivel):
+    """Retorna (lat_sul, lng_oeste, lat_norte, lng_leste) dos tiles (x, y) no nível"""
+    n = 2 ** nivel
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    def lat(yy):
+        return np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * yy / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def construir_piramide(lat, lng, nivel_max=NIVEL_MAX, estados=None):
+    """
+    Agrega os pontos em todos os níveis de 0 a nivel_max.
+    O nível mais fino é calculado a partir dos pontos; cada nível acima
+    é obtido agregando as células do nível de baixo.
+    estados: estado de cada ponto (células separadas por estado)
+    Retorna: dict {nivel: DataFrame([estado,] x, y, pontos, lat, lng)}
+    """
+    x, y = tile_xy(lat, lng, nivel_max)
+    chaves = ['x', 'y']
+    pontos = pd.DataFrame({
+        'x': x,
+        'y': y,
+        'pontos': 1,
+        'soma_lat': np.asarray(lat, dtype='float64'),
+        'soma_lng': np.asarray(lng, dtype='float64'),
+    })
+    if estados is not None:
+        chaves = ['estado', 'x', 'y']
+        pontos.insert(0, 'estado', pd.Categorical(np.asarray(estados)))
+    celulas = pontos.groupby(chaves, sort=True, observed=True).sum().reset_index()
+
+    piramide = {}
+    for nivel in range(nivel_max, -1, -1):
+        if nivel < nivel_max:
+            celulas['x'] //= 2
+            celulas['y'] //= 2
+            celulas = celulas.groupby(chaves, sort=True, observed=True).sum().reset_index()
+        piramide[nivel] = pd.DataFrame({
+            'x': celulas['x'].astype('int32'),
+            'y': celulas['y'].astype('int32'),
+            'pontos': celulas['pontos'].astype('int32'),
+            'lat': (celulas['soma_lat'] / celulas['pontos']).astype('float32'),
+            'lng': (celulas['soma_lng'] / celulas['pontos']).astype('float32'),
+        })
+        if estados is not None:
+            piramide[nivel].insert(0, 'estado', celulas['estado'].astype(str).to_numpy())
+    return dict(sorted(piramide.items()))
+
+
+def carregar_piramide(path, geolocation_df, impressao):
+    """
+    Retorna a pirâmide de agregação, lendo/gravando o cache ao lado do dataset.
+    impressao identifica a versão do arquivo de geolocalização.
+    """
+    cache_path = caminho_cache_derivado(path, TABELA_PIRAMIDE, impressao)
+    tabela = ler_cache(cache_path)
+    if tabela is not None:
+        return {
+            int(nivel): celulas.drop(columns='nivel').reset_index(drop=True)
+            for nivel, celulas in tabela.groupby('nivel', sort=True)
+        }
+
+    geo = geolocation_df.dropna(subset=['geolocation_lat', 'geolocation_lng'])
+    piramide = construir_piramide(geo['geolocation_lat'], geo['geolocation_lng'])
+    tabela = pd.concat(
+        [celulas.assign(nivel=np.int8(nivel)) for nivel, celulas in piramide.items()],
+        ignore_index=True,
+    )
+    gravar_cache_derivado(tabela, path, TABELA_PIRAMIDE, impressao)
+    return piramide
+
+
+def carregar_piramide_estados(path, geolocation_df, impressao):
+    """Pirâmide com células separadas por estado (cache ao lado do dataset, como a pirâmide)"""
+    cache_path = caminho_cache_derivado(path, TABELA_PIRAMIDE_ESTADOS, impressao)
+    tabela = ler_cache(cache_path)
+    if tabela is not None:
+        return {
+            int(nivel): celulas.drop(columns='nivel').reset_index(drop=True)
+            for nivel, celulas in tabela.groupby('nivel', sort=True)
+        }
+
+    geo = geolocation_df.dropna(
+        subset=['geolocation_lat', 'geolocation_lng', 'geolocation_state']
+    )
+    piramide = construir_piramide(
+        geo['geolocation_lat'], geo['geolocation_lng'], estados=geo['geolocation_state']
+    )
+    tabela = pd.concat(
+        [celulas.assign(nivel=np.int8(nivel)) for nivel, celulas in piramide.items()],
+        ignore_index=True,
+    )
+    gravar_cache_derivado(tabela, path, TABELA_PIRAMIDE_ESTADOS, impressao)
+    return piramide
+
+
+class PiramideFiltrada(Mapping):
+    """
+    Pirâmide só com os pontos de alguns estados, no formato de
+    construir_piramide. Cada nível é montado (e guardado) quando pedido.
+    """
+
+    def __init__(self, piramide_estados, estados):
+        self.piramide_estados = piramide_estados
+        self.estados = list(estados)
+        self._niveis = {}
+
+    def __getitem__(self, nivel):
+        if nivel not in self._niveis:
+            celulas = self.piramide_estados[nivel]
+            celulas = celulas[celulas['estado'].isin(self.estados)]
+            somas = pd.DataFrame({
+                'x': celulas['x'].to_numpy(),
+                'y': celulas['y'].to_numpy(),
+                'pontos': celulas['pontos'].to_numpy(dtype='int64'),
+                'soma_lat': celulas['lat'].to_numpy(dtype='float64') * celulas['pontos'].to_numpy(),
+                'soma_lng': celulas['lng'].to_numpy(dtype='float64') * celulas['pontos'].to_numpy(),
+            }).groupby(['x', 'y'], sort=True).sum().reset_index()
+            self._niveis[nivel] = pd.DataFrame({
+                'x': somas['x'].astype('int32'),
+                'y': somas['y'].astype('int32'),
+                'pontos': somas['pontos'].astype('int32'),
+                'lat': (somas['soma_lat'] / somas['pontos']).astype('float32'),
+                'lng': (somas['soma_lng'] / somas['pontos']).astype('float32'),
+            })
+        return self._niveis[nivel]
+
+    def __iter__(self):
+        return iter(self.piramide_estados)
+
+    def __len__(self):
+        return len(self.piramide_estados)
+
+
+def faixa_visivel(limites, zoom, margem=1):
+    """
+    Converte os limites do mapa (formato do st_folium) na faixa de tiles
+    (x0, x1, y0, y1) do zoom, com margem em tiles.
+    Trabalhar em tiles inteiros torna a faixa estável a pequenos movimentos.
+    """
+    sul, oeste = limites['_southWest']['lat'], limites['_southWest']['lng']
+    norte, leste = limites['_northEast']['lat'], limites['_northEast']['lng']
+    n = 2 ** zoom
+    (x0, x1), (y0, y1) = tile_xy([norte, sul], [oeste, leste], zoom)
+    return (
+        max(int(x0) - margem, 0), min(int(x1) + margem, n - 1),
+        max(int(y0) - margem, 0), min(int(y1) + margem, n - 1),
+    )
+
+
+def _faixa_no_nivel(faixa, zoom, nivel):
+    """Converte uma faixa de tiles do zoom em faixa de células do nível"""
+    x0, x1, y0, y1 = faixa
+    desloc = nivel - zoom
+    if desloc >= 0:
+        return (
+            x0 << desloc, ((x1 + 1) << desloc) - 1,
+            y0 << desloc, ((y1 + 1) << desloc) - 1,
+        )
+    return x0 >> -desloc, x1 >> -desloc, y0 >> -desloc, y1 >> -desloc
+
+
+def celulas_visiveis(piramide, zoom, faixa=None, max_celulas=MAX_CELULAS):
+    """
+    Seleciona as células a renderizar para o zoom do mapa.
+    Usa o nível zoom + REFINAMENTO, restrito à faixa de tiles visível,
+    e sobe de nível até caber em max_celulas.
+    Retorna: (nivel, DataFrame de células)
+    """
+    nivel_max = max(piramide)
+    nivel = min(int(zoom) + REFINAMENTO, nivel_max)
+
+    while True:
+        celulas = piramide[nivel]
+        if faixa is not None:
+            x0, x1, y0, y1 = _faixa_no_nivel(faixa, int(zoom), nivel)
+            celulas = celulas[celulas['x'].between(x0, x1) & celulas['y'].between(y0, y1)]
+        if len(celulas) <= max_celulas or nivel == 0:
+            return nivel, celulas
+        nivel -= 1
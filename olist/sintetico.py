@@ -0,0 +1,378 @@
+"""
+Gerador de datasets Olist sintéticos, fiéis ao esquema dos CSVs públicos.
+
+Produz os nove arquivos do dataset em qualquer escala (1 = tamanho do
+dataset público), com concentração realista de clientes e vendedores
+por estado e prefixo de CEP e muitas linhas de geolocalização por
+prefixo. Tabelas grandes são escritas em blocos, então escalas como
+100x não precisam caber em memória.
+
+Uso:
+    python -m olist.sintetico --escala 10 --saida dados/olist_x10
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Linhas de cada tabela no dataset público (escala 1)
+LINHAS_BASE = {
+    'pedidos': 99_441,
+    'produtos': 32_951,
+    'vendedores': 3_095,
+    'prefixos': 19_015,
+    'geolocalizacao': 1_000_163,
+}
+
+# Pedidos por bloco de escrita
+TAMANHO_BLOCO = 500_000
+
+# Estado: (participação nos clientes, faixa de CEP (prefixo de 5 dígitos), lat, lng)
+ESTADOS = {
+    'SP': (0.420, (1000, 19999), -22.5, -48.0),
+    'RJ': (0.129, (20000, 28999), -22.4, -42.9),
+    'MG': (0.117, (30000, 39999), -19.0, -44.5),
+    'RS': (0.055, (90000, 99999), -29.8, -52.5),
+    'PR': (0.051, (80000, 87999), -24.8, -51.5),
+    'SC': (0.037, (88000, 89999), -27.3, -49.8),
+    'BA': (0.034, (40000, 48999), -12.9, -40.5),
+    'DF': (0.022, (70000, 72799), -15.8, -47.9),
+    'ES': (0.020, (29000, 29999), -19.8, -40.5),
+    'GO': (0.020, (72800, 76799), -16.5, -49.5),
+    'PE': (0.017, (50000, 56999), -8.3, -36.5),
+    'CE': (0.013, (60000, 63999), -4.5, -39.3),
+    'PA': (0.010, (66000, 68899), -2.5, -49.0),
+    'MT': (0.009, (78000, 78899), -14.0, -55.5),
+    'MA': (0.0075, (65000, 65999), -4.0, -44.5),
+    'MS': (0.0072, (79000, 79999), -20.8, -54.8),
+    'PB': (0.0054, (58000, 58999), -7.2, -36.0),
+    'PI': (0.0050, (64000, 64999), -6.5, -42.5),
+    'RN': (0.0049, (59000, 59999), -5.8, -36.4),
+    'AL': (0.0041, (57000, 57999), -9.6, -36.4),
+    'SE': (0.0034, (49000, 49999), -10.8, -37.3),
+    'TO': (0.0028, (77000, 77999), -10.2, -48.3),
+    'RO': (0.0025, (76800, 76999), -10.9, -62.5),
+    'AM': (0.0015, (69000, 69299), -3.3, -60.5),
+    'AC': (0.0008, (69900, 69999), -9.5, -68.5),
+    'AP': (0.0007, (68900, 68999), 0.5, -51.5),
+    'RR': (0.0005, (69300, 69399), 2.5, -60.8),
+}
+
+STATUS_PEDIDO = {
+    'delivered': 0.970,
+    'shipped': 0.011,
+    'canceled': 0.006,
+    'unavailable': 0.006,
+    'invoiced': 0.003,
+    'processing': 0.003,
+    'created': 0.0005,
+    'approved': 0.0005,
+}
+
+TIPOS_PAGAMENTO = {
+    'credit_card': 0.739,
+    'boleto': 0.190,
+    'voucher': 0.056,
+    'debit_card': 0.015,
+}
+
+NOTAS_AVALIACAO = {5: 0.577, 4: 0.193, 1: 0.115, 3: 0.082, 2: 0.033}
+
+CATEGORIAS = {
+    'cama_mesa_banho': 'bed_bath_table',
+    'beleza_saude': 'health_beauty',
+    'esporte_lazer': 'sports_leisure',
+    'moveis_decoracao': 'furniture_decor',
+    'informatica_acessorios': 'computers_accessories',
+    'utilidades_domesticas': 'housewares',
+    'relogios_presentes': 'watches_gifts',
+    'telefonia': 'telephony',
+    'ferramentas_jardim': 'garden_tools',
+    'automotivo': 'auto',
+    'brinquedos': 'toys',
+    'cool_stuff': 'cool_stuff',
+    'perfumaria': 'perfumery',
+    'bebes': 'baby',
+    'eletronicos': 'electronics',
+    'papelaria': 'stationery',
+    'fashion_bolsas_e_acessorios': 'fashion_bags_accessories',
+    'pet_shop': 'pet_shop',
+    'moveis_escritorio': 'office_furniture',
+    'consoles_games': 'consoles_games',
+}
+
+INICIO_COMPRAS = pd.Timestamp('2016-09-04')
+FIM_COMPRAS = pd.Timestamp('2018-10-17')
+
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+
+def _ids(rng, n):
+    """n identificadores hexadecimais de 32 caracteres, como os do Olist"""
+    texto = rng.bytes(16 * n).hex()
+    return [texto[i:i + 32] for i in range(0, 32 * n, 32)]
+
+
+def _escolha(rng, opcoes, n):
+    """Amostra n valores de um dict {valor: probabilidade}"""
+    valores = np.array(list(opcoes))
+    pesos = np.array(list(opcoes.values()), dtype='float64')
+    return valores[rng.choice(len(valores), size=n, p=pesos / pesos.sum())]
+
+
+def _zipf(rng, n_itens, n, expoente=1.1):
+    """n índices em [0, n_itens) com popularidade de cauda longa"""
+    pesos = 1.0 / np.arange(1, n_itens + 1) ** expoente
+    return rng.choice(n_itens, size=n, p=pesos / pesos.sum())
+
+
+def _datas(serie):
+    """Formata datetimes como no CSV público (NaT vira campo vazio)"""
+    return pd.Series(serie).dt.strftime(FORMATO_DATA).fillna('')
+
+
+def _gravar(df, caminho, primeiro_bloco):
+    df.to_csv(caminho, index=False, mode='w' if primeiro_bloco else 'a', header=primeiro_bloco)
+
+
+def gerar_prefixos(rng, escala):
+    """
+    Prefixos de CEP com estado, cidade, centroide e peso de popularidade.
+    Retorna: DataFrame com uma linha por prefixo
+    """
+    n = max(int(LINHAS_BASE['prefixos'] * min(escala, 4.0)), len(ESTADOS))
+    estados = list(ESTADOS)
+    participacao = np.array([ESTADOS[e][0] for e in estados])
+    estado_idx = rng.choice(len(estados), size=n, p=participacao / participacao.sum())
+    estado_idx[:len(estados)] = np.arange(len(estados))
+
+    cep = np.empty(n, dtype='int64')
+    lat = np.empty(n)
+    lng = np.empty(n)
+    for i, estado in enumerate(estados):
+        mascara = estado_idx == i
+        k = int(mascara.sum())
+        _, (cep_min, cep_max), lat_c, lng_c = ESTADOS[estado]
+        cep[mascara] = rng.integers(cep_min, cep_max + 1, size=k)
+        lat[mascara] = lat_c + rng.normal(0, 1.5, size=k)
+        lng[mascara] = lng_c + rng.normal(0, 1.5, size=k)
+
+    prefixos = pd.DataFrame({
+        'cep': cep,
+        'estado': np.array(estados)[estado_idx],
+        'lat': lat,
+        'lng': lng,
+    }).drop_duplicates(subset=['cep']).reset_index(drop=True)
+
+    # Cidades: prefixos vizinhos compartilham a cidade
+    prefixos['cidade'] = [
+        f"cidade {estado.lower()} {cep // 200}"
+        for estado, cep in zip(prefixos['estado'], prefixos['cep'])
+    ]
+    # Popularidade de cauda longa dentro do dataset inteiro
+    prefixos['peso'] = 1.0 / (rng.permutation(len(prefixos)) + 1.0) ** 0.7
+    return prefixos
+
+
+def gerar_geolocalizacao(rng, prefixos, escala, caminho):
+    """Muitas linhas por prefixo, espalhadas em torno do centroide"""
+    n = int(LINHAS_BASE['geolocalizacao'] * escala)
+    pesos = prefixos['peso'].to_numpy()
+    contagem = rng.multinomial(n - len(prefixos), pesos / pesos.sum()) + 1
+
+    primeiro = True
+    for inicio in range(0, len(prefixos), 2_000):
+        bloco = prefixos.iloc[inicio:inicio + 2_000]
+        repeticoes = contagem[inicio:inicio + 2_000]
+        linhas = bloco.loc[bloco.index.repeat(repeticoes)]
+        m = len(linhas)
+        cidades = linhas['cidade'].to_numpy().copy()
+        # Grafias alternativas da cidade em parte das linhas, como no dado real
+        variantes = rng.random(m) < 0.05
+        cidades[variantes] = [c.replace('cidade', 'cid.') for c in cidades[variantes]]
+        df = pd.DataFrame({
+            'geolocation_zip_code_prefix': linhas['cep'].map('{:05d}'.format).to_numpy(),
+            'geolocation_lat': (linhas['lat'].to_numpy() + rng.normal(0, 0.02, m)).round(8),
+            'geolocation_lng': (linhas['lng'].to_numpy() + rng.normal(0, 0.02, m)).round(8),
+            'geolocation_city': cidades,
+            'geolocation_state': linhas['estado'].to_numpy(),
+        })
+        _gravar(df, caminho, primeiro)
+        primeiro = False
+
+
+def _sortear_prefixos(rng, prefixos, n):
+    pesos = prefixos['peso'].to_numpy()
+    return prefixos.iloc[rng.choice(len(prefixos), size=n, p=pesos / pesos.sum())]
+
+
+def gerar_vendedores(rng, prefixos, escala):
+    n = max(int(LINHAS_BASE['vendedores'] * escala), 1)
+    locais = _sortear_prefixos(rng, prefixos, n)
+    return pd.DataFrame({
+        'seller_id': _ids(rng, n),
+        'seller_zip_code_prefix': locais['cep'].map('{:05d}'.format).to_numpy(),
+        'seller_city': locais['cidade'].to_numpy(),
+        'seller_state': locais['estado'].to_numpy(),
+    })
+
+
+def gerar_produtos(rng, escala):
+    n = max(int(LINHAS_BASE['produtos'] * escala), 1)
+    categorias = np.array(list(CATEGORIAS), dtype=object)[_zipf(rng, len(CATEGORIAS), n, 0.8)]
+    categorias[rng.random(n) < 0.0185] = None
+    return pd.DataFrame({
+        'product_id': _ids(rng, n),
+        'product_category_name': categorias,
+        'product_name_lenght': rng.integers(5, 77, n),
+        'product_description_lenght': rng.integers(4, 3993, n),
+        'product_photos_qty': rng.integers(1, 8, n),
+        'product_weight_g': rng.lognormal(6.5, 1.2, n).round(),
+        'product_length_cm': rng.integers(7, 106, n),
+        'product_height_cm': rng.integers(2, 106, n),
+        'product_width_cm': rng.integers(6, 119, n),
+    })
+
+
+def gerar_bloco_pedidos(rng, n, prefixos, produtos, vendedores):
+    """
+    Clientes, pedidos, itens, pagamentos e avaliações de n pedidos
+    Retorna: dict {nome_do_arquivo: DataFrame}
+    """
+    # Clientes (um customer_id por pedido, como no dataset público)
+    locais = _sortear_prefixos(rng, prefixos, n)
+    customer_id = _ids(rng, n)
+    clientes = pd.DataFrame({
+        'customer_id': customer_id,
+        'customer_unique_id': _ids(rng, n),
+        'customer_zip_code_prefix': locais['cep'].map('{:05d}'.format).to_numpy(),
+        'customer_city': locais['cidade'].to_numpy(),
+        'customer_state': locais['estado'].to_numpy(),
+    })
+
+    # Pedidos
+    order_id = _ids(rng, n)
+    status = _escolha(rng, STATUS_PEDIDO, n)
+    periodo = (FIM_COMPRAS - INICIO_COMPRAS).total_seconds()
+    compra = INICIO_COMPRAS + pd.to_timedelta(np.sort(rng.random(n)) * periodo, unit='s')
+    aprovacao = compra + pd.to_timedelta(rng.exponential(10, n), unit='h')
+    transportadora = aprovacao + pd.to_timedelta(rng.gamma(2.0, 1.5, n), unit='D')
+    entrega = transportadora + pd.to_timedelta(rng.gamma(2.5, 4.0, n), unit='D')
+    estimada = (compra + pd.to_timedelta(rng.normal(24, 8, n).clip(3), unit='D')).normalize()
+
+    entregue = status == 'delivered'
+    enviado = entregue | (status == 'shipped')
+    aprovado = status != 'created'
+    pedidos = pd.DataFrame({
+        'order_id': order_id,
+        'customer_id': customer_id,
+        'order_status': status,
+        'order_purchase_timestamp': _datas(compra),
+        'order_approved_at': _datas(pd.Series(aprovacao).where(aprovado)),
+        'order_delivered_carrier_date': _datas(pd.Series(transportadora).where(enviado)),
+        'order_delivered_customer_date': _datas(pd.Series(entrega).where(entregue)),
+        'order_estimated_delivery_date': _datas(estimada),
+    })
+
+    # Itens (1 a 4 por pedido; produtos e vendedores com cauda longa)
+    n_itens = np.minimum(rng.geometric(0.88, n), 4)
+    pedido_do_item = np.repeat(np.arange(n), n_itens)
+    m = len(pedido_do_item)
+    inicio_pedido = np.cumsum(n_itens) - n_itens
+    preco = rng.lognormal(4.4, 0.9, m).round(2)
+    itens = pd.DataFrame({
+        'order_id': np.asarray(order_id, dtype=object)[pedido_do_item],
+        'order_item_id': np.arange(m) - np.repeat(inicio_pedido, n_itens) + 1,
+        'product_id': produtos['product_id'].to_numpy()[_zipf(rng, len(produtos), m, 0.9)],
+        'seller_id': vendedores['seller_id'].to_numpy()[_zipf(rng, len(vendedores), m, 1.0)],
+        'shipping_limit_date': _datas(pd.Series(compra[pedido_do_item]) + pd.to_timedelta(6, unit='D')),
+        'price': preco,
+        'freight_value': rng.gamma(2.0, 10.0, m).round(2),
+    })
+
+    # Pagamentos (o valor do pedido dividido em 1 ou 2 pagamentos)
+    valor_pedido = np.bincount(pedido_do_item, weights=preco + itens['freight_value'].to_numpy(), minlength=n)
+    n_pag = np.where(rng.random(n) < 0.03, 2, 1)
+    pedido_do_pag = np.repeat(np.arange(n), n_pag)
+    sequencial = np.arange(len(pedido_do_pag)) - np.repeat(np.cumsum(n_pag) - n_pag, n_pag) + 1
+    tipo = _escolha(rng, TIPOS_PAGAMENTO, len(pedido_do_pag))
+    pagamentos = pd.DataFrame({
+        'order_id': np.asarray(order_id, dtype=object)[pedido_do_pag],
+        'payment_sequential': sequencial,
+        'payment_type': tipo,
+        'payment_installments': np.where(tipo == 'credit_card', rng.integers(1, 11, len(tipo)), 1),
+        'payment_value': (valor_pedido[pedido_do_pag] / n_pag[pedido_do_pag]).round(2),
+    })
+
+    # Avaliações (quase todos os pedidos; nota pior quando há atraso)
+    nota = _escolha(rng, NOTAS_AVALIACAO, n).astype('int64')
+    atrasado = entregue & (entrega > estimada + pd.Timedelta(days=1))
+    nota[atrasado] = np.maximum(nota[atrasado] - rng.integers(1, 4, int(atrasado.sum())), 1)
+    criacao = (pd.Series(entrega).where(entregue, estimada) + pd.Timedelta(days=1)).dt.normalize()
+    avaliacoes = pd.DataFrame({
+        'review_id': _ids(rng, n),
+        'order_id': order_id,
+        'review_score': nota,
+        'review_comment_title': '',
+        'review_comment_message': np.where(rng.random(n) < 0.4, 'produto chegou', ''),
+        'review_creation_date': _datas(criacao),
+        'review_answer_timestamp': _datas(criacao + pd.to_timedelta(rng.exponential(48, n), unit='h')),
+    }).iloc[np.flatnonzero(rng.random(n) < 0.998)]
+
+    return {
+        'olist_customers_dataset.csv': clientes,
+        'olist_orders_dataset.csv': pedidos,
+        'olist_order_items_dataset.csv': itens,
+        'olist_order_payments_dataset.csv': pagamentos,
+        'olist_order_reviews_dataset.csv': avaliacoes,
+    }
+
+
+def gerar_dataset(saida, escala=1.0, semente=42):
+    """
+    Gera os nove CSVs do Olist em saida, com escala relativa ao dataset público
+    Retorna: saida
+    """
+    os.makedirs(saida, exist_ok=True)
+    rng = np.random.default_rng(semente)
+
+    prefixos = gerar_prefixos(rng, escala)
+    gerar_geolocalizacao(rng, prefixos, escala, os.path.join(saida, 'olist_geolocation_dataset.csv'))
+
+    vendedores = gerar_vendedores(rng, prefixos, escala)
+    vendedores.to_csv(os.path.join(saida, 'olist_sellers_dataset.csv'), index=False)
+
+    produtos = gerar_produtos(rng, escala)
+    produtos.to_csv(os.path.join(saida, 'olist_products_dataset.csv'), index=False)
+
+    pd.DataFrame({
+        'product_category_name': list(CATEGORIAS),
+        'product_category_name_english': list(CATEGORIAS.values()),
+    }).to_csv(os.path.join(saida, 'product_category_name_translation.csv'), index=False)
+
+    n_pedidos = max(int(LINHAS_BASE['pedidos'] * escala), 1)
+    for inicio in range(0, n_pedidos, TAMANHO_BLOCO):
+        n = min(TAMANHO_BLOCO, n_pedidos - inicio)
+        bloco = gerar_bloco_pedidos(rng, n, prefixos, produtos, vendedores)
+        for file_name, df in bloco.items():
+            _gravar(df, os.path.join(saida, file_name), inicio == 0)
+
+    return saida
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um dataset Olist sintético")
+    parser.add_argument('--saida', required=True, help="diretório de saída dos CSVs")
+    parser.add_argument('--escala', type=float, default=1.0,
+                        help="tamanho relativo ao dataset público (padrão: 1)")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    gerar_dataset(args.saida, args.escala, args.semente)
+    print(f"Dataset sintético (escala {args.escala:g}) gerado em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
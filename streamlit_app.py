@@ -1,13 +1,26 @@
 import streamlit as st
-import folium
 import pandas as pd
+import numpy as np
 import os
-from folium.plugins import FastMarkerCluster
-import plotly.express as px
-import plotly.graph_objects as go
-from streamlit_folium import st_folium
-from folium import FeatureGroup, LayerControl
-import kagglehub
+import threading
+
+# folium, streamlit_folium e plotly são importados dentro das seções que
+# os usam: o cabeçalho e os KPIs não esperam por eles
+from olist.aquecimento import ARQUIVOS_FLUXOS, Aquecimento, carga_em_fundo_ativa, etapas_dashboard
+from olist.armazem import TabelasSobDemanda
+from olist.atualizacao import atualizar_dataset
+from olist.cache_mapas import criar_cache_mapas
+from olist.chaves import dicionarios_compartilhados, memoria_dicionarios, memoria_tabela
+from olist.cubo import contagem_status_cubo, cubo_atende, metricas_cubo, receita_cubo
+from olist.entregas import calcular_metricas_entrega
+from olist.fatos import avaliacao_por_atraso, impressao_fatos, pagamentos_por_tipo, receita_por_categoria
+from olist.filtros import SEM_FILTRO, Filtro, filtro_ativo, filtro_de_itens, localizar_chaves
+from olist.fluxos import agregar_fluxos, filtrar_envios
+from olist.geo import ARQUIVO_GEO
+from olist.instrumentacao import (
+    anotar, contar_cache, estatisticas_caches, historico, instrumentar, medir_secao, resumo_latencias,
+)
+from olist.piramide import PiramideFiltrada, celulas_visiveis, faixa_visivel
 
 
 # ======== COLE SEU TOKEN AQUI ========
@@ -24,521 +37,1055 @@ os.environ['KAGGLE_KEY'] = KAGGLE_KEY
 st.set_page_config(layout="wide")
 st.title('📊 Análise Geral - Olist E-commerce')
 
-# ========== FUNÇÃO PARA CARREGAR DADOS ==========
-@st.cache_data
-def load_olist_data():
+# ========== CARGA EM SEGUNDO PLANO ==========
+@contar_cache(st.cache_resource)
+def load_aquecimento(data_dir=None):
     """
-    Carrega todos os datasets do Olist do Kaggle
-    Retorna: (dataset_path, dataframes_dict)
+    Inicia, uma vez por processo, a carga dos datasets do Olist do Kaggle
+    (ou de data_dir / OLIST_DATA_DIR) e dos caches derivados numa thread
+    de fundo. As tabelas ficam em arquivos Arrow mapeados em memória e são
+    compartilhadas, sem cópia, por todas as sessões do processo.
+    Retorna: dict {'atual': Aquecimento, 'lock': threading.Lock}; 'atual'
+    é trocado por renovar_aquecimento sob o lock
     """
-    dataset_path = "olistbr/brazilian-ecommerce"
-    
+    return {'atual': Aquecimento(etapas_dashboard(data_dir)).iniciar(), 'lock': threading.Lock()}
+
+def renovar_aquecimento():
+    """
+    Após uma atualização: refaz só as etapas cujas tabelas de origem mudaram.
+    Se a carga atual ainda não começou a ler o dataset, ela já verá a
+    atualização e é reaproveitada (recargas simultâneas não disparam outra).
+    """
+    carga = load_aquecimento()
+    with carga['lock']:
+        if not carga['atual'].iniciada('dados'):
+            return
+        carga['atual'] = carga['atual'].renovar()
+
+aquecimento = load_aquecimento()['atual']
+
+def aguardar_etapa(nome, descricao):
+    """Resultado de uma etapa da carga em fundo (spinner enquanto não fica pronta)"""
+    if not aquecimento.pronta(nome):
+        with st.spinner(f"⏳ Preparando {descricao}..."):
+            aquecimento.aguardar(nome)
+    return aquecimento.resultado(nome)
+
+# Sem carga em fundo (OLIST_CARGA_EM_FUNDO=0): espera todas as etapas
+if not carga_em_fundo_ativa() and not aquecimento.concluida():
+    with st.spinner("Preparando dados e análises (pode levar alguns minutos)..."):
+        aquecimento.aguardar()
+
+# ========== BACKEND DAS TABELAS ==========
+# Com o backend DuckDB (padrão) as tabelas ficam só mapeadas, sem DataFrame:
+# status, entregas e localizações saem em SQL dos Parquet. Filtros, tabela
+# fato, cubo e fluxos são montados em pandas e pedem OLIST_BACKEND=pandas.
+AVISO_SO_PANDAS = (
+    "Disponível com OLIST_BACKEND=pandas: o backend DuckDB não carrega as tabelas no pandas."
+)
+
+def linhas_tabela(dfs, file_name):
+    """Linhas de uma tabela (sem montar o DataFrame sob o DuckDB); None se ausente"""
+    if file_name not in dfs:
+        return None
+    if isinstance(dfs, TabelasSobDemanda):
+        return dfs.forma(file_name)[0]
+    return len(dfs[file_name])
+
+# ========== CARREGAR DADOS ==========
+# Só as tabelas: cada seção espera apenas a etapa de que depende
+with medir_secao('carga_dados'):
     try:
-        # Baixar dataset do Kaggle
-        st.info("📥 Baixando dataset do Kaggle...")
-        path = kagglehub.dataset_download(dataset_path)
-        
-        # Dicionário para armazenar DataFrames
-        dataframes = {}
-        
-        # Lista todos os arquivos no diretório
-        for file_name in os.listdir(path):
-            if file_name.endswith('.csv'):
-                file_path = os.path.join(path, file_name)
-                
-                # Carrega o CSV
-                df = pd.read_csv(file_path, encoding='utf-8')
-                
-                # Armazena no dicionário
-                dataframes[file_name] = df
-        
-        st.success(f"✅ {len(dataframes)} arquivos carregados com sucesso!")
-        return path, dataframes
-        
+        dataset_path, dfs, impressoes = aguardar_etapa(
+            'dados', "dados do Kaggle (pode levar alguns minutos)"
+        )
     except Exception as e:
         st.error(f"❌ Erro ao carregar dados: {e}")
-        return None, {}
+        dataset_path, dfs, impressoes = None, {}, {}
+    anotar(linhas=sum(linhas_tabela(dfs, f) for f in dfs))
+
+if not dfs:
+    st.error("Não foi possível carregar os dados")
+    st.stop()
+
+tabelas_sob_demanda = isinstance(dfs, TabelasSobDemanda)
 
-# ========== CARREGAR DADOS ==========
 if 'data_loaded' not in st.session_state:
-    with st.spinner("Carregando dados do Kaggle (pode levar alguns minutos)..."):
-        dataset_path, dfs = load_olist_data()
-        
-        if dfs:
-            st.session_state.data_loaded = True
-            st.session_state.dataset_path = dataset_path
-            st.session_state.dfs = dfs
-            st.success("🎉 Dados carregados com sucesso!")
-        else:
-            st.error("Não foi possível carregar os dados")
-            st.stop()
-else:
-    dataset_path = st.session_state.dataset_path
-    dfs = st.session_state.dfs
-
-# ========== ACESSAR OS DATAFRAMES ==========
-customers_df = dfs.get('olist_customers_dataset.csv')
-geolocation_df = dfs.get('olist_geolocation_dataset.csv')
-orders_df = dfs.get('olist_orders_dataset.csv')
-order_items_df = dfs.get('olist_order_items_dataset.csv')
-payments_df = dfs.get('olist_order_payments_dataset.csv')
-reviews_df = dfs.get('olist_order_reviews_dataset.csv')
-products_df = dfs.get('olist_products_dataset.csv')
-sellers_df = dfs.get('olist_sellers_dataset.csv')
+    st.session_state.data_loaded = True
+    st.success(f"🎉 {len(dfs)} arquivos carregados com sucesso!")
 
-# ========== MOSTRAR RESUMO ==========
-st.subheader("📋 Resumo do Dataset")
+# ========== FILTROS GLOBAIS ==========
+# Período, estados, status e categoria valem para todas as seções. São
+# respondidos por índices montados uma vez por versão do dataset (datas
+# ordenadas e bitmaps por status/estado/categoria), sem varrer as tabelas
+# a cada seção.
+ARQUIVOS_FILTROS = [
+    'olist_orders_dataset.csv',
+    'olist_customers_dataset.csv',
+    'olist_order_items_dataset.csv',
+    'olist_sellers_dataset.csv',
+    'olist_products_dataset.csv',
+]
+
+def ler_filtros(indice):
+    """Filtros da barra lateral (SEM_FILTRO = dataset inteiro)"""
+    if indice is None:
+        return SEM_FILTRO
+    st.sidebar.header("🔎 Filtros")
+    
+    inicio = fim = None
+    if indice.data_minima is not None:
+        periodo = st.sidebar.date_input(
+            "Período da compra:",
+            value=(indice.data_minima, indice.data_maxima),
+            min_value=indice.data_minima,
+            max_value=indice.data_maxima,
+            key='filtro_periodo'
+        )
+        # Durante a seleção do intervalo o widget devolve só o início
+        if isinstance(periodo, (tuple, list)) and len(periodo) > 0:
+            if periodo[0] > indice.data_minima:
+                inicio = periodo[0]
+            if len(periodo) > 1 and periodo[1] < indice.data_maxima:
+                fim = periodo[1]
+    
+    estados_cliente = st.sidebar.multiselect(
+        "Estado do cliente:", sorted(indice.estados_cliente), key='filtro_estados_cliente'
+    )
+    estados_vendedor = st.sidebar.multiselect(
+        "Estado do vendedor:", sorted(indice.estados_vendedor), key='filtro_estados_vendedor'
+    )
+    status = st.sidebar.multiselect(
+        "Status do pedido:", sorted(indice.status), key='filtro_status'
+    )
+    categorias = st.sidebar.multiselect(
+        "Categoria do produto:", sorted(indice.categorias), key='filtro_categorias'
+    )
+    return Filtro(
+        inicio, fim, tuple(sorted(estados_cliente)), tuple(sorted(estados_vendedor)),
+        tuple(sorted(status)), tuple(sorted(categorias))
+    )
 
-# KPIs
-col1, col2, col3, col4 = st.columns(4)
+@contar_cache(st.cache_resource(max_entries=16))
+def load_selecao(impressoes_filtros, filtro, _indice):
+    """Pedidos do filtro e as máscaras derivadas (uma vez por filtro e versão do dataset)"""
+    selecao = _indice.selecionar(filtro)
+    return {
+        'pedidos': _indice.mascara_pedidos(selecao),
+        'itens': _indice.mascara_itens(selecao, filtro.estados_vendedor, filtro.categorias),
+        'clientes': _indice.mascara_clientes(selecao),
+        'vendedores': _indice.mascara_vendedores(selecao, filtro.estados_vendedor, filtro.categorias),
+        'resumo': _indice.resumo(selecao, filtro.estados_vendedor, filtro.categorias),
+    }
 
-with col1:
-    if customers_df is not None:
-        st.metric("Clientes", f"{len(customers_df):,}")
-    else:
-        st.metric("Clientes", "N/A")
+with medir_secao('filtros'):
+    indice_filtros = aguardar_etapa('filtros', "os índices de filtro")
+    filtro = ler_filtros(indice_filtros)
+    if tabelas_sob_demanda:
+        st.sidebar.info("🔎 Filtros globais disponíveis com OLIST_BACKEND=pandas.")
+    selecao = None
+    if filtro_ativo(filtro):
+        selecao = load_selecao(
+            tuple(impressoes.get(f) for f in ARQUIVOS_FILTROS), filtro, indice_filtros
+        )
+        anotar(linhas=selecao['resumo']['pedidos'])
+        st.info(
+            f"🔎 Filtros ativos: {selecao['resumo']['pedidos']:,} de "
+            f"{indice_filtros.n_pedidos:,} pedidos"
+        )
 
-with col2:
-    if orders_df is not None:
-        st.metric("Pedidos", f"{len(orders_df):,}")
-    else:
-        st.metric("Pedidos", "N/A")
+# ========== MOSTRAR RESUMO ==========
+# Cada seção é um st.fragment: interagir com um widget reexecuta apenas
+# a seção dona dele. As entradas de cada seção são os seus argumentos.
+# Cada execução de seção é medida (tempo, CPU, memória, linhas, bytes).
+@st.fragment
+@instrumentar('kpis')
+def secao_resumo(contagens, resumo_filtrado=None):
+    """
+    KPIs gerais do dataset (ou dos pedidos filtrados, com resumo_filtrado)
+    contagens: linhas de clientes, pedidos, produtos e vendedores (None se ausente)
+    """
+    st.subheader("📋 Resumo do Dataset")
+    anotar(linhas=sum(n for n in contagens.values() if n is not None))
 
-with col3:
-    if products_df is not None:
-        st.metric("Produtos", f"{len(products_df):,}")
-    else:
-        st.metric("Produtos", "N/A")
+    # KPIs
+    valores = resumo_filtrado if resumo_filtrado is not None else contagens
+    rotulos = {
+        'clientes': "Clientes", 'pedidos': "Pedidos", 'produtos': "Produtos", 'vendedores': "Vendedores",
+    }
+    for coluna, (chave, rotulo) in zip(st.columns(4), rotulos.items()):
+        valor = valores.get(chave)
+        coluna.metric(rotulo, f"{valor:,}" if valor is not None else "N/A")
 
-with col4:
-    if sellers_df is not None:
-        st.metric("Vendedores", f"{len(sellers_df):,}")
-    else:
-        st.metric("Vendedores", "N/A")
+secao_resumo(
+    {
+        'clientes': linhas_tabela(dfs, 'olist_customers_dataset.csv'),
+        'pedidos': linhas_tabela(dfs, 'olist_orders_dataset.csv'),
+        'produtos': linhas_tabela(dfs, 'olist_products_dataset.csv'),
+        'vendedores': linhas_tabela(dfs, 'olist_sellers_dataset.csv'),
+    },
+    selecao['resumo'] if selecao is not None else None
+)
 
 # ========== TABELA DE ARQUIVOS ==========
-st.subheader("📁 Arquivos Carregados")
+@contar_cache(st.cache_data(max_entries=1))
+def load_info_arquivos(impressoes, _dfs):
+    """Linhas, colunas e memória de cada tabela (uma vez por versão do dataset)"""
+    if isinstance(_dfs, TabelasSobDemanda):
+        # Sem montar os DataFrames: linhas, colunas e bytes do Arrow mapeado
+        formas = {file_name: _dfs.forma(file_name) for file_name in _dfs}
+    else:
+        formas = {
+            file_name: (df.shape[0], df.shape[1], memoria_tabela(df))
+            for file_name, df in _dfs.items()
+        }
+    files_info = []
+    for file_name, (linhas, colunas, tamanho) in formas.items():
+        files_info.append({
+            'Arquivo': file_name,
+            'Linhas': f"{linhas:,}",
+            'Colunas': colunas,
+            'Tamanho': f"{(tamanho / (1024*1024)):.2f} MB"
+        })
+    # Chaves compactas: os dicionários são compartilhados entre as tabelas
+    dicionarios = {} if isinstance(_dfs, TabelasSobDemanda) else dicionarios_compartilhados(_dfs)
+    if dicionarios:
+        files_info.append({
+            'Arquivo': '🔑 Dicionários de chaves (compartilhados)',
+            'Linhas': f"{sum(len(d) for d in dicionarios.values()):,}",
+            'Colunas': len(dicionarios),
+            'Tamanho': f"{(memoria_dicionarios(_dfs) / (1024*1024)):.2f} MB"
+        })
+    return pd.DataFrame(files_info)
+
+@st.fragment
+@instrumentar('arquivos')
+def secao_arquivos(dfs, impressoes):
+    """Tabela com os arquivos carregados"""
+    st.subheader("📁 Arquivos Carregados")
+    
+    files_df = load_info_arquivos(impressoes, dfs)
+    anotar(linhas=len(files_df))
+    st.dataframe(files_df, width='stretch', hide_index=True)
+
+secao_arquivos(dfs, impressoes)
 
-files_info = []
-for file_name, df in dfs.items():
-    files_info.append({
-        'Arquivo': file_name,
-        'Linhas': f"{df.shape[0]:,}",
-        'Colunas': df.shape[1],
-        'Tamanho': f"{(df.memory_usage(deep=True).sum() / (1024*1024)):.2f} MB"
-    })
+# ========== CACHE DE MAPAS ==========
+TILES_COMUNIDADE = 'CartoDB dark_matter'
+TILES_COMPARATIVO = 'CartoDB positron'
 
-files_df = pd.DataFrame(files_info)
-st.dataframe(files_df, width='stretch', hide_index=True)
+@contar_cache(st.cache_resource)
+def load_cache_mapas(dataset_path):
+    """HTML renderizado dos mapas, compartilhado por todas as sessões (LRU + disco)"""
+    return criar_cache_mapas(dataset_path)
 
 # ========== MAPA DE GEOLOCALIZAÇÃO ==========
-st.markdown("---")
-st.subheader("🗺️ Comunidade Olist")
+@contar_cache(st.cache_resource(max_entries=16))
+def load_piramide_filtrada(impressao, estados, _piramide_estados):
+    """Pirâmide só com as localizações dos estados (níveis montados sob demanda)"""
+    return PiramideFiltrada(_piramide_estados, estados)
 
-if geolocation_df is not None:
-    # Limpar dados
-    geolocation_clean = geolocation_df.dropna(subset=['geolocation_lat', 'geolocation_lng'])
+@contar_cache(st.cache_resource(max_entries=32))
+def load_dados_comunidade(chave, _celulas, nivel, modo):
+    """Dados da camada do mapa da Comunidade por vista (o Map em si é montado a cada rerun)"""
+    from olist.mapas import dados_comunidade
+    return dados_comunidade(_celulas, nivel, modo)
+
+@st.fragment
+@instrumentar('comunidade')
+def secao_comunidade(dfs, impressao_geo, dataset_path, estados=()):
+    """
+    Mapa agregado de todas as localizações (zoom e modo reexecutam só esta seção).
+    estados: filtro de estado (as localizações não têm data nem status)
+    """
+    st.markdown("---")
+    st.subheader("🗺️ Comunidade Olist")
     
-    if len(geolocation_clean) > 0:
-        # Criar mapa
-        mapa = folium.Map(
-            location=[geolocation_clean['geolocation_lat'].mean(), 
-                     geolocation_clean['geolocation_lng'].mean()],
-            zoom_start=5,
-            tiles='CartoDB dark_matter',
-            width='100%'
-        )
+    if ARQUIVO_GEO in dfs:
+        from streamlit_folium import st_folium
+        from olist.mapas import bytes_renderizados, construir_mapa_comunidade
+
+        # Pirâmide de agregação espacial (células por nível de zoom)
+        if estados:
+            piramide = load_piramide_filtrada(
+                impressao_geo, estados,
+                aguardar_etapa('piramide_estados', "o mapa da comunidade por estado")
+            )
+        else:
+            piramide = aguardar_etapa('piramide', "o mapa da comunidade")
+    
+        if piramide and len(piramide[0]) > 0:
+            modo_comunidade = st.radio(
+                "Visualização:",
+                ['Mapa de calor', 'Grade de contagens'],
+                horizontal=True,
+                key='modo_comunidade'
+            )
         
-        # Adicionar clusters
-        data = list(zip(
-            geolocation_clean['geolocation_lat'].astype(float),
-            geolocation_clean['geolocation_lng'].astype(float)
-        ))
+            # Centro e zoom iniciais (centroide de todos os pontos)
+            centro_inicial = [float(piramide[0]['lat'].iloc[0]), float(piramide[0]['lng'].iloc[0])]
+            zoom_inicial = 5
         
-        FastMarkerCluster(data).add_to(mapa)
+            # Última vista informada pelo mapa (zoom e limites)
+            vista = st.session_state.get('mapa_comunidade') or {}
+            zoom = vista.get('zoom') or zoom_inicial
+            limites = vista.get('bounds')
+            faixa = None
+            centro = None
+            if limites and limites.get('_southWest', {}).get('lat') is not None:
+                faixa = faixa_visivel(limites, zoom)
+                centro = (
+                    (limites['_southWest']['lat'] + limites['_northEast']['lat']) / 2,
+                    (limites['_southWest']['lng'] + limites['_northEast']['lng']) / 2,
+                )
         
-        # Exibir mapa
-        try:
-            st_folium(mapa, width=1200, height=600)
-        except:
-            # Método alternativo se st_folium falhar
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as f:
-                mapa.save(f.name)
-                with open(f.name, 'r', encoding='utf-8') as html_file:
-                    html_content = html_file.read()
-                os.unlink(f.name)
-            
-            st.components.v1.html(html_content, width=1200, height=600)
+            # Apenas as células do nível do zoom dentro da área visível
+            nivel, celulas = celulas_visiveis(piramide, zoom, faixa)
         
-        st.info(f"📍 {len(data):,} localizações no mapa")
+            modo = 'calor' if modo_comunidade == 'Mapa de calor' else 'grade'
+            chave = ('comunidade', impressao_geo, estados, modo, nivel, faixa, TILES_COMUNIDADE)
+            mapa = construir_mapa_comunidade(
+                load_dados_comunidade(chave, celulas, nivel, modo),
+                centro_inicial,
+                zoom_inicial,
+                modo=modo,
+                tiles=TILES_COMUNIDADE
+            )
+        
+            # Exibir mapa
+            try:
+                st_folium(
+                    mapa,
+                    width=1200,
+                    height=600,
+                    key='mapa_comunidade',
+                    returned_objects=['zoom', 'bounds'],
+                    zoom=zoom,
+                    center=centro
+                )
+                anotar(linhas=len(celulas), bytes=bytes_renderizados(mapa))
+            except Exception:
+                # Método alternativo se st_folium falhar: HTML do cache de mapas
+                html_content = load_cache_mapas(dataset_path).obter_ou_renderizar(
+                    chave, lambda: mapa.get_root().render()
+                )
+                st.iframe(html_content, width=1200, height=600)
+                anotar(linhas=len(celulas), bytes=len(html_content))
+        
+            st.info(
+                f"📍 {int(piramide[0]['pontos'].sum()):,} localizações agregadas em "
+                f"{len(celulas):,} células (nível {nivel} da grade)"
+            )
+        else:
+            st.warning("Nenhum dado de geolocalização válido encontrado")
     else:
-        st.warning("Nenhum dado de geolocalização válido encontrado")
-else:
-    st.warning("Arquivo de geolocalização não encontrado")
+        st.warning("Arquivo de geolocalização não encontrado")
+
+secao_comunidade(
+    dfs, impressoes.get(ARQUIVO_GEO), dataset_path,
+    tuple(sorted(set(filtro.estados_cliente) | set(filtro.estados_vendedor)))
+)
+
+# ========== CUBO DE PEDIDOS ==========
+def cubo_pedidos(filtro, por_item=False):
+    """
+    Cubo da carga em fundo, se ele responde ao filtro
+    (None sem as tabelas de origem, se a construção falhou ou se o filtro
+    não cabe nas dimensões do cubo; ver cubo_atende)
+    """
+    if not cubo_atende(filtro, por_item):
+        return None
+    try:
+        return aguardar_etapa('cubo', "o cubo de pedidos")
+    except Exception:
+        return None
 
 # ========== ANÁLISE DE PEDIDOS ==========
-st.markdown("---")
-st.subheader("📦 Análise de Pedidos")
+@st.fragment
+@instrumentar('status_pedidos')
+def secao_pedidos(dfs, indice_filtros, filtro):
+    """Distribuição dos pedidos por status"""
+    st.markdown("---")
+    st.subheader("📦 Análise de Pedidos")
 
-if orders_df is not None:
-    # Status dos pedidos
-    st.write("**Status dos Pedidos:**")
+    if 'olist_orders_dataset.csv' in dfs:
+        # Status dos pedidos
+        st.write("**Status dos Pedidos:**")
     
-    if 'order_status' in orders_df.columns:
-        status_counts = orders_df['order_status'].value_counts().reset_index()
-        status_counts.columns = ['Status', 'Quantidade']
-        
-        col1, col2 = st.columns([2, 1])
+        cubo = cubo_pedidos(filtro)
+        if cubo is not None:
+            # Rollup do cubo por status
+            status_counts = contagem_status_cubo(cubo, filtro if filtro_ativo(filtro) else None)
+        elif filtro_ativo(filtro):
+            # Contagem por status = interseção dos bitmaps com a seleção
+            status_counts = indice_filtros.contagem_status(indice_filtros.selecionar(filtro))
+        else:
+            status_counts = aguardar_etapa('status_pedidos', "o status dos pedidos")
+        anotar(linhas=linhas_tabela(dfs, 'olist_orders_dataset.csv'))
+        if status_counts is not None:
+            col1, col2 = st.columns([2, 1])
         
-        with col1:
-            # Gráfico de barras simples
-            st.bar_chart(status_counts.set_index('Status'))
+            with col1:
+                # Gráfico de barras simples
+                st.bar_chart(status_counts.set_index('Status'))
         
-        with col2:
-            st.dataframe(status_counts, width='stretch')
+            with col2:
+                st.dataframe(status_counts, width='stretch')
 
+secao_pedidos(dfs, indice_filtros, filtro)
 
 # ========== ANÁLISE DE TEMPO DE ENTREGA ==========
-st.markdown("---")
-st.subheader("⏱️ Análise de Tempo de Entrega")
+@contar_cache(st.cache_resource(max_entries=16))
+def load_metricas_filtradas(impressao, filtro, _orders_df, _mascara_pedidos):
+    """Métricas de entrega dos pedidos do filtro (uma vez por filtro e versão do dataset)"""
+    return calcular_metricas_entrega(_orders_df[_mascara_pedidos])
+
+@contar_cache(st.cache_resource(max_entries=1))
+def load_posicoes_entregues(impressao, _orders_df, _pedidos):
+    """Linha em orders_df de cada pedido entregue das métricas (uma vez por versão)"""
+    return localizar_chaves(_orders_df['order_id'], _pedidos['order_id'])
+
+@contar_cache(st.cache_resource(max_entries=16))
+def load_metricas_cubo(impressao, filtro, _cubo, _pedidos):
+    """Métricas de entrega pelo cubo (uma vez por filtro e versão do dataset)"""
+    return metricas_cubo(_cubo, filtro if filtro_ativo(filtro) else None, _pedidos)
 
-if orders_df is not None:
-    # Verificar se as colunas de data existem
-    colunas_data = ['order_purchase_timestamp', 'order_delivered_customer_date', 
-                    'order_estimated_delivery_date']
+def metricas_entrega_cubo(cubo, dfs, impressoes, filtro, selecao):
+    """
+    Métricas de entrega do filtro a partir do cubo; as linhas dos pedidos
+    entregues (mediana e boxplots) vêm da etapa de métricas, recortadas
+    pela seleção
+    """
+    base = aguardar_etapa('metricas_entrega', "as métricas de entrega")
+    if 'faltando' in base:
+        return base
+    pedidos = base['pedidos']
+    if selecao is not None:
+        impressao = impressoes.get('olist_orders_dataset.csv')
+        posicoes = load_posicoes_entregues(impressao, dfs['olist_orders_dataset.csv'], pedidos)
+        mascara = selecao['pedidos']
+        pedidos = pedidos[(posicoes >= 0) & mascara[np.where(posicoes >= 0, posicoes, 0)]]
+    return load_metricas_cubo(impressao_fatos(impressoes), filtro, cubo, pedidos)
+
+@st.fragment
+@instrumentar('entregas')
+def secao_entregas(dfs, impressoes, filtro, selecao):
+    """KPIs, estatísticas e tendência dos tempos de entrega"""
+    st.markdown("---")
+    st.subheader("⏱️ Análise de Tempo de Entrega")
     
-    colunas_existentes = [col for col in colunas_data if col in orders_df.columns]
+    if 'olist_orders_dataset.csv' in dfs:
+        import plotly.express as px
+        import plotly.graph_objects as go
+
+        cubo = cubo_pedidos(filtro)
+        if cubo is not None:
+            # KPIs, faixas e tendência por rollup do cubo
+            metricas = metricas_entrega_cubo(cubo, dfs, impressoes, filtro, selecao)
+        elif selecao is not None:
+            metricas = load_metricas_filtradas(
+                impressoes.get('olist_orders_dataset.csv'), filtro,
+                dfs['olist_orders_dataset.csv'], selecao['pedidos']
+            )
+        else:
+            metricas = aguardar_etapa('metricas_entrega', "as métricas de entrega")
     
-    if len(colunas_existentes) >= 3:
-        # Converter colunas para datetime
-        orders_clean = orders_df.copy()
-        for col in colunas_existentes:
-            orders_clean[col] = pd.to_datetime(orders_clean[col], errors='coerce')
+        if 'faltando' not in metricas:
+            # Com o DuckDB, 'pedidos' é só uma amostra dos entregues
+            pedidos_entregues = metricas['pedidos']
+            anotar(linhas=metricas['total'])
         
-        # Filtrar apenas pedidos entregues
-        pedidos_entregues = orders_clean[
-            (orders_clean['order_status'] == 'delivered') & 
-            (orders_clean['order_delivered_customer_date'].notna())
-        ].copy()
-        
-        if len(pedidos_entregues) > 0:
-            # Calcular tempo real de entrega (dias)
-            pedidos_entregues['tempo_real_dias'] = (
-                pedidos_entregues['order_delivered_customer_date'] - 
-                pedidos_entregues['order_purchase_timestamp']
-            ).dt.total_seconds() / (24 * 3600)
+            if metricas['total'] > 0:
+                kpis = metricas['kpis']
             
-            # Calcular tempo estimado (dias)
-            pedidos_entregues['tempo_estimado_dias'] = (
-                pedidos_entregues['order_estimated_delivery_date'] - 
-                pedidos_entregues['order_purchase_timestamp']
-            ).dt.total_seconds() / (24 * 3600)
+                # KPIs principais
+                col1, col2, col3, col4 = st.columns(4)
             
-            # Calcular diferença (positiva = atraso, negativa = adiantado)
-            pedidos_entregues['diferenca_dias'] = (
-                pedidos_entregues['tempo_real_dias'] - 
-                pedidos_entregues['tempo_estimado_dias']
-            )
+                with col1:
+                    st.metric("⏳ Tempo Médio Real", f"{kpis['tempo_medio_real']:.1f} dias")
             
-            # KPIs principais
-            col1, col2, col3, col4 = st.columns(4)
+                with col2:
+                    st.metric("📅 Tempo Médio Estimado", f"{kpis['tempo_medio_estimado']:.1f} dias")
             
-            with col1:
-                tempo_medio_real = pedidos_entregues['tempo_real_dias'].mean()
-                st.metric("⏳ Tempo Médio Real", f"{tempo_medio_real:.1f} dias")
+                with col3:
+                    diferenca_media = kpis['diferenca_media']
+                    st.metric("📊 Diferença Média", 
+                             f"{diferenca_media:+.1f} dias",
+                             delta=f"{diferenca_media:+.1f} dias")
             
-            with col2:
-                tempo_medio_estimado = pedidos_entregues['tempo_estimado_dias'].mean()
-                st.metric("📅 Tempo Médio Estimado", f"{tempo_medio_estimado:.1f} dias")
+                with col4:
+                    st.metric("✅ Entregas no Prazo", f"{kpis['percentual_no_prazo']:.1f}%")
             
-            with col3:
-                diferenca_media = pedidos_entregues['diferenca_dias'].mean()
-                st.metric("📊 Diferença Média", 
-                         f"{diferenca_media:+.1f} dias",
-                         delta=f"{diferenca_media:+.1f} dias")
-            
-            with col4:
-                percentual_no_prazo = (pedidos_entregues['diferenca_dias'] <= 0).mean() * 100
-                st.metric("✅ Entregas no Prazo", f"{percentual_no_prazo:.1f}%")
-            
-            # Tabela detalhada
-            st.write("**📋 Estatísticas Detalhadas de Entrega:**")
+                # Tabela detalhada
+                st.write("**📋 Estatísticas Detalhadas de Entrega:**")
+                st.dataframe(metricas['estatisticas'], width='stretch', hide_index=True)
             
-            estatisticas = {
-                'Métrica': [
-                    'Tempo Mínimo de Entrega (dias)',
-                    'Tempo Máximo de Entrega (dias)',
-                    'Mediana de Entrega (dias)',
-                    'Desvio Padrão (dias)',
-                    'Entregas Antecipadas (< -1 dia)',
-                    'Entregas Atrasadas (> +1 dia)',
-                    'Entregas Pontuais (± 1 dia)'
-                ],
-                'Valor': [
-                    f"{pedidos_entregues['tempo_real_dias'].min():.1f}",
-                    f"{pedidos_entregues['tempo_real_dias'].max():.1f}",
-                    f"{pedidos_entregues['tempo_real_dias'].median():.1f}",
-                    f"{pedidos_entregues['tempo_real_dias'].std():.1f}",
-                    f"{(pedidos_entregues['diferenca_dias'] < -1).sum():,}",
-                    f"{(pedidos_entregues['diferenca_dias'] > 1).sum():,}",
-                    f"{(abs(pedidos_entregues['diferenca_dias']) <= 1).sum():,}"
-                ],
-                'Porcentagem': [
-                    "-",
-                    "-",
-                    "-",
-                    "-",
-                    f"{(pedidos_entregues['diferenca_dias'] < -1).mean() * 100:.1f}%",
-                    f"{(pedidos_entregues['diferenca_dias'] > 1).mean() * 100:.1f}%",
-                    f"{(abs(pedidos_entregues['diferenca_dias']) <= 1).mean() * 100:.1f}%"
-                ]
-            }
-            
-            estatisticas_df = pd.DataFrame(estatisticas)
-            st.dataframe(estatisticas_df, width='stretch', hide_index=True)
-            
-            col1, col2 = st.columns(2)
+                # Distribuição da diferença
+                st.write("**📈 Distribuição da Diferença entre Real e Estimado:**")
             
-                    # Distribuição da diferença
-            st.write("**📈 Distribuição da Diferença entre Real e Estimado:**")
+                col1, col2 = st.columns(2)
             
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Dois boxplots lado a lado
-                fig = go.Figure()
+                with col1:
+                    # Dois boxplots lado a lado
+                    fig = go.Figure()
                 
-                # Boxplot do tempo real
-                fig.add_trace(go.Box(
-                    y=pedidos_entregues['tempo_real_dias'],
-                    name='Tempo Real',
-                    marker_color='#2E86AB',
-                    boxmean=True  # Mostra a média
-                ))
+                    # Boxplot do tempo real
+                    fig.add_trace(go.Box(
+                        y=pedidos_entregues['tempo_real_dias'],
+                        name='Tempo Real',
+                        marker_color='#2E86AB',
+                        boxmean=True  # Mostra a média
+                    ))
                 
-                # Boxplot do tempo estimado
-                fig.add_trace(go.Box(
-                    y=pedidos_entregues['tempo_estimado_dias'],
-                    name='Tempo Estimado',
-                    marker_color='#A23B72',
-                    boxmean=True
-                ))
+                    # Boxplot do tempo estimado
+                    fig.add_trace(go.Box(
+                        y=pedidos_entregues['tempo_estimado_dias'],
+                        name='Tempo Estimado',
+                        marker_color='#A23B72',
+                        boxmean=True
+                    ))
                 
-                fig.update_layout(
-                    title='Comparação: Tempo Real vs Tempo Estimado',
-                    yaxis_title='Dias',
-                    height=500,
-                    boxmode='group'  # Coloca os boxplots lado a lado
-                )
+                    fig.update_layout(
+                        title='Comparação: Tempo Real vs Tempo Estimado',
+                        yaxis_title='Dias',
+                        height=500,
+                        boxmode='group'  # Coloca os boxplots lado a lado
+                    )
                 
-                st.plotly_chart(fig, width='stretch')
+                    st.plotly_chart(fig, width='stretch')
             
-            with col2:
-                # Categorização das entregas
-                categorias = pd.cut(
-                    pedidos_entregues['diferenca_dias'],
-                    bins=[-float('inf'), -3, -1, 1, 3, float('inf')],
-                    labels=['Muito Adiantada (-3+ dias)', 'Adiantada (1-3 dias)', 
-                           'Pontual (±1 dia)', 'Atrasada (1-3 dias)', 
-                           'Muito Atrasada (3+ dias)']
-                )
-                
-                categoria_counts = categorias.value_counts().reset_index()
-                categoria_counts.columns = ['Categoria', 'Quantidade']
-                categoria_counts['Porcentagem'] = (
-                    categoria_counts['Quantidade'] / len(pedidos_entregues) * 100
-                ).round(1)
-                
-                st.write("**Categorização das Entregas:**")
-                st.dataframe(categoria_counts, width='stretch', hide_index=True)
-            
-            # Análise mensal
-            st.subheader("**📅 Tendência Mensal de Tempos de Entrega:**")
+                with col2:
+                    # Categorização das entregas
+                    st.write("**Categorização das Entregas:**")
+                    st.dataframe(metricas['categorias'], width='stretch', hide_index=True)
             
-            pedidos_entregues['mes_ano'] = pedidos_entregues['order_purchase_timestamp'].dt.to_period('M')
-            tendencia_mensal = pedidos_entregues.groupby('mes_ano').agg({
-                'tempo_real_dias': 'mean',
-                'tempo_estimado_dias': 'mean',
-                'diferenca_dias': 'mean'
-            }).reset_index()
-            tendencia_mensal['mes_ano'] = tendencia_mensal['mes_ano'].astype(str)
+                # Análise mensal
+                st.subheader("**📅 Tendência Mensal de Tempos de Entrega:**")
             
-            # Gráfico de linha
-            fig_tendencia = px.line(
-                tendencia_mensal,
-                x='mes_ano',
-                y=['tempo_real_dias', 'tempo_estimado_dias'],
-                title='Evolução dos Tempos de Entrega',
-                labels={'value': 'Dias', 'variable': 'Tipo', 'mes_ano': 'Mês'},
-                markers=True
-            )
-            fig_tendencia.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig_tendencia, width='stretch')
+                # Gráfico de linha
+                fig_tendencia = px.line(
+                    metricas['tendencia_mensal'],
+                    x='mes_ano',
+                    y=['tempo_real_dias', 'tempo_estimado_dias'],
+                    title='Evolução dos Tempos de Entrega',
+                    labels={'value': 'Dias', 'variable': 'Tipo', 'mes_ano': 'Mês'},
+                    markers=True
+                )
+                fig_tendencia.update_layout(xaxis_tickangle=-45)
+                st.plotly_chart(fig_tendencia, width='stretch')
             
-            # Amostra de dados
-            with st.expander("🔍 Ver Amostra dos Dados Calculados"):
-                amostra = pedidos_entregues[[
-                    'order_id', 'order_purchase_timestamp', 
-                    'order_delivered_customer_date', 'order_estimated_delivery_date',
-                    'tempo_real_dias', 'tempo_estimado_dias', 'diferenca_dias'
-                ]].head(10)
-                st.dataframe(amostra, width='stretch')
+                # Amostra de dados
+                with st.expander("🔍 Ver Amostra dos Dados Calculados"):
+                    st.dataframe(pedidos_entregues.head(10), width='stretch')
             
+            else:
+                st.warning("Nenhum pedido entregue encontrado para análise de tempo.")
         else:
-            st.warning("Nenhum pedido entregue encontrado para análise de tempo.")
+            st.warning(f"Colunas necessárias não encontradas: {', '.join(metricas['faltando'])}")
     else:
-        colunas_faltando = [col for col in colunas_data if col not in orders_df.columns]
-        st.warning(f"Colunas necessárias não encontradas: {', '.join(colunas_faltando)}")
-else:
-    st.warning("Dataset de pedidos não disponível para análise de tempo de entrega.")
-
-# ========== PREPARAR DADOS DE LOCALIZAÇÃO ==========
-# Adicione APÓS a seção "ACESSAR OS DATAFRAMES"
-
-def preparar_localizacao_clientes():
-    """Junta dados de clientes com geolocalização"""
-    if customers_df is not None and geolocation_df is not None:
-        clientes_com_geo = pd.merge(
-            customers_df,
-            geolocation_df,
-            left_on='customer_zip_code_prefix',
-            right_on='geolocation_zip_code_prefix',
-            how='left'
+        st.warning("Dataset de pedidos não disponível para análise de tempo de entrega.")
+
+secao_entregas(dfs, impressoes, filtro, selecao)
+
+# ========== TABELA FATO: RECEITA, PAGAMENTOS E AVALIAÇÕES ==========
+# Top categorias no gráfico de receita
+TOP_CATEGORIAS = 15
+
+@contar_cache(st.cache_resource(max_entries=16))
+def load_receita_categoria(impressao, filtro, _fatos, _mascara_pedidos):
+    """Receita por categoria dos pedidos do filtro (uma vez por filtro e versão do dataset)"""
+    return receita_por_categoria(
+        _fatos, _mascara_pedidos, filtro.estados_vendedor, filtro.categorias
+    )
+
+@contar_cache(st.cache_resource(max_entries=16))
+def load_receita_cubo(impressao, filtro, _cubo, pedidos):
+    """Receita por categoria pelo cubo (uma vez por filtro e versão do dataset)"""
+    return receita_cubo(_cubo, filtro if filtro_ativo(filtro) else None, pedidos)
+
+@contar_cache(st.cache_resource(max_entries=16))
+def load_pagamentos(impressao, filtro, _fatos, _mascara_pedidos):
+    """Pagamentos por forma dos pedidos do filtro (uma vez por filtro e versão do dataset)"""
+    return pagamentos_por_tipo(_fatos, _mascara_pedidos)
+
+@contar_cache(st.cache_resource(max_entries=16))
+def load_avaliacao_atraso(impressao, filtro, _fatos, _mascara_pedidos):
+    """Nota × atraso dos pedidos do filtro (uma vez por filtro e versão do dataset)"""
+    return avaliacao_por_atraso(_fatos, _mascara_pedidos)
+
+@st.fragment
+@instrumentar('receita_categoria')
+def secao_receita(impressoes, filtro, selecao):
+    """Receita dos itens por categoria de produto"""
+    st.markdown("---")
+    st.subheader("💰 Receita por Categoria")
+
+    fatos = aguardar_etapa('fatos', "a tabela fato dos pedidos")
+    if tabelas_sob_demanda:
+        st.info(AVISO_SO_PANDAS)
+    elif fatos is not None:
+        import plotly.express as px
+
+        cubo = cubo_pedidos(filtro, por_item=True)
+        if cubo is not None:
+            # Rollup do cubo por categoria; com filtro de vendedor/categoria
+            # os pedidos distintos vêm da seleção
+            receita = load_receita_cubo(
+                impressao_fatos(impressoes), filtro, cubo,
+                selecao['resumo']['pedidos'] if filtro_de_itens(filtro) else None
+            )
+        else:
+            receita = load_receita_categoria(
+                impressao_fatos(impressoes), filtro, fatos,
+                selecao['pedidos'] if selecao is not None else None
+            )
+        anotar(linhas=receita['itens'])
+
+        if receita['itens'] > 0:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("💵 Receita dos Itens", f"R$ {receita['receita']:,.0f}")
+            with col2:
+                st.metric("🚛 Frete", f"R$ {receita['frete']:,.0f}")
+            with col3:
+                st.metric("🛒 Itens Vendidos", f"{receita['itens']:,}")
+            with col4:
+                ticket = (receita['receita'] + receita['frete']) / receita['pedidos']
+                st.metric("🧾 Valor Médio por Pedido", f"R$ {ticket:,.2f}")
+
+            categorias = receita['categorias']
+            fig_receita = px.bar(
+                categorias.head(TOP_CATEGORIAS).iloc[::-1],
+                x='receita',
+                y='categoria',
+                orientation='h',
+                title=f'Receita por Categoria (top {TOP_CATEGORIAS})',
+                labels={'receita': 'Receita (R$)', 'categoria': 'Categoria'}
+            )
+            fig_receita.update_layout(height=500)
+            st.plotly_chart(fig_receita, width='stretch')
+
+            with st.expander("🔍 Ver Todas as Categorias"):
+                st.dataframe(
+                    categorias.rename(columns={
+                        'categoria': 'Categoria', 'itens': 'Itens', 'receita': 'Receita (R$)',
+                        'frete': 'Frete (R$)', 'preco_medio': 'Preço Médio (R$)'
+                    }).round(2),
+                    width='stretch',
+                    hide_index=True
+                )
+        else:
+            st.warning("Nenhum item vendido nos pedidos selecionados.")
+    else:
+        st.warning("Dados de pedidos, itens, clientes, vendedores ou produtos indisponíveis.")
+
+secao_receita(impressoes, filtro, selecao)
+
+@st.fragment
+@instrumentar('pagamentos')
+def secao_pagamentos(impressoes, filtro, selecao):
+    """Valor pago e pedidos por forma de pagamento"""
+    st.markdown("---")
+    st.subheader("💳 Formas de Pagamento")
+
+    fatos = aguardar_etapa('fatos', "a tabela fato dos pedidos")
+    if tabelas_sob_demanda:
+        st.info(AVISO_SO_PANDAS)
+    elif fatos is not None:
+        import plotly.express as px
+
+        pagamentos = load_pagamentos(
+            impressao_fatos(impressoes), filtro, fatos,
+            selecao['pedidos'] if selecao is not None else None
         )
-        clientes_com_geo = clientes_com_geo.drop_duplicates(subset=['customer_id'])
-        return clientes_com_geo
-    return None
-
-def preparar_localizacao_vendedores():
-    """Junta dados de vendedores com geolocalização"""
-    if sellers_df is not None and geolocation_df is not None:
-        vendedores_com_geo = pd.merge(
-            sellers_df,
-            geolocation_df,
-            left_on='seller_zip_code_prefix',
-            right_on='geolocation_zip_code_prefix',
-            how='left'
+        anotar(linhas=pagamentos['pedidos'])
+
+        if pagamentos['pedidos'] > 0:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("💰 Valor Pago", f"R$ {pagamentos['valor_total']:,.0f}")
+            with col2:
+                st.metric("🧾 Pedidos Pagos", f"{pagamentos['pedidos']:,}")
+            with col3:
+                st.metric("🎫 Ticket Médio", f"R$ {pagamentos['ticket_medio']:,.2f}")
+
+            tipos = pagamentos['tipos']
+            col1, col2 = st.columns(2)
+            with col1:
+                fig_valor = px.pie(
+                    tipos, names='tipo', values='valor', title='Valor Pago por Forma de Pagamento'
+                )
+                st.plotly_chart(fig_valor, width='stretch')
+            with col2:
+                st.write("**Forma principal (maior valor) de cada pedido:**")
+                st.dataframe(
+                    tipos.rename(columns={
+                        'tipo': 'Forma', 'valor': 'Valor Pago (R$)', 'pedidos': 'Pedidos',
+                        'parcelas_medias': 'Parcelas Médias', 'participacao': 'Participação (%)'
+                    }).round(2),
+                    width='stretch',
+                    hide_index=True
+                )
+        else:
+            st.warning("Nenhum pagamento registrado nos pedidos selecionados.")
+    else:
+        st.warning("Dados de pedidos, itens, clientes, vendedores ou produtos indisponíveis.")
+
+secao_pagamentos(impressoes, filtro, selecao)
+
+@st.fragment
+@instrumentar('avaliacao_atraso')
+def secao_avaliacoes(impressoes, filtro, selecao):
+    """Nota das avaliações em função do atraso na entrega"""
+    st.markdown("---")
+    st.subheader("⭐ Avaliações × Atraso na Entrega")
+
+    fatos = aguardar_etapa('fatos', "a tabela fato dos pedidos")
+    if tabelas_sob_demanda:
+        st.info(AVISO_SO_PANDAS)
+    elif fatos is not None:
+        import plotly.express as px
+
+        avaliacoes = load_avaliacao_atraso(
+            impressao_fatos(impressoes), filtro, fatos,
+            selecao['pedidos'] if selecao is not None else None
         )
-        vendedores_com_geo = vendedores_com_geo.drop_duplicates(subset=['seller_id'])
-        return vendedores_com_geo
-    return None
+        anotar(linhas=avaliacoes['avaliados'])
 
-# Preparar os dados
-clientes_com_localizacao = preparar_localizacao_clientes()
-vendedores_com_localizacao = preparar_localizacao_vendedores()
+        if avaliacoes['avaliados'] > 0:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("📝 Pedidos Avaliados", f"{avaliacoes['avaliados']:,}")
+            with col2:
+                st.metric("⭐ Nota Média", f"{avaliacoes['nota_media']:.2f}")
+            with col3:
+                st.metric("📉 Correlação Atraso × Nota", f"{avaliacoes['correlacao']:+.2f}")
 
-# ========== MAPA COMPARATIVO: VENDEDORES vs CLIENTES ==========
-# Adicione APÓS a seção "TABELA DE ARQUIVOS"
+            col1, col2 = st.columns(2)
+            with col1:
+                fig_faixas = px.bar(
+                    avaliacoes['faixas'],
+                    x='faixa',
+                    y='nota_media',
+                    title='Nota Média por Faixa de Entrega',
+                    labels={'faixa': 'Entrega', 'nota_media': 'Nota Média'},
+                    range_y=[1, 5]
+                )
+                st.plotly_chart(fig_faixas, width='stretch')
+            with col2:
+                fig_dias = px.line(
+                    avaliacoes['por_dia'],
+                    x='dias',
+                    y='nota_media',
+                    title='Nota Média por Dias de Atraso (real - estimado)',
+                    labels={'dias': 'Dias de atraso', 'nota_media': 'Nota Média'},
+                    hover_data=['pedidos'],
+                    markers=True
+                )
+                st.plotly_chart(fig_dias, width='stretch')
 
-st.markdown("---")
-st.subheader("🗺️ Mapa Comparativo: Vendedores vs Clientes")
+            st.dataframe(
+                avaliacoes['faixas'].rename(columns={
+                    'faixa': 'Entrega', 'pedidos': 'Pedidos', 'nota_media': 'Nota Média',
+                    'nota_baixa': 'Notas 1-2 (%)'
+                }).round(2),
+                width='stretch',
+                hide_index=True
+            )
+        else:
+            st.warning("Nenhum pedido entregue e avaliado nos pedidos selecionados.")
+    else:
+        st.warning("Dados de pedidos, itens, clientes, vendedores ou produtos indisponíveis.")
 
-if vendedores_com_localizacao is not None and clientes_com_localizacao is not None:
-    # Filtrar registros com coordenadas válidas
-    vendedores_validos = vendedores_com_localizacao.dropna(
-        subset=['geolocation_lat', 'geolocation_lng']
-    )
-    clientes_validos = clientes_com_localizacao.dropna(
-        subset=['geolocation_lat', 'geolocation_lng']
-    )
+secao_avaliacoes(impressoes, filtro, selecao)
+
+# ========== MAPA COMPARATIVO: VENDEDORES vs CLIENTES ==========
+@st.fragment
+@instrumentar('comparativo')
+def secao_comparativo(dfs, impressoes, dataset_path, filtro, selecao):
+    """Mapa de vendedores vs clientes (os sliders reexecutam só esta seção)"""
+    st.markdown("---")
+    st.subheader("🗺️ Mapa Comparativo: Vendedores vs Clientes")
     
-    # Sliders para controle
-    amostra_vendedores = st.slider(
-        "Número de vendedores:", 
-        min_value=100, 
-        max_value=min(2000, len(vendedores_validos)),
-        value=min(500, len(vendedores_validos)),
-        step=100
-    )
+    if all(f in dfs for f in ['olist_customers_dataset.csv', 'olist_sellers_dataset.csv', ARQUIVO_GEO]):
+        # Contagens cacheadas: mover os sliders não refaz a junção
+        with medir_secao('preparo_localizacao'):
+            consultas = aguardar_etapa('consultas', "o backend de consultas")
+            if selecao is not None:
+                # Clientes e vendedores dos pedidos filtrados (máscaras das tabelas)
+                mascaras = {'clientes': selecao['clientes'], 'vendedores': selecao['vendedores']}
+                localizados = {
+                    tabela: consultas.contar_localizados(tabela, mascara)
+                    for tabela, mascara in mascaras.items()
+                }
+            else:
+                mascaras = {'clientes': None, 'vendedores': None}
+                localizados = aguardar_etapa('localizados', "as localizações")
+            total_vendedores = localizados['vendedores']
+            total_clientes = localizados['clientes']
+            anotar(linhas=total_vendedores + total_clientes)
     
-    amostra_clientes = st.slider(
-        "Número de clientes:", 
-        min_value=100, 
-        max_value=min(2000, len(clientes_validos)),
-        value=min(500, len(clientes_validos)),
-        step=100
-    )
+        # Amostras vêm de uma ordem pré-calculada: cada N é um prefixo dela
+        modo_amostragem = st.radio(
+            "Amostragem:",
+            ['Estratificada por estado', 'Uniforme'],
+            horizontal=True,
+            key='modo_amostragem'
+        )
+        modo = 'estratificada' if modo_amostragem == 'Estratificada por estado' else 'uniforme'
     
-    vendedores_amostra = vendedores_validos.sample(
-        n=min(amostra_vendedores, len(vendedores_validos)), 
-        random_state=42
-    )
-    clientes_amostra = clientes_validos.sample(
-        n=min(amostra_clientes, len(clientes_validos)), 
-        random_state=42
-    )
+        # Sliders para controle (com filtros podem sobrar menos de 100 linhas)
+        def slider_amostra(rotulo, maximo):
+            if maximo <= 100:
+                return maximo
+            return st.slider(
+                rotulo,
+                min_value=100,
+                max_value=maximo,
+                value=min(500, maximo),
+                step=100
+            )
+        
+        amostra_vendedores = slider_amostra("Número de vendedores:", total_vendedores)
+        amostra_clientes = slider_amostra("Número de clientes:", min(100_000, total_clientes))
+    
+        n_vendedores = min(amostra_vendedores, total_vendedores)
+        n_clientes = min(amostra_clientes, total_clientes)
+        
+        def renderizar_comparativo():
+            from olist.mapas import construir_mapa_comparativo
+
+            vendedores_amostra = consultas.amostra_localizados(
+                'vendedores', n_vendedores, modo, mascara=mascaras['vendedores']
+            )
+            clientes_amostra = consultas.amostra_localizados(
+                'clientes', n_clientes, modo, mascara=mascaras['clientes']
+            )
+            # Uma camada GeoJSON por grupo, renderizada em canvas
+            return construir_mapa_comparativo(
+                vendedores_amostra, clientes_amostra, tiles=TILES_COMPARATIVO
+            ).get_root().render()
+        
+        # HTML servido do cache de mapas; só renderiza configurações novas
+        chave = (
+            'comparativo',
+            consultas.nome,
+            impressoes.get('olist_sellers_dataset.csv'),
+            impressoes.get('olist_customers_dataset.csv'),
+            impressoes.get(ARQUIVO_GEO),
+            filtro,
+            modo,
+            n_vendedores,
+            n_clientes,
+            TILES_COMPARATIVO,
+        )
+        html_content = load_cache_mapas(dataset_path).obter_ou_renderizar(chave, renderizar_comparativo)
+        st.iframe(html_content, width=1200, height=600)
+        anotar(linhas=n_vendedores + n_clientes, bytes=len(html_content))
     
-    # Criar mapa
-    from folium import FeatureGroup, LayerControl
+        # Estatísticas rápidas
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Vendedores", n_vendedores)
+        with col2:
+            st.metric("Clientes", n_clientes)
+        with col3:
+            st.metric("Total", n_vendedores + n_clientes)
     
-    mapa_comparativo = folium.Map(
-        location=[-15, -55],
-        zoom_start=4,
-        tiles='CartoDB positron',
-        width='100%'
-    )
+        st.info("Use o controle no canto superior direito para mostrar/esconder cada grupo")
+    else:
+        st.warning("Dados de localização insuficientes para o mapa comparativo")
+
+secao_comparativo(dfs, impressoes, dataset_path, filtro, selecao)
+
+# ========== FLUXOS VENDEDOR → CLIENTE ==========
+@contar_cache(st.cache_resource(max_entries=16))
+def load_fluxos_filtrados(impressoes_fluxos, filtro, _envios, _mascara_itens):
+    """Fluxos só dos envios dos itens do filtro (uma vez por filtro e versão do dataset)"""
+    return agregar_fluxos(filtrar_envios(_envios, _mascara_itens))
+
+@st.fragment
+@instrumentar('fluxos')
+def secao_fluxos(dfs, impressoes, dataset_path, filtro, selecao):
+    """Distância e fluxo de cada envio, do vendedor ao cliente"""
+    st.markdown("---")
+    st.subheader("🚚 Fluxos Vendedor → Cliente")
     
-    # Grupos separados
-    vendedores_group = FeatureGroup(name='🏪 Vendedores', show=True)
-    clientes_group = FeatureGroup(name='👥 Clientes', show=True)
+    if tabelas_sob_demanda:
+        st.info(AVISO_SO_PANDAS)
+    elif all(f in dfs for f in ARQUIVOS_FLUXOS):
+        impressoes_fluxos = tuple(impressoes.get(f) for f in ARQUIVOS_FLUXOS)
+        import plotly.express as px
+
+        if selecao is not None:
+            fluxos = load_fluxos_filtrados(
+                impressoes_fluxos, filtro,
+                aguardar_etapa('envios', "os envios"), selecao['itens']
+            )
+        else:
+            fluxos = aguardar_etapa('fluxos', "os fluxos entre estados")
+        resumo = fluxos['resumo']
+        anotar(linhas=resumo['envios'])
     
-    # Adicionar vendedores (vermelho)
-    for idx, row in vendedores_amostra.iterrows():
-        folium.CircleMarker(
-            location=[row['geolocation_lat'], row['geolocation_lng']],
-            radius=5,
-            popup=f"<b>Vendedor</b><br>{row.get('seller_city', '')}, {row.get('seller_state', '')}",
-            color='#FF0000',
-            fill=True,
-            fill_color='#FF0000',
-            fill_opacity=0.7
-        ).add_to(vendedores_group)
+        if resumo['envios'] > 0:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("📦 Envios", f"{resumo['envios']:,}")
+            with col2:
+                st.metric("📏 Distância Média", f"{resumo['distancia_media_km']:,.0f} km")
+            with col3:
+                st.metric("📐 Distância Mediana", f"{resumo['distancia_mediana_km']:,.0f} km")
+            with col4:
+                st.metric("🏠 Mesmo Estado", f"{resumo['percentual_mesmo_estado']:.1f}%")
+        
+            correlacao = fluxos['correlacao']
+            st.write(
+                f"**Correlação distância × tempo real de entrega** "
+                f"({correlacao['envios_entregues']:,} envios entregues): "
+                f"Pearson {correlacao['pearson']:+.2f}, Spearman {correlacao['spearman']:+.2f}"
+            )
+        
+            # Mapa de fluxos (HTML do cache de mapas)
+            max_pares = st.slider(
+                "Pares de estados no mapa:",
+                min_value=10,
+                max_value=200,
+                value=60,
+                step=10,
+                key='max_pares_fluxo'
+            )
+            def renderizar_fluxos():
+                from olist.mapas import construir_mapa_fluxos
+
+                return construir_mapa_fluxos(
+                    fluxos['pares'], max_pares, tiles=TILES_COMPARATIVO
+                ).get_root().render()
+
+            chave = ('fluxos', impressoes_fluxos, filtro, max_pares, TILES_COMPARATIVO)
+            html_content = load_cache_mapas(dataset_path).obter_ou_renderizar(chave, renderizar_fluxos)
+            st.iframe(html_content, width=1200, height=600)
+            anotar(bytes=len(html_content))
+        
+            col1, col2 = st.columns(2)
+        
+            with col1:
+                fig_distancias = px.bar(
+                    fluxos['histograma'],
+                    x='distancia_km',
+                    y='envios',
+                    title='Distribuição das Distâncias de Envio',
+                    labels={'distancia_km': 'Distância (km)', 'envios': 'Envios'}
+                )
+                fig_distancias.update_layout(bargap=0)
+                st.plotly_chart(fig_distancias, width='stretch')
+        
+            with col2:
+                fig_tempo = px.bar(
+                    fluxos['tempo_por_faixa'],
+                    x='faixa',
+                    y='tempo_medio_dias',
+                    title='Tempo Médio de Entrega por Distância',
+                    labels={'faixa': 'Distância', 'tempo_medio_dias': 'Dias'}
+                )
+                st.plotly_chart(fig_tempo, width='stretch')
+        
+            # Matriz origem × destino
+            fig_matriz = px.imshow(
+                fluxos['matriz'],
+                title='Envios por Estado de Origem (vendedor) × Destino (cliente)',
+                labels={'color': 'Envios'},
+                color_continuous_scale='Reds',
+                aspect='auto'
+            )
+            fig_matriz.update_layout(height=700)
+            st.plotly_chart(fig_matriz, width='stretch')
+        
+            with st.expander("🔍 Ver Principais Fluxos entre Estados"):
+                st.dataframe(
+                    fluxos['pares'][[
+                        'estado_origem', 'estado_destino', 'envios',
+                        'distancia_media_km', 'tempo_medio_dias'
+                    ]].head(50),
+                    width='stretch',
+                    hide_index=True
+                )
+        else:
+            st.warning("Nenhum envio com origem e destino geolocalizados.")
+    else:
+        st.warning("Dados de itens, pedidos, clientes, vendedores ou geolocalização indisponíveis.")
+
+secao_fluxos(dfs, impressoes, dataset_path, filtro, selecao)
+
+# ========== BOTÃO PARA RECARREGAR ==========
+# Reingere só os arquivos alterados; etapas da carga e caches derivados de
+# tabelas inalteradas continuam válidos (são chaveados pela impressão de cada tabela)
+if st.button("🔄 Recarregar Dados"):
+    alteracoes = atualizar_dataset(dataset_path)
+    if alteracoes:
+        renovar_aquecimento()
+    st.session_state.alteracoes = alteracoes
+    st.rerun()
+
+if 'alteracoes' in st.session_state:
+    alteracoes = st.session_state.pop('alteracoes')
+    if alteracoes:
+        st.success("Arquivos atualizados: " + ", ".join(
+            f"{nome} ({tipo})" for nome, tipo in sorted(alteracoes.items())
+        ))
+    else:
+        st.info("Nenhum arquivo foi alterado desde a última carga.")
+
+# ========== PAINEL DE DESEMPENHO ==========
+if st.sidebar.toggle("⚙️ Painel de desempenho", key='painel_desempenho'):
+    registros = historico()
+    ultimos = {}
+    for registro in registros:
+        ultimos[registro['secao']] = registro
     
-    # Adicionar clientes (azul)
-    for idx, row in clientes_amostra.iterrows():
-        folium.CircleMarker(
-            location=[row['geolocation_lat'], row['geolocation_lng']],
-            radius=4,
-            popup=f"<b>Cliente</b><br>{row.get('customer_city', '')}, {row.get('customer_state', '')}",
-            color='#1E90FF',
-            fill=True,
-            fill_color='#1E90FF',
-            fill_opacity=0.6
-        ).add_to(clientes_group)
+    st.sidebar.write("**Última execução por seção:**")
+    st.sidebar.dataframe(
+        pd.DataFrame([
+            {
+                'Seção': secao,
+                'Tempo (s)': round(r['segundos'], 3),
+                'CPU (s)': round(r['cpu_segundos'], 3),
+                'Δ RSS (MB)': r['rss_delta_mb'],
+                'Linhas': r.get('linhas'),
+                'Bytes': r.get('bytes'),
+            }
+            for secao, r in ultimos.items()
+        ]),
+        hide_index=True
+    )
     
-    # Adicionar ao mapa
-    vendedores_group.add_to(mapa_comparativo)
-    clientes_group.add_to(mapa_comparativo)
-    LayerControl().add_to(mapa_comparativo)
+    st.sidebar.write(f"**Latência no processo ({len(registros):,} execuções):**")
+    st.sidebar.dataframe(pd.DataFrame(resumo_latencias()), hide_index=True)
     
-    # Exibir
-    try:
-        st_folium(mapa_comparativo, width=1200, height=600)
-    except:
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as f:
-            mapa_comparativo.save(f.name)
-            with open(f.name, 'r', encoding='utf-8') as html_file:
-                html_content = html_file.read()
-            os.unlink(f.name)
-        st.components.v1.html(html_content, width=1200, height=600)
+    uso_mapas = load_cache_mapas(dataset_path).uso()
+    st.sidebar.write(
+        f"**Cache de mapas:** {uso_mapas['itens']} itens, "
+        f"{uso_mapas['bytes'] / 2**20:.1f} MB — "
+        f"{uso_mapas['acertos_memoria']} acertos em memória, "
+        f"{uso_mapas['acertos_disco']} em disco, {uso_mapas['falhas']} falhas"
+    )
     
-    # Estatísticas rápidas
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Vendedores", len(vendedores_amostra))
-    with col2:
-        st.metric("Clientes", len(clientes_amostra))
-    with col3:
-        st.metric("Total", len(vendedores_amostra) + len(clientes_amostra))
+    st.sidebar.write("**Acertos dos caches no processo:**")
+    st.sidebar.dataframe(pd.DataFrame(estatisticas_caches()), hide_index=True)
     
-    st.info("Use o controle no canto superior direito para mostrar/esconder cada grupo")
-else:
-    st.warning("Dados de localização insuficientes para o mapa comparativo")
-
-# ========== BOTÃO PARA RECARREGAR ==========
-if st.button("🔄 Recarregar Dados"):
-    st.cache_data.clear()
-    st.session_state.clear()
-    st.rerun()
\ No newline at end of file
+    concluidas, total, atual = aquecimento.progresso()
+    st.sidebar.write(
+        f"**Carga em segundo plano:** {concluidas}/{total} etapas"
+        + (f" (em execução: {atual})" if atual else "")
+    )
+    st.sidebar.dataframe(
+        pd.DataFrame([
+            {
+                'Etapa': nome,
+                'Tempo (s)': round(segundos, 3),
+                'Reaproveitada': nome in aquecimento.reaproveitadas,
+                'Erro': str(aquecimento.erros[nome]) if nome in aquecimento.erros else None,
+            }
+            for nome, segundos in aquecimento.segundos.items()
+        ]),
+        hide_index=True
+    )
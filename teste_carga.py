@@ -0,0 +1,377 @@
+"""
+Teste de carga do dashboard com sessões simultâneas.
+
+Simula N analistas usando o dashboard ao mesmo tempo. Cada um é uma
+sessão do AppTest do Streamlit rodando em uma thread do mesmo processo,
+que compartilha os caches como as sessões de um servidor. As sessões
+fazem a primeira carga, movem os sliders do mapa comparativo e do mapa
+de fluxos e apertam "Recarregar Dados". Sem navegador e sem Kaggle:
+roda sobre um diretório local do dataset (ou um dataset sintético).
+
+As sessões rodam em ondas. O relatório traz:
+- latência dos reruns (p50/p95/p99) por interação, comparada com uma
+  sessão isolada (o fator indica contenção entre sessões);
+- RSS do processo antes, durante e depois de cada onda. O crescimento
+  que sobra entre ondas, com os caches já quentes, aponta vazamento por
+  sessão;
+- taxa de acerto de cada cache durante as ondas.
+
+Uso:
+    python teste_carga.py --data-dir data/olist --sessoes 8 --ondas 3
+    python teste_carga.py --escala 10 --sessoes 16 --saida carga.json
+"""
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import threading
+import time
+
+from benchmark import commit_atual, preparar_dados
+from olist.instrumentacao import estatisticas_caches, rss_mb as rss_atual_mb, rss_pico_mb
+
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit_app.py')
+
+ROTULOS_SLIDERS_COMPARATIVO = ('Número de vendedores:', 'Número de clientes:')
+CHAVE_SLIDER_FLUXOS = 'max_pares_fluxo'
+ROTULO_RECARREGAR = 'Recarregar Dados'
+
+# Peso de cada interação no sorteio (a recarga tem contagem própria)
+PESOS_INTERACOES = {'slider_comparativo': 3, 'slider_fluxos': 1}
+
+# Intervalo de amostragem do RSS durante as ondas (s)
+INTERVALO_RSS = 0.2
+
+
+def rss_mb():
+    """RSS atual do processo (pico do processo fora do Linux)"""
+    rss = rss_atual_mb()
+    return rss if rss is not None else rss_pico_mb()
+
+
+def percentis(tempos):
+    """Execuções, p50, p95, p99 e máximo (s) de uma lista de tempos"""
+    tempos = sorted(tempos)
+    n = len(tempos)
+    if n == 0:
+        return {'execucoes': 0}
+    return {
+        'execucoes': n,
+        'p50_s': round(tempos[int(0.50 * (n - 1))], 4),
+        'p95_s': round(tempos[int(0.95 * (n - 1))], 4),
+        'p99_s': round(tempos[int(0.99 * (n - 1))], 4),
+        'max_s': round(tempos[-1], 4),
+    }
+
+
+# ========== SESSÃO SIMULADA ==========
+class Sessao:
+    """Um analista: uma sessão do AppTest e as latências dos seus reruns"""
+
+    def __init__(self, semente, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP, default_timeout=timeout)
+        self.aleatorio = random.Random(semente)
+        self.medidas = []
+
+    def _rerun(self, interacao):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            self.app.run()
+            if self.app.exception:
+                erro = str(self.app.exception[0].value)
+        except Exception as e:
+            erro = repr(e)
+        self.medidas.append({
+            'interacao': interacao,
+            'segundos': time.perf_counter() - inicio,
+            'erro': erro,
+        })
+
+    def _sortear(self, slider):
+        """Valor aleatório do slider, nos passos dele"""
+        passos = int(round((slider.max - slider.min) / slider.step))
+        return int(slider.min + self.aleatorio.randint(0, passos) * slider.step)
+
+    def primeira_carga(self):
+        self._rerun('primeira_carga')
+
+    def slider_comparativo(self):
+        sliders = [s for s in self.app.slider if s.label in ROTULOS_SLIDERS_COMPARATIVO]
+        if not sliders:
+            return
+        slider = self.aleatorio.choice(sliders)
+        slider.set_value(self._sortear(slider))
+        self._rerun('slider_comparativo')
+
+    def slider_fluxos(self):
+        sliders = [s for s in self.app.slider if s.key == CHAVE_SLIDER_FLUXOS]
+        if not sliders:
+            return
+        slider = sliders[0]
+        slider.set_value(self._sortear(slider))
+        self._rerun('slider_fluxos')
+
+    def recarregar(self):
+        botoes = [b for b in self.app.button if ROTULO_RECARREGAR in b.label]
+        if not botoes:
+            return
+        botoes[0].click()
+        self._rerun('recarregar')
+
+
+def plano_sessao(aleatorio, interacoes, recargas):
+    """Sequência de interações de uma sessão depois da primeira carga"""
+    plano = aleatorio.choices(
+        list(PESOS_INTERACOES), weights=list(PESOS_INTERACOES.values()), k=interacoes
+    )
+    for _ in range(recargas):
+        plano.insert(aleatorio.randint(0, len(plano)), 'recarregar')
+    return plano
+
+
+def executar_sessao(semente, interacoes, recargas, timeout):
+    """Roda uma sessão do início ao fim; retorna as medidas dos reruns"""
+    sessao = Sessao(semente, timeout)
+    sessao.primeira_carga()
+    for interacao in plano_sessao(sessao.aleatorio, interacoes, recargas):
+        getattr(sessao, interacao)()
+    return sessao.medidas
+
+
+# ========== ONDAS DE SESSÕES SIMULTÂNEAS ==========
+def _contagens_caches():
+    return {c['cache']: (c['acertos'], c['falhas']) for c in estatisticas_caches()}
+
+
+def diferenca_caches(antes, depois):
+    """Acertos, falhas e taxa de acerto de cada cache entre duas contagens"""
+    caches = {}
+    for nome, (acertos, falhas) in sorted(depois.items()):
+        acertos -= antes.get(nome, (0, 0))[0]
+        falhas -= antes.get(nome, (0, 0))[1]
+        if acertos + falhas:
+            caches[nome] = {
+                'acertos': acertos,
+                'falhas': falhas,
+                'taxa_acerto': round(acertos / (acertos + falhas) * 100, 1),
+            }
+    return caches
+
+
+def executar_onda(sessoes, semente, interacoes, recargas, timeout):
+    """
+    Roda `sessoes` sessões ao mesmo tempo, amostrando o RSS do processo
+    Retorna: dict com medidas, segundos e RSS antes/pico/depois (MB)
+    """
+    gc.collect()
+    rss_antes = rss_mb()
+    pico = [rss_antes]
+    parar = threading.Event()
+
+    def amostrar_rss():
+        while not parar.wait(INTERVALO_RSS):
+            pico[0] = max(pico[0], rss_mb())
+
+    amostrador = threading.Thread(target=amostrar_rss, daemon=True)
+    amostrador.start()
+    inicio = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(sessoes, thread_name_prefix='sessao') as executor:
+        futuros = [
+            executor.submit(executar_sessao, semente + k, interacoes, recargas, timeout)
+            for k in range(sessoes)
+        ]
+        medidas = [medida for futuro in futuros for medida in futuro.result()]
+    segundos = time.perf_counter() - inicio
+    parar.set()
+    amostrador.join()
+
+    gc.collect()
+    rss_depois = rss_mb()
+    return {
+        'medidas': medidas,
+        'segundos': round(segundos, 2),
+        'rss_antes_mb': round(rss_antes, 1),
+        'rss_pico_mb': round(max(pico[0], rss_depois), 1),
+        'rss_depois_mb': round(rss_depois, 1),
+        'rss_por_sessao_mb': round((rss_depois - rss_antes) / sessoes, 2),
+    }
+
+
+def latencias_por_interacao(medidas):
+    """Percentis por interação e de todos os reruns"""
+    por_interacao = collections.defaultdict(list)
+    for medida in medidas:
+        por_interacao[medida['interacao']].append(medida['segundos'])
+    resumo = {nome: percentis(tempos) for nome, tempos in sorted(por_interacao.items())}
+    resumo['todas'] = percentis([m['segundos'] for m in medidas])
+    return resumo
+
+
+# ========== TESTE COMPLETO ==========
+def executar_teste(data_dir, sessoes, ondas, interacoes, recargas, semente, timeout):
+    """
+    Carga fria e sessão isolada de referência, depois as ondas de sessões
+    simultâneas
+    Retorna: relatório (dict)
+    """
+    os.environ['OLIST_DATA_DIR'] = data_dir
+    rss_inicial = rss_mb()
+
+    # Carga fria: primeira sessão do processo monta todos os caches
+    fria = executar_sessao(semente, interacoes, recargas, timeout)
+    rss_aquecido = rss_mb()
+    # Referência sem concorrência, com os caches já quentes
+    isolada = executar_sessao(semente, interacoes, recargas, timeout)
+
+    caches_antes = _contagens_caches()
+    resultados = []
+    for onda in range(ondas):
+        resultado = executar_onda(
+            sessoes, semente + (onda + 1) * sessoes, interacoes, recargas, timeout
+        )
+        resultados.append(resultado)
+        print(
+            f"  onda {onda + 1}/{ondas}: {resultado['segundos']:.1f} s, "
+            f"RSS {resultado['rss_antes_mb']:.0f} → {resultado['rss_depois_mb']:.0f} MB "
+            f"(pico {resultado['rss_pico_mb']:.0f} MB)"
+        )
+    caches = diferenca_caches(caches_antes, _contagens_caches())
+
+    medidas = [medida for resultado in resultados for medida in resultado['medidas']]
+    latencias = latencias_por_interacao(medidas)
+    referencia = latencias_por_interacao(isolada)
+    for nome, resumo in latencias.items():
+        base = referencia.get(nome, {}).get('p50_s')
+        if base and resumo.get('p50_s') is not None:
+            resumo['fator_contencao'] = round(resumo['p50_s'] / base, 2)
+
+    # Crescimento que sobra depois da primeira onda (caches já quentes)
+    residual = None
+    if ondas > 1:
+        residual = round(
+            (resultados[-1]['rss_depois_mb'] - resultados[0]['rss_depois_mb'])
+            / (sessoes * (ondas - 1)), 2
+        )
+
+    erros = collections.Counter(m['erro'] for m in fria + isolada + medidas if m['erro'])
+    return {
+        'data_dir': data_dir,
+        'sessoes': sessoes,
+        'ondas': ondas,
+        'interacoes': interacoes,
+        'recargas': recargas,
+        'carga_fria_s': round(fria[0]['segundos'], 2),
+        'latencias': latencias,
+        'latencias_isolada': referencia,
+        'memoria': {
+            'rss_inicial_mb': round(rss_inicial, 1),
+            'rss_aquecido_mb': round(rss_aquecido, 1),
+            'ondas': [
+                {chave: valor for chave, valor in resultado.items() if chave != 'medidas'}
+                for resultado in resultados
+            ],
+            'rss_residual_por_sessao_mb': residual,
+        },
+        'caches': caches,
+        'erros': dict(erros),
+    }
+
+
+def imprimir_relatorio(relatorio):
+    print(f"\nCarga fria (1 sessão): {relatorio['carga_fria_s']:.2f} s")
+
+    print(f"\n{'Latência dos reruns (s)':<26}{'exec':>6}{'p50':>8}{'p95':>8}"
+          f"{'p99':>8}{'max':>8}{'fator':>7}")
+    for nome, resumo in relatorio['latencias'].items():
+        if not resumo['execucoes']:
+            continue
+        print(
+            f"  {nome:<24}{resumo['execucoes']:>6}{resumo['p50_s']:>8.3f}{resumo['p95_s']:>8.3f}"
+            f"{resumo['p99_s']:>8.3f}{resumo['max_s']:>8.3f}"
+            f"{resumo.get('fator_contencao', float('nan')):>7.2f}"
+        )
+    print("  (fator = p50 com sessões simultâneas / p50 da sessão isolada)")
+
+    memoria = relatorio['memoria']
+    print(
+        f"\nRSS do processo: {memoria['rss_inicial_mb']:.0f} MB no início, "
+        f"{memoria['rss_aquecido_mb']:.0f} MB após a carga fria"
+    )
+    for k, onda in enumerate(memoria['ondas'], start=1):
+        print(f"  onda {k}: {onda['rss_por_sessao_mb']:+.2f} MB por sessão "
+              f"(pico {onda['rss_pico_mb']:.0f} MB)")
+    if memoria['rss_residual_por_sessao_mb'] is not None:
+        print(f"  crescimento residual entre ondas: "
+              f"{memoria['rss_residual_por_sessao_mb']:+.2f} MB por sessão")
+
+    print(f"\n{'Caches (durante as ondas)':<32}{'acertos':>9}{'falhas':>8}{'taxa':>8}")
+    for nome, cache in relatorio['caches'].items():
+        print(f"  {nome:<30}{cache['acertos']:>9}{cache['falhas']:>8}{cache['taxa_acerto']:>7.1f}%")
+
+    if relatorio['erros']:
+        print("\nErros:")
+        for erro, quantidade in relatorio['erros'].items():
+            print(f"  {quantidade}× {erro}")
+    else:
+        print("\nNenhum erro nos reruns.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard Olist")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument('--data-dir', help="diretório dos CSVs (padrão: OLIST_DATA_DIR)")
+    origem.add_argument('--escala', type=float,
+                        help="usa o dataset sintético do benchmark nesta escala")
+    parser.add_argument('--sessoes', type=int, default=8, help="sessões simultâneas por onda")
+    parser.add_argument('--ondas', type=int, default=3, help="ondas de sessões")
+    parser.add_argument('--interacoes', type=int, default=10,
+                        help="movimentos de slider por sessão, depois da primeira carga")
+    parser.add_argument('--recargas', type=int, default=1,
+                        help="cliques em Recarregar Dados por sessão")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=600, help="limite de cada rerun (s)")
+    parser.add_argument('--saida', help="relatório JSON")
+    args = parser.parse_args()
+
+    if args.escala is not None:
+        data_dir = preparar_dados(args.escala)
+    else:
+        data_dir = args.data_dir or os.environ.get('OLIST_DATA_DIR')
+    if not data_dir:
+        parser.error("informe --data-dir, --escala ou OLIST_DATA_DIR")
+
+    print(
+        f"Dataset {data_dir}: {args.ondas} ondas × {args.sessoes} sessões, "
+        f"{args.interacoes} interações e {args.recargas} recarga(s) por sessão"
+    )
+    relatorio = executar_teste(
+        data_dir, args.sessoes, args.ondas, args.interacoes, args.recargas,
+        args.semente, args.timeout
+    )
+    imprimir_relatorio(relatorio)
+
+    if args.saida:
+        relatorio = {
+            'commit': commit_atual(),
+            'data': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            **relatorio,
+        }
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2)
+        print(f"\nRelatório gravado em {args.saida}")
+    if relatorio['erros']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+Fixtures dos testes: um dataset sintético pequeno, gerado uma vez por
+sessão, e cópias descartáveis dele para os testes que gravam caches.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from olist.sintetico import gerar_dataset  # noqa: E402
+
+
+# ~1% do dataset público: poucos segundos para gerar e ler
+ESCALA_TESTES = 0.01
+
+
+@pytest.fixture(scope='session')
+def dataset_base(tmp_path_factory):
+    """CSVs sintéticos compartilhados pelos testes (não gravar aqui)"""
+    return gerar_dataset(str(tmp_path_factory.mktemp('olist')), escala=ESCALA_TESTES)
+
+
+@pytest.fixture
+def dataset(dataset_base, tmp_path):
+    """Cópia do dataset sintético, sem caches, só deste teste"""
+    destino = str(tmp_path / 'olist')
+    shutil.copytree(dataset_base, destino)
+    return destino
@@ -0,0 +1,45 @@
+"""Ordem de amostragem aninhada: prefixos estratificados contra contagens do pandas."""
+import numpy as np
+import pytest
+
+from olist.amostragem import EXPOENTE_ALOCACAO, ordem_amostragem, ordenar_para_amostragem
+from olist.ingestao import carregar_arquivo
+
+
+@pytest.fixture(scope='module')
+def clientes(dataset_base):
+    return carregar_arquivo(dataset_base, 'olist_customers_dataset.csv', usar_cache=False)
+
+
+@pytest.mark.parametrize('modo', ['estratificada', 'uniforme'])
+def test_ordem_e_permutacao_deterministica(clientes, modo):
+    estados, ceps = clientes['customer_state'], clientes['customer_zip_code_prefix']
+    ordem = ordem_amostragem(estados, ceps, modo)
+    np.testing.assert_array_equal(np.sort(ordem), np.arange(len(clientes)))
+    np.testing.assert_array_equal(ordem, ordem_amostragem(estados, ceps, modo))
+    assert not np.array_equal(ordem, ordem_amostragem(estados, ceps, modo, semente=7))
+
+
+def test_amostras_aninhadas(clientes):
+    ordenados = ordenar_para_amostragem(clientes, 'customer_state', 'customer_zip_code_prefix')
+    anterior = set()
+    for n in [10, 50, 200, 800, len(clientes)]:
+        amostra = set(ordenados.head(n)['customer_id'])
+        assert len(amostra) == n
+        assert anterior <= amostra
+        anterior = amostra
+    assert anterior == set(clientes['customer_id'])
+
+
+def test_prefixos_seguem_a_alocacao_por_estado(clientes):
+    estados = clientes['customer_state'].astype(str)
+    ordem = ordem_amostragem(estados, clientes['customer_zip_code_prefix'])
+    populacao = estados.value_counts()
+    pesos = populacao ** EXPOENTE_ALOCACAO
+
+    # Até o menor estado se esgotar, cada prefixo reparte n pelos pesos
+    limite = int((populacao / (pesos / pesos.sum())).min())
+    for n in sorted({20, 100, limite // 2, limite}):
+        contagem = estados.iloc[ordem[:n]].value_counts().reindex(populacao.index, fill_value=0)
+        esperado = n * pesos / pesos.sum()
+        assert (contagem - esperado).abs().max() <= 1.5, n
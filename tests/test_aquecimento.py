@@ -0,0 +1,70 @@
+"""Etapas do dashboard: o backend DuckDB sem tabelas no pandas, contra o backend pandas."""
+import shutil
+import threading
+
+import pandas as pd
+
+from olist.aquecimento import Aquecimento, etapas_dashboard
+from olist.armazem import TabelasSobDemanda
+from olist.consultas import ARQUIVO_PEDIDOS
+
+
+ETAPAS_SO_PANDAS = ['filtros', 'fatos', 'cubo', 'envios', 'fluxos']
+
+
+def _status(contagem):
+    return dict(zip(contagem['Status'], contagem['Quantidade']))
+
+
+def test_duckdb_nao_carrega_tabelas_no_pandas(dataset, dataset_base, tmp_path):
+    # Cópias separadas: as pirâmides do DuckDB não saem do cache do pandas
+    copia = str(tmp_path / 'duckdb')
+    shutil.copytree(dataset_base, copia)
+    duckdb = Aquecimento(etapas_dashboard(copia, 'duckdb')).executar()
+    pandas = Aquecimento(etapas_dashboard(dataset, 'pandas')).executar()
+    assert not duckdb.erros and not pandas.erros
+
+    _, tabelas, _ = duckdb.resultados['dados']
+    _, dfs, _ = pandas.resultados['dados']
+    assert isinstance(tabelas, TabelasSobDemanda)
+    assert duckdb.resultados['consultas'].nome == 'duckdb'
+    # Etapas montadas em pandas não rodam sob o DuckDB
+    for nome in ETAPAS_SO_PANDAS:
+        assert duckdb.resultados[nome] is None
+        assert pandas.resultados[nome] is not None
+
+    # Status, entregas, localizações e pirâmides sem montar nenhum DataFrame
+    assert tabelas._dfs == {}
+    assert list(tabelas) == list(dfs)
+    for file_name, df in dfs.items():
+        assert file_name in tabelas
+        assert tabelas.forma(file_name)[:2] == df.shape
+    assert _status(duckdb.resultados['status_pedidos']) == _status(pandas.resultados['status_pedidos'])
+    assert duckdb.resultados['localizados'] == pandas.resultados['localizados']
+    assert duckdb.resultados['metricas_entrega']['total'] == pandas.resultados['metricas_entrega']['total']
+    for nome in ['piramide', 'piramide_estados']:
+        for nivel, celulas in pandas.resultados[nome].items():
+            pd.testing.assert_frame_equal(duckdb.resultados[nome][nivel], celulas)
+
+    # Fallback em pandas: só a tabela pedida é montada
+    pedidos = tabelas[ARQUIVO_PEDIDOS]
+    assert list(tabelas._dfs) == [ARQUIVO_PEDIDOS]
+    assert len(pedidos) == len(dfs[ARQUIVO_PEDIDOS])
+
+
+def test_etapa_iniciada_antes_de_terminar():
+    comecou, liberar = threading.Event(), threading.Event()
+
+    def bloquear(resultados):
+        comecou.set()
+        liberar.wait()
+
+    aquecimento = Aquecimento([('dados', bloquear), ('seguinte', lambda r: 1)])
+    assert not aquecimento.iniciada('dados')
+    aquecimento.iniciar()
+    assert comecou.wait(10)
+    assert aquecimento.iniciada('dados') and not aquecimento.pronta('dados')
+    assert not aquecimento.iniciada('seguinte')
+    liberar.set()
+    assert aquecimento.aguardar(espera=10)
+    assert aquecimento.iniciada('seguinte')
@@ -0,0 +1,156 @@
+"""Atualização incremental: anexar linhas dá o mesmo que reler o CSV inteiro."""
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from olist.aquecimento import Aquecimento, etapas_dashboard
+from olist.armazem import carregar_armazem
+from olist.atualizacao import atualizar_dataset
+from olist.chaves import CHAVES
+from olist.ingestao import ler_csv
+
+
+ARQUIVOS_ANEXADOS = ['olist_orders_dataset.csv', 'olist_order_items_dataset.csv']
+
+
+def _separar_final(file_path, fracao=0.2):
+    """Remove o último trecho de linhas do CSV e o retorna (em bytes)"""
+    with open(file_path, 'rb') as f:
+        linhas = f.readlines()
+    corte = len(linhas) - max(1, int((len(linhas) - 1) * fracao))
+    with open(file_path, 'wb') as f:
+        f.writelines(linhas[:corte])
+    return b''.join(linhas[corte:])
+
+
+def test_anexar_igual_a_releitura(dataset):
+    finais = {
+        file_name: _separar_final(os.path.join(dataset, file_name))
+        for file_name in ARQUIVOS_ANEXADOS
+    }
+    atualizar_dataset(dataset)
+    carregar_armazem(dataset, chaves_compactas=False)
+
+    for file_name, final in finais.items():
+        with open(os.path.join(dataset, file_name), 'ab') as f:
+            f.write(final)
+
+    alteracoes = atualizar_dataset(dataset)
+    assert alteracoes == {file_name: 'anexado' for file_name in ARQUIVOS_ANEXADOS}
+
+    tabelas = carregar_armazem(dataset, chaves_compactas=False)
+    for file_name in ARQUIVOS_ANEXADOS:
+        pd.testing.assert_frame_equal(
+            tabelas[file_name], ler_csv(os.path.join(dataset, file_name)),
+            check_categorical=False,
+        )
+
+
+def test_sem_mudanca_nao_reingere(dataset):
+    atualizar_dataset(dataset)
+    assert atualizar_dataset(dataset) == {}
+
+
+def test_alteracao_no_meio_rele_o_arquivo(dataset):
+    file_name = 'olist_customers_dataset.csv'
+    atualizar_dataset(dataset)
+    carregar_armazem(dataset, chaves_compactas=False)
+
+    # Sem a primeira linha de dados: o conteúdo anterior deixa de ser prefixo
+    file_path = os.path.join(dataset, file_name)
+    with open(file_path, 'rb') as f:
+        linhas = f.readlines()
+    with open(file_path, 'wb') as f:
+        f.writelines([linhas[0]] + linhas[2:])
+
+    assert atualizar_dataset(dataset) == {file_name: 'alterado'}
+    tabelas = carregar_armazem(dataset, chaves_compactas=False)
+    pd.testing.assert_frame_equal(
+        tabelas[file_name], ler_csv(file_path), check_categorical=False
+    )
+
+
+def test_atualizacoes_simultaneas(dataset):
+    file_name = 'olist_orders_dataset.csv'
+    final = _separar_final(os.path.join(dataset, file_name))
+    atualizar_dataset(dataset)
+    with open(os.path.join(dataset, file_name), 'ab') as f:
+        f.write(final)
+
+    resultados = []
+    threads = [
+        threading.Thread(target=lambda: resultados.append(atualizar_dataset(dataset)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Serializadas: só a primeira encontra a mudança
+    assert sorted(map(len, resultados)) == [0, 0, 0, 1]
+    assert not glob.glob(os.path.join(dataset, '**', '*.tmp'), recursive=True)
+    pd.testing.assert_frame_equal(
+        carregar_armazem(dataset, chaves_compactas=False)[file_name],
+        ler_csv(os.path.join(dataset, file_name)),
+        check_categorical=False,
+    )
+
+
+def test_codificacao_incremental_igual_a_completa(dataset):
+    finais = {
+        file_name: _separar_final(os.path.join(dataset, file_name))
+        for file_name in ARQUIVOS_ANEXADOS
+    }
+    atualizar_dataset(dataset)
+    antes = carregar_armazem(dataset, chaves_compactas=True)
+    for file_name, final in finais.items():
+        with open(os.path.join(dataset, file_name), 'ab') as f:
+            f.write(final)
+    atualizar_dataset(dataset)
+
+    inalteradas = {f: df for f, df in antes.items() if f not in ARQUIVOS_ANEXADOS}
+    incremental = carregar_armazem(dataset, chaves_compactas=True, anteriores=inalteradas)
+    simples = carregar_armazem(dataset, chaves_compactas=False)
+
+    tipos = {}
+    for file_name, df in simples.items():
+        codificada = incremental[file_name]
+        for coluna in df.columns:
+            if coluna not in CHAVES:
+                continue
+            # Um dicionário por domínio, o anterior como prefixo (códigos mantidos)
+            tipo = tipos.setdefault(coluna, codificada[coluna].dtype)
+            assert codificada[coluna].dtype == tipo
+            categorias_antes = antes[file_name][coluna].cat.categories
+            assert tipo.categories[:len(categorias_antes)].equals(categorias_antes)
+            esperado = df[coluna].astype(object).where(df[coluna].notna(), None)
+            obtido = codificada[coluna].astype(object).where(codificada[coluna].notna(), None)
+            assert obtido.tolist() == esperado.tolist(), (file_name, coluna)
+            if file_name in inalteradas:
+                np.testing.assert_array_equal(
+                    codificada[coluna].array.codes, antes[file_name][coluna].array.codes
+                )
+
+
+def test_recarga_reaproveita_tabelas_inalteradas(dataset):
+    file_name = 'olist_order_reviews_dataset.csv'
+    final = _separar_final(os.path.join(dataset, file_name))
+    etapas = [etapa for etapa in etapas_dashboard(dataset, 'pandas') if etapa[0] == 'dados']
+    primeira = Aquecimento(etapas).executar()
+    with open(os.path.join(dataset, file_name), 'ab') as f:
+        f.write(final)
+
+    segunda = primeira.renovar()
+    segunda.aguardar()
+    assert not segunda.erros
+    _, antes, _ = primeira.resultados['dados']
+    _, depois, _ = segunda.resultados['dados']
+    assert len(depois[file_name]) > len(antes[file_name])
+    # Avaliações sem pedidos novos: as demais tabelas são as mesmas, sem recodificar
+    for nome, df in antes.items():
+        if nome != file_name:
+            assert depois[nome] is df, nome
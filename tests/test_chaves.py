@@ -0,0 +1,61 @@
+"""Chaves compactas: dicionários compartilhados sem mudar valores nem junções."""
+import shutil
+
+import pandas as pd
+import pytest
+
+from olist.armazem import carregar_armazem
+from olist.chaves import CHAVES, dicionarios_compartilhados
+
+
+@pytest.fixture(scope='module')
+def tabelas(tmp_path_factory, dataset_base):
+    destino = str(tmp_path_factory.mktemp('chaves') / 'olist')
+    shutil.copytree(dataset_base, destino)
+    return (
+        carregar_armazem(destino, chaves_compactas=True),
+        carregar_armazem(destino, chaves_compactas=False),
+    )
+
+
+def test_valores_iguais_aos_das_tabelas_sem_codificacao(tabelas):
+    compactas, simples = tabelas
+    assert list(compactas) == list(simples)
+    for file_name, df in simples.items():
+        codificada = compactas[file_name]
+        assert list(codificada.columns) == list(df.columns)
+        for coluna in df.columns:
+            if coluna in CHAVES:
+                assert isinstance(codificada[coluna].dtype, pd.CategoricalDtype)
+                esperado = df[coluna].astype(object).where(df[coluna].notna(), None)
+                obtido = codificada[coluna].astype(object).where(codificada[coluna].notna(), None)
+                assert obtido.tolist() == esperado.tolist(), (file_name, coluna)
+            else:
+                pd.testing.assert_series_equal(codificada[coluna], df[coluna])
+
+
+def test_dicionario_unico_por_dominio(tabelas):
+    compactas, simples = tabelas
+    for chave, categorias in dicionarios_compartilhados(compactas).items():
+        com_chave = [file_name for file_name, df in compactas.items() if chave in df.columns]
+        # Mesmo dtype (mesmo dicionário) em todas as tabelas com a chave
+        assert len({compactas[file_name][chave].dtype for file_name in com_chave}) == 1
+        valores = set().union(*(set(simples[file_name][chave].dropna()) for file_name in com_chave))
+        assert categorias.is_unique
+        assert set(categorias) == valores
+
+
+def test_juncao_por_codigos_igual_a_por_strings(tabelas):
+    compactas, simples = tabelas
+    pedidos, itens = 'olist_orders_dataset.csv', 'olist_order_items_dataset.csv'
+
+    def juntar(dfs):
+        juncao = dfs[itens][['order_id', 'order_item_id', 'price']].merge(
+            dfs[pedidos][['order_id', 'customer_id', 'order_status']], on='order_id'
+        )
+        return (
+            juncao.astype({'order_id': str, 'customer_id': str, 'order_status': str})
+            .sort_values(['order_id', 'order_item_id'], ignore_index=True)
+        )
+
+    pd.testing.assert_frame_equal(juntar(compactas), juntar(simples))
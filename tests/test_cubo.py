@@ -0,0 +1,108 @@
+"""Cubo de pedidos: o rollup filtrado bate com o cálculo sobre os pedidos filtrados."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from olist.armazem import carregar_armazem
+from olist.cubo import (
+    construir_cubo, contagem_status_cubo, cubo_atende, metricas_cubo, receita_cubo, rollup,
+)
+from olist.entregas import calcular_metricas_entrega
+from olist.fatos import (
+    ARQUIVOS_FATOS, ARQUIVOS_FATOS_OPCIONAIS, construir_fatos, receita_por_categoria,
+)
+from olist.filtros import SEM_FILTRO, Filtro, construir_indice_filtros, filtro_de_itens
+
+
+ARQUIVO_PEDIDOS = 'olist_orders_dataset.csv'
+
+FILTROS = [
+    SEM_FILTRO,
+    Filtro(estados_cliente=('SP', 'RJ')),
+    Filtro(status=('delivered', 'shipped')),
+    Filtro(inicio=pd.Timestamp('2017-03-01'), fim=pd.Timestamp('2017-08-31'),
+           estados_cliente=('MG', 'SP'), status=('delivered',)),
+]
+
+# Filtros que recortam itens: só as consultas de medidas de item
+FILTROS_ITENS = FILTROS + [
+    Filtro(estados_vendedor=('SP', 'PR')),
+    Filtro(categorias=('beleza_saude', 'telefonia')),
+    Filtro(inicio=pd.Timestamp('2017-01-01'), estados_vendedor=('SP',),
+           categorias=('cama_mesa_banho', 'esporte_lazer'), status=('delivered',)),
+]
+
+
+@pytest.fixture(scope='module')
+def base(dataset_base):
+    dfs = carregar_armazem(dataset_base, chaves_compactas=False)
+    fatos = construir_fatos(
+        *(dfs[f] for f in ARQUIVOS_FATOS), *(dfs.get(f) for f in ARQUIVOS_FATOS_OPCIONAIS)
+    )
+    return dfs, construir_cubo(fatos), construir_indice_filtros(dfs), fatos
+
+
+@pytest.mark.parametrize('filtro', FILTROS)
+def test_metricas_cubo_iguais_as_dos_pedidos(base, filtro):
+    dfs, cubo, indice, _ = base
+    assert cubo_atende(filtro)
+    orders_df = dfs[ARQUIVO_PEDIDOS]
+    esperado = calcular_metricas_entrega(orders_df[indice.mascara_pedidos(indice.selecionar(filtro))])
+    obtido = metricas_cubo(cubo, filtro)
+
+    assert obtido['total'] == esperado['total'] > 0
+    for kpi, valor in esperado['kpis'].items():
+        assert obtido['kpis'][kpi] == pytest.approx(valor)
+    pd.testing.assert_frame_equal(obtido['categorias'], esperado['categorias'])
+    pd.testing.assert_frame_equal(
+        obtido['tendencia_mensal'].reset_index(drop=True),
+        esperado['tendencia_mensal'].reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize('filtro', FILTROS)
+def test_contagem_status_cubo(base, filtro):
+    dfs, cubo, indice, _ = base
+    orders_df = dfs[ARQUIVO_PEDIDOS]
+    status = orders_df['order_status'][indice.mascara_pedidos(indice.selecionar(filtro))]
+    esperado = status.astype(str).value_counts()
+    obtido = contagem_status_cubo(cubo, filtro).set_index('Status')['Quantidade']
+    assert obtido.to_dict() == esperado.to_dict()
+
+
+@pytest.mark.parametrize('filtro', FILTROS_ITENS)
+def test_receita_cubo_igual_a_dos_fatos(base, filtro):
+    _, cubo, indice, fatos = base
+    assert cubo_atende(filtro, por_item=True)
+    selecao = indice.selecionar(filtro)
+    esperado = receita_por_categoria(
+        fatos, indice.mascara_pedidos(selecao), filtro.estados_vendedor, filtro.categorias
+    )
+    pedidos = indice.resumo(selecao)['pedidos'] if filtro_de_itens(filtro) else None
+    obtido = receita_cubo(cubo, filtro, pedidos)
+
+    assert obtido['itens'] == esperado['itens'] > 0
+    assert obtido['pedidos'] == esperado['pedidos']
+    assert obtido['receita'] == pytest.approx(esperado['receita'])
+    assert obtido['frete'] == pytest.approx(esperado['frete'])
+    pd.testing.assert_frame_equal(
+        obtido['categorias'].set_index('categoria').sort_index(),
+        esperado['categorias'].set_index('categoria').sort_index(),
+        check_dtype=False,
+    )
+
+
+def test_cubo_atende_filtros_de_item_so_por_item():
+    for filtro in [Filtro(estados_vendedor=('SP',)), Filtro(categorias=('telefonia',))]:
+        assert not cubo_atende(filtro)
+        assert cubo_atende(filtro, por_item=True)
+    assert not cubo_atende(Filtro(inicio=pd.Timestamp('2017-03-15')), por_item=True)
+
+
+def test_pedidos_do_cubo_somam_inteiros(base):
+    dfs, cubo, _, _ = base
+    # Os pesos dos itens fecham um pedido inteiro em cada célula de pedido
+    por_pedido = rollup(cubo, ['mes', 'estado_cliente', 'status'])['pedidos']
+    np.testing.assert_allclose(por_pedido, por_pedido.round())
+    assert por_pedido.sum() == pytest.approx(len(dfs[ARQUIVO_PEDIDOS]))
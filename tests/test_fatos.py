@@ -0,0 +1,78 @@
+"""Tabela fato: pesos por pedido e análises contra merges do pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from olist.fatos import (
+    ARQUIVOS_FATOS, ARQUIVOS_FATOS_OPCIONAIS, SEM_VALOR, construir_fatos,
+    pagamentos_por_tipo, receita_por_categoria,
+)
+from olist.ingestao import carregar_dataset
+
+
+@pytest.fixture(scope='module')
+def dfs(dataset_base):
+    return carregar_dataset(dataset_base, usar_cache=False)
+
+
+@pytest.fixture(scope='module')
+def fatos(dfs):
+    return construir_fatos(*(dfs[f] for f in ARQUIVOS_FATOS), *(dfs[f] for f in ARQUIVOS_FATOS_OPCIONAIS))
+
+
+def test_pesos_somam_um_por_pedido(dfs, fatos):
+    pedidos = dfs['olist_orders_dataset.csv']
+    itens = dfs['olist_order_items_dataset.csv']
+    posicao = fatos['posicao_pedido']
+
+    soma = fatos.groupby(posicao)['peso'].sum()
+    assert list(soma.index) == list(range(len(pedidos)))
+    np.testing.assert_allclose(soma.to_numpy(), 1.0)
+    assert fatos['peso'].sum() == pytest.approx(len(pedidos))
+    assert (fatos.groupby(posicao)['primeiro_item'].sum() == 1).all()
+
+    # Uma linha por item; pedidos sem itens com uma linha própria
+    n_itens = itens['order_id'].value_counts()
+    esperado = pedidos['order_id'].map(n_itens).fillna(0).astype('int64')
+    assert int(fatos['eh_item'].sum()) == int(esperado.sum())
+    np.testing.assert_array_equal(
+        fatos.loc[fatos['primeiro_item'].to_numpy(), 'n_itens'].to_numpy(),
+        esperado.to_numpy()[posicao[fatos['primeiro_item']].to_numpy()],
+    )
+
+
+def test_receita_por_categoria_igual_ao_merge(dfs, fatos):
+    itens = dfs['olist_order_items_dataset.csv'].merge(
+        dfs['olist_products_dataset.csv'][['product_id', 'product_category_name']],
+        on='product_id', how='left',
+    )
+    itens['categoria'] = itens['product_category_name'].astype(object).fillna(SEM_VALOR).astype(str)
+    esperado = itens.groupby('categoria').agg(
+        itens=('price', 'size'), receita=('price', 'sum'), frete=('freight_value', 'sum')
+    )
+
+    receita = receita_por_categoria(fatos)
+    obtido = receita['categorias'].set_index('categoria')
+    assert receita['receita'] == pytest.approx(itens['price'].sum())
+    assert receita['itens'] == len(itens)
+    assert receita['pedidos'] == itens['order_id'].nunique()
+    assert obtido['receita'].is_monotonic_decreasing
+    pd.testing.assert_frame_equal(
+        obtido[['itens', 'receita', 'frete']].sort_index(), esperado.sort_index(),
+        check_dtype=False, check_names=False,
+    )
+
+
+def test_pagamentos_por_tipo_igual_ao_groupby(dfs, fatos):
+    pagamentos = dfs['olist_order_payments_dataset.csv']
+    pagamentos = pagamentos[pagamentos['order_id'].isin(dfs['olist_orders_dataset.csv']['order_id'])]
+    esperado = pagamentos.groupby(pagamentos['payment_type'].astype(str))['payment_value'].sum()
+    esperado = esperado[esperado > 0]
+
+    resultado = pagamentos_por_tipo(fatos)
+    obtido = resultado['tipos'].set_index('tipo')['valor']
+    assert resultado['pedidos'] == pagamentos['order_id'].nunique()
+    assert resultado['valor_total'] == pytest.approx(pagamentos['payment_value'].sum())
+    pd.testing.assert_series_equal(
+        obtido[obtido > 0].sort_index(), esperado.sort_index(), check_names=False,
+    )
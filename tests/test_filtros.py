@@ -0,0 +1,126 @@
+"""Índices de filtro (bitmaps e máscaras) contra filtros simples do pandas."""
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from olist.armazem import carregar_armazem
+from olist.filtros import SEM_FILTRO, Filtro, construir_indice_filtros, localizar_chaves
+
+
+PEDIDOS = 'olist_orders_dataset.csv'
+CLIENTES = 'olist_customers_dataset.csv'
+ITENS = 'olist_order_items_dataset.csv'
+VENDEDORES = 'olist_sellers_dataset.csv'
+PRODUTOS = 'olist_products_dataset.csv'
+
+FILTROS = [
+    SEM_FILTRO,
+    Filtro(inicio=pd.Timestamp('2017-05-10'), fim=pd.Timestamp('2017-11-20')),
+    Filtro(status=('delivered', 'canceled')),
+    Filtro(estados_cliente=('SP', 'BA')),
+    Filtro(estados_vendedor=('SP',)),
+    Filtro(inicio=pd.Timestamp('2017-01-01'), estados_cliente=('RJ', 'MG'),
+           estados_vendedor=('SP', 'PR'), status=('delivered',)),
+    Filtro(categorias=('beleza_saude', 'esporte_lazer')),
+    Filtro(estados_vendedor=('SP',), categorias=('cama_mesa_banho',)),
+    Filtro(estados_cliente=('XX',)),
+]
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['strings', 'compactas'])
+def dfs(request, tmp_path_factory, dataset_base):
+    destino = str(tmp_path_factory.mktemp('filtros') / 'olist')
+    shutil.copytree(dataset_base, destino)
+    return carregar_armazem(destino, chaves_compactas=request.param)
+
+
+def _esperado(dfs, filtro):
+    """Pedidos, itens, clientes e vendedores do filtro, com merges e isin"""
+    pedidos = dfs[PEDIDOS].astype({'order_id': str, 'customer_id': str})
+    clientes = dfs[CLIENTES].astype({'customer_id': str})
+    itens = dfs[ITENS].astype({'order_id': str, 'seller_id': str, 'product_id': str})
+    vendedores = dfs[VENDEDORES].astype({'seller_id': str})
+    produtos = dfs[PRODUTOS].astype({'product_id': str})
+
+    estado_cliente = pedidos['customer_id'].map(
+        clientes.set_index('customer_id')['customer_state'].astype(str)
+    )
+    itens = itens.assign(
+        estado_vendedor=itens['seller_id'].map(
+            vendedores.set_index('seller_id')['seller_state'].astype(str)
+        ),
+        categoria=itens['product_id'].map(
+            produtos.set_index('product_id')['product_category_name'].astype(object)
+        ),
+    )
+    # Estado do vendedor e categoria: o mesmo item atende aos dois
+    do_filtro = pd.Series(True, index=itens.index)
+    if filtro.estados_vendedor:
+        do_filtro &= itens['estado_vendedor'].isin(filtro.estados_vendedor)
+    if filtro.categorias:
+        do_filtro &= itens['categoria'].isin(filtro.categorias)
+
+    mascara = pd.Series(True, index=pedidos.index)
+    compra = pd.to_datetime(pedidos['order_purchase_timestamp'])
+    if filtro.inicio is not None:
+        mascara &= compra >= filtro.inicio
+    if filtro.fim is not None:
+        mascara &= compra < pd.Timestamp(filtro.fim) + pd.Timedelta(days=1)
+    if filtro.status:
+        mascara &= pedidos['order_status'].astype(str).isin(filtro.status)
+    if filtro.estados_cliente:
+        mascara &= estado_cliente.isin(filtro.estados_cliente)
+    if filtro.estados_vendedor or filtro.categorias:
+        mascara &= pedidos['order_id'].isin(itens.loc[do_filtro, 'order_id'])
+
+    selecionados = pedidos.loc[mascara, 'order_id']
+    mascara_itens = itens['order_id'].isin(selecionados) & do_filtro
+    return {
+        'pedidos': mascara.to_numpy(),
+        'itens': mascara_itens.to_numpy(),
+        'clientes': clientes['customer_id'].isin(pedidos.loc[mascara, 'customer_id']).to_numpy(),
+        'vendedores': vendedores['seller_id'].isin(itens.loc[mascara_itens, 'seller_id']).to_numpy(),
+        'status': pedidos.loc[mascara, 'order_status'].astype(str).value_counts().to_dict(),
+        'produtos': itens.loc[mascara_itens, 'product_id'].nunique(),
+    }
+
+
+@pytest.mark.parametrize('filtro', FILTROS)
+def test_mascaras_iguais_ao_filtro_pandas(dfs, filtro):
+    indice = construir_indice_filtros(dfs)
+    selecao = indice.selecionar(filtro)
+    esperado = _esperado(dfs, filtro)
+
+    np.testing.assert_array_equal(indice.mascara_pedidos(selecao), esperado['pedidos'])
+    np.testing.assert_array_equal(
+        indice.mascara_itens(selecao, filtro.estados_vendedor, filtro.categorias),
+        esperado['itens'],
+    )
+    np.testing.assert_array_equal(indice.mascara_clientes(selecao), esperado['clientes'])
+    np.testing.assert_array_equal(
+        indice.mascara_vendedores(selecao, filtro.estados_vendedor, filtro.categorias),
+        esperado['vendedores'],
+    )
+    contagem = indice.contagem_status(selecao)
+    assert dict(zip(contagem['Status'], contagem['Quantidade'])) == esperado['status']
+
+    resumo = indice.resumo(selecao, filtro.estados_vendedor, filtro.categorias)
+    assert resumo == {
+        'clientes': int(esperado['clientes'].sum()),
+        'pedidos': int(esperado['pedidos'].sum()),
+        'produtos': esperado['produtos'],
+        'vendedores': int(esperado['vendedores'].sum()),
+    }
+
+
+def test_localizar_chaves_nos_dois_caminhos(dfs):
+    alvo = dfs[CLIENTES]['customer_id']
+    busca = dfs[PEDIDOS]['customer_id']
+    esperado = pd.Index(alvo.astype(str)).get_indexer(busca.astype(str))
+    np.testing.assert_array_equal(localizar_chaves(alvo, busca), esperado)
+
+    # Chaves ausentes do alvo: -1
+    faltando = pd.Series(['nao-existe', str(alvo.iloc[3])])
+    np.testing.assert_array_equal(localizar_chaves(alvo.astype(str), faltando), [-1, 3])
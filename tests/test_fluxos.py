@@ -0,0 +1,128 @@
+"""Distâncias e fluxos vendedor → cliente contra junções e agregações do pandas."""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from olist.fluxos import (
+    RAIO_TERRA_KM, calcular_envios, calcular_fluxos, filtrar_envios, haversine_km,
+)
+from olist.geo import ARQUIVO_GEO, construir_indice_geo
+from olist.ingestao import carregar_dataset
+
+
+def _haversine_escalar(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+
+@pytest.fixture(scope='module')
+def dfs(dataset_base):
+    return carregar_dataset(dataset_base, usar_cache=False)
+
+
+def _tabelas(dfs):
+    return (
+        dfs['olist_order_items_dataset.csv'], dfs['olist_orders_dataset.csv'],
+        dfs['olist_customers_dataset.csv'], dfs['olist_sellers_dataset.csv'],
+        construir_indice_geo(dfs[ARQUIVO_GEO]),
+    )
+
+
+@pytest.fixture(scope='module')
+def envios(dfs):
+    return calcular_envios(*_tabelas(dfs))
+
+
+@pytest.fixture(scope='module')
+def fluxos(dfs):
+    return calcular_fluxos(*_tabelas(dfs))
+
+
+def test_haversine_igual_a_formula_escalar():
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([
+        rng.uniform(-33, 5, 200), rng.uniform(-73, -35, 200),
+        rng.uniform(-33, 5, 200), rng.uniform(-73, -35, 200),
+    ])
+    esperado = [_haversine_escalar(*linha) for linha in coords]
+    np.testing.assert_allclose(haversine_km(*coords.T), esperado, rtol=1e-9)
+    # São Paulo → Rio de Janeiro: ~360 km
+    assert haversine_km(-23.55, -46.63, -22.91, -43.17) == pytest.approx(360, abs=5)
+    assert haversine_km(-10.0, -50.0, -10.0, -50.0) == 0
+
+
+def test_envios_iguais_a_juncao_pandas(dfs, envios):
+    indice = construir_indice_geo(dfs[ARQUIVO_GEO])[['geolocation_lat', 'geolocation_lng']]
+    vendedores = dfs['olist_sellers_dataset.csv'].merge(
+        indice, left_on='seller_zip_code_prefix', right_index=True
+    )
+    clientes = dfs['olist_customers_dataset.csv'].merge(
+        indice, left_on='customer_zip_code_prefix', right_index=True
+    )
+    esperado = (
+        dfs['olist_order_items_dataset.csv']
+        .merge(dfs['olist_orders_dataset.csv'], on='order_id')
+        .merge(vendedores, on='seller_id')
+        .merge(clientes, on='customer_id', suffixes=('_origem', '_destino'))
+    )
+    esperado['distancia'] = [
+        _haversine_escalar(*linha) for linha in esperado[[
+            'geolocation_lat_origem', 'geolocation_lng_origem',
+            'geolocation_lat_destino', 'geolocation_lng_destino',
+        ]].to_numpy(dtype='float64')
+    ]
+
+    assert len(envios) == len(esperado)
+    np.testing.assert_allclose(
+        np.sort(envios['distancia_km'].to_numpy(dtype='float64')),
+        np.sort(esperado['distancia'].to_numpy()), rtol=1e-5, atol=1e-3,
+    )
+    pares = envios.groupby(['estado_origem', 'estado_destino'], observed=True).size()
+    pares_esperados = esperado.groupby(
+        [esperado['seller_state'].astype(str), esperado['customer_state'].astype(str)]
+    ).size()
+    assert dict(pares) == dict(pares_esperados)
+
+
+def test_envios_filtrados_pela_mascara_de_itens(dfs, envios):
+    itens = dfs['olist_order_items_dataset.csv']
+    pedidos = dfs['olist_orders_dataset.csv']
+    # Cada envio aponta para o seu item e o pedido do item
+    np.testing.assert_array_equal(
+        itens['order_id'].to_numpy()[envios['posicao_item'].to_numpy()],
+        pedidos['order_id'].to_numpy()[envios['posicao_pedido'].to_numpy()],
+    )
+    mascara = np.random.default_rng(1).random(len(itens)) < 0.3
+    filtrados = filtrar_envios(envios, mascara)
+    esperado = envios[envios['posicao_item'].isin(np.flatnonzero(mascara))]
+    pd.testing.assert_frame_equal(filtrados, esperado)
+
+
+def test_agregados_iguais_ao_pandas(envios, fluxos):
+    origem, destino = envios['estado_origem'].astype(str), envios['estado_destino'].astype(str)
+
+    assert fluxos['resumo']['envios'] == len(envios)
+    assert fluxos['resumo']['distancia_media_km'] == pytest.approx(
+        envios['distancia_km'].astype('float64').mean()
+    )
+    assert fluxos['resumo']['percentual_mesmo_estado'] == pytest.approx((origem == destino).mean() * 100)
+    matriz = pd.crosstab(origem, destino)
+    np.testing.assert_array_equal(fluxos['matriz'].to_numpy(), matriz.to_numpy())
+    assert int(fluxos['histograma']['envios'].sum()) == len(envios)
+
+
+def test_correlacoes_iguais_as_do_pandas(envios, fluxos):
+    correlacao = fluxos['correlacao']
+    entregues = envios.dropna(subset=['tempo_real_dias'])
+    assert correlacao['envios_entregues'] == len(entregues) > 0
+
+    distancia = entregues['distancia_km'].to_numpy(dtype='float64')
+    tempo = entregues['tempo_real_dias'].to_numpy(dtype='float64')
+    assert correlacao['pearson'] == pytest.approx(np.corrcoef(distancia, tempo)[0, 1])
+    # Spearman: Pearson dos postos médios (empates recebem a média das posições)
+    postos = pd.DataFrame({'d': distancia, 't': tempo}).rank(method='average')
+    assert correlacao['spearman'] == pytest.approx(np.corrcoef(postos['d'], postos['t'])[0, 1])
@@ -0,0 +1,72 @@
+"""Índice de geolocalização por prefixo de CEP contra groupby/merge do pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from olist.geo import ARQUIVO_GEO, COLUNA_CEP, construir_indice_geo, geocodificar
+from olist.ingestao import carregar_arquivo
+
+
+@pytest.fixture(scope='module')
+def geolocalizacao(dataset_base):
+    return carregar_arquivo(dataset_base, ARQUIVO_GEO, usar_cache=False)
+
+
+def _predominante_pandas(geo, coluna):
+    """Valor mais frequente por prefixo; no empate, o menor valor"""
+    contagens = geo.groupby([COLUNA_CEP, coluna], observed=True).size()
+    resultado = {}
+    for cep, grupo in contagens.groupby(level=0):
+        grupo = grupo.droplevel(0)
+        resultado[cep] = min(grupo[grupo == grupo.max()].index)
+    return pd.Series(resultado)
+
+
+def test_indice_igual_ao_groupby(geolocalizacao):
+    indice = construir_indice_geo(geolocalizacao)
+    geo = geolocalizacao.dropna(subset=['geolocation_lat', 'geolocation_lng'])
+    esperado = geo.groupby(COLUNA_CEP).agg(
+        lat=('geolocation_lat', 'mean'),
+        lng=('geolocation_lng', 'mean'),
+        pontos=('geolocation_lat', 'size'),
+    )
+
+    assert indice.index.is_monotonic_increasing
+    assert list(indice.index) == list(esperado.index)
+    np.testing.assert_allclose(indice['geolocation_lat'], esperado['lat'], rtol=1e-6)
+    np.testing.assert_allclose(indice['geolocation_lng'], esperado['lng'], rtol=1e-6)
+    np.testing.assert_array_equal(indice['geolocation_pontos'], esperado['pontos'])
+    for coluna in ['geolocation_city', 'geolocation_state']:
+        predominante = _predominante_pandas(geo, coluna)
+        assert indice[coluna].astype(str).to_dict() == predominante.astype(str).to_dict()
+
+
+def test_predominante_desempata_pelo_menor_valor():
+    geo = pd.DataFrame({
+        COLUNA_CEP: [1, 1, 1, 1, 2, 2, 2],
+        'geolocation_lat': [-10.0] * 7,
+        'geolocation_lng': [-40.0] * 7,
+        'geolocation_city': ['b', 'a', 'b', 'a', 'x', 'y', 'y'],
+        'geolocation_state': ['SP'] * 4 + ['RJ'] * 3,
+    })
+    indice = construir_indice_geo(geo)
+    assert indice['geolocation_city'].to_dict() == {1: 'a', 2: 'y'}
+
+
+def test_geocodificar_igual_ao_merge(geolocalizacao):
+    indice = construir_indice_geo(geolocalizacao)
+    clientes = pd.DataFrame({
+        'customer_id': ['a', 'b', 'c', 'd'],
+        # O último prefixo não existe no índice
+        'customer_zip_code_prefix': list(indice.index[[0, 5, 5]]) + [-1],
+    })
+    obtido = geocodificar(clientes, 'customer_zip_code_prefix', indice)
+    esperado = clientes.merge(
+        indice.reset_index(), left_on='customer_zip_code_prefix', right_on=COLUNA_CEP,
+        how='left',
+    ).drop(columns=COLUNA_CEP)
+
+    assert list(obtido.index) == list(clientes.index)
+    for coluna in ['geolocation_lat', 'geolocation_lng']:
+        np.testing.assert_array_equal(obtido[coluna].to_numpy(), esperado[coluna].to_numpy())
+    assert obtido['geolocation_lat'].isna().tolist() == [False, False, False, True]
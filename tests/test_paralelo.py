@@ -0,0 +1,28 @@
+"""Ingestão paralela: mesmas tabelas que a leitura sequencial."""
+import pandas as pd
+
+from olist import paralelo
+from olist.armazem import carregar_armazem
+from olist.ingestao import carregar_dataset
+
+
+def test_leitura_paralela_igual_a_sequencial(dataset, monkeypatch):
+    # Faixas pequenas para os CSVs divisíveis serem lidos em várias partes
+    monkeypatch.setattr(paralelo, 'TAMANHO_FAIXA', 16 << 10)
+    paralelas = paralelo.ler_dataset_paralelo(dataset, processos=2)
+    sequenciais = carregar_dataset(dataset, usar_cache=False)
+
+    assert list(paralelas) == list(sequenciais)
+    for file_name, df in sequenciais.items():
+        pd.testing.assert_frame_equal(paralelas[file_name], df, check_categorical=False)
+
+
+def test_armazem_paralelo_igual_a_sequencial(dataset, monkeypatch):
+    monkeypatch.setattr(paralelo, 'TAMANHO_FAIXA', 16 << 10)
+    monkeypatch.setattr(paralelo, 'LIMITE_PARALELO', 0)
+    monkeypatch.setenv(paralelo.ENV_PROCESSOS, '2')
+    tabelas = carregar_armazem(dataset, chaves_compactas=False)
+    sequenciais = carregar_dataset(dataset, usar_cache=False)
+
+    for file_name, df in sequenciais.items():
+        pd.testing.assert_frame_equal(tabelas[file_name], df, check_categorical=False)